@@ -0,0 +1,189 @@
+"""Conversion of ANSI SGR escape sequences (as found in log records) to HTML."""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import re
+import threading
+from functools import lru_cache
+from html import escape
+
+if TYPE_CHECKING:
+    from typing import Dict, List, Optional, Tuple
+
+# Control sequences, SGR ones end with m. Others (cursor movement, erase, ...) have no meaning in HTML and are dropped
+CSI_PATTERN: re.Pattern = re.compile(r'\x1b\[([0-9;:?]*)([A-Za-z])')
+
+# Colors 0-7, the bright colors 8-15 are rendered like the standard ones as before
+BASIC_COLORS: Tuple[str, ...] = ('black', 'red', 'green', 'yellow', 'blue', 'magenta', 'cyan', 'white')
+
+# Style state: (bold, dim, italic, underline, strike, foreground, background)
+_DEFAULT_STATE: Tuple = (False, False, False, False, False, None, None)
+
+
+def _color_256(index: int) -> Optional[str]:
+    """CSS color of an entry of the xterm 256 color palette."""
+    if index < 0 or index > 255:
+        return None
+    if index < 16:
+        return BASIC_COLORS[index % 8]
+    if index < 232:
+        index -= 16
+        levels = [0 if level == 0 else 55 + level * 40 for level in (index // 36, (index // 6) % 6, index % 6)]
+        return '#{:02x}{:02x}{:02x}'.format(*levels)
+    gray = 8 + (index - 232) * 10
+    return f'#{gray:02x}{gray:02x}{gray:02x}'
+
+
+def _extended_color(params: List[int], position: int) -> Tuple[Optional[str], int]:
+    """Parse the 5;n or 2;r;g;b arguments following 38 or 48, returns the color and the position after it."""
+    if position < len(params) and params[position] == 5:
+        if position + 1 < len(params):
+            return _color_256(params[position + 1]), position + 2
+        return None, len(params)
+    if position < len(params) and params[position] == 2:
+        if position + 3 < len(params):
+            red, green, blue = (min(max(value, 0), 255) for value in params[position + 1:position + 4])
+            return f'#{red:02x}{green:02x}{blue:02x}', position + 4
+        return None, len(params)
+    return None, len(params)
+
+
+def _apply_sgr(state: Tuple, parameter_str: str) -> Tuple:
+    """Apply the parameters of one SGR sequence to the style state."""
+    bold, dim, italic, underline, strike, foreground, background = state
+    # Colons are the ITU T.416 separator for extended colors, treat them like semicolons
+    parameters = parameter_str.replace(':', ';').split(';')
+    if not all(param.isdigit() or not param for param in parameters):
+        # Private sequences (e.g. with ?) are not SGR, ignore them
+        return state
+    params = [int(param) if param else 0 for param in parameters]
+    position = 0
+    while position < len(params):
+        code = params[position]
+        position += 1
+        if code == 0:
+            bold, dim, italic, underline, strike, foreground, background = _DEFAULT_STATE
+        elif code == 1:
+            bold = True
+        elif code == 2:
+            dim = True
+        elif code == 3:
+            italic = True
+        elif code == 4:
+            underline = True
+        elif code == 9:
+            strike = True
+        elif code == 22:
+            bold = dim = False
+        elif code == 23:
+            italic = False
+        elif code == 24:
+            underline = False
+        elif code == 29:
+            strike = False
+        elif 30 <= code <= 37:
+            foreground = BASIC_COLORS[code - 30]
+        elif 90 <= code <= 97:
+            foreground = BASIC_COLORS[code - 90]
+        elif code == 38:
+            foreground, position = _extended_color(params, position)
+        elif code == 39:
+            foreground = None
+        elif 40 <= code <= 47:
+            background = BASIC_COLORS[code - 40]
+        elif 100 <= code <= 107:
+            background = BASIC_COLORS[code - 100]
+        elif code == 48:
+            background, position = _extended_color(params, position)
+        elif code == 49:
+            background = None
+        # Everything else (blink, reverse, fonts, ...) is ignored
+    return (bold, dim, italic, underline, strike, foreground, background)
+
+
+@lru_cache(maxsize=256)
+def _span(state: Tuple) -> str:
+    """Opening span tag of a style state, empty for the default state."""
+    bold, dim, italic, underline, strike, foreground, background = state
+    styles = []
+    if foreground is not None:
+        styles.append(f'color:{foreground};')
+    if background is not None:
+        styles.append(f'background-color:{background};')
+    if bold:
+        styles.append('font-weight:bold;')
+    if dim:
+        styles.append('opacity:0.7;')
+    if italic:
+        styles.append('font-style:italic;')
+    if underline or strike:
+        styles.append('text-decoration:' + ' '.join(name for name, active in (('underline', underline), ('line-through', strike)) if active) + ';')
+    if not styles:
+        return ''
+    return f'<span style="{"".join(styles)}">'
+
+
+# Style states seen so far are numbered, state 0 is the default. For each state a table maps a complete
+# escape sequence to the next state and the HTML switching to it, so converting a sequence is one dict lookup.
+_STATES: List[Tuple] = [_DEFAULT_STATE]
+_STATE_IDS: Dict[Tuple, int] = {_DEFAULT_STATE: 0}
+_TRANSITIONS: List[Dict[str, Tuple[int, str]]] = [{}]
+_MAX_STATES: int = 1024
+_lock: threading.Lock = threading.Lock()
+
+
+def _transition(state_id: int, match: re.Match) -> Tuple[int, str]:
+    """Compute and remember the transition for an escape sequence not seen in this state before."""
+    if match.group(2) != 'm':
+        transition = (state_id, '')
+    else:
+        state = _STATES[state_id]
+        new_state = _apply_sgr(state, match.group(1))
+        with _lock:
+            new_state_id = _STATE_IDS.get(new_state)
+            if new_state_id is None:
+                if len(_STATES) >= _MAX_STATES:
+                    # Unbounded true color input, the style is dropped so the spans stay balanced
+                    return state_id, ''
+                new_state_id = len(_STATES)
+                _STATES.append(new_state)
+                _STATE_IDS[new_state] = new_state_id
+                _TRANSITIONS.append({})
+        if new_state_id == state_id:
+            transition = (state_id, '')
+        else:
+            transition = (new_state_id, ('</span>' if state_id != 0 else '') + _span(new_state))
+    if len(_TRANSITIONS[state_id]) < _MAX_STATES:
+        _TRANSITIONS[state_id][match.group()] = transition
+    return transition
+
+
+def ansi_to_html(text: str) -> str:
+    """
+    Escape text for HTML and convert its ANSI SGR sequences to styled spans in a single pass.
+
+    Supports bold/dim/italic/underline/strike, the 16 standard colors, 256 color and true color
+    foreground and background, combined codes and resets without a preceding color.
+    Spans are always balanced.
+
+    Args:
+        text (str): Text with ANSI escape sequences
+
+    Returns:
+        str: Escaped HTML (not marked safe)
+    """
+    # Escaping leaves the sequences intact, so they can be replaced in the escaped string in one regex pass
+    escaped = escape(text, quote=True)
+    if '\x1b' not in text:
+        return escaped
+    state = 0
+
+    def replace(match: re.Match) -> str:
+        nonlocal state
+        transition = _TRANSITIONS[state].get(match.group()) or _transition(state, match)
+        state = transition[0]
+        return transition[1]
+
+    html = CSI_PATTERN.sub(replace, escaped)
+    if state != 0:
+        html += '</span>'
+    return html
@@ -0,0 +1,18 @@
+"""ASGI config for CarConnectivity WebUI plugin."""
+import os
+
+# Don't call get_asgi_application() at module import time
+# It will be called by plugin.py after Django is configured
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carconnectivity_plugins.webui.django_app.settings')
+
+# Application will be set by plugin.py
+application = None
+
+
+def get_application():
+    """Get or create the ASGI application."""
+    global application
+    if application is None:
+        from django.core.asgi import get_asgi_application
+        application = get_asgi_application()
+    return application
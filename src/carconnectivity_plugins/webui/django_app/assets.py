@@ -0,0 +1,229 @@
+"""Static assets bundled, minified, content hashed and pre-compressed in memory at startup."""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import StaticFilesStorage
+
+from carconnectivity_plugins.webui.django_app.compression import SUPPORT_BROTLI, accepted_encodings, compress, is_compressible
+
+if TYPE_CHECKING:
+    from typing import Dict, List, Optional, Tuple
+
+LOG: logging.Logger = logging.getLogger("carconnectivity.plugins.webui")
+
+# Virtual assets concatenated from several files, in this order. Bundles stay in the directory of their
+# parts so relative url() references keep working
+BUNDLES: Dict[str, List[str]] = {
+    'css/bundle.css': ['css/apple-design-system.css', 'css/components.css', 'css/animations.css', 'css/responsive.css'],
+}
+
+# Smaller responses are not worth the Content-Encoding
+MIN_COMPRESS_SIZE: int = 256
+
+MANIFEST_NAME: str = 'manifest.json'
+
+_CSS_TOKEN = re.compile(r'("(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\')|(/\*.*?\*/|\s+)', re.S)
+
+
+def minify_css(css: str) -> str:
+    """
+    Remove comments and redundant whitespace from CSS, leaving strings untouched.
+
+    Only whitespace that can never be significant is dropped (around braces, semicolons and commas and
+    after colons), so e.g. the spaces calc() needs around + and - are kept.
+    """
+    parts: List[str] = []
+
+    def append_code(code: str) -> None:
+        # Only code outside strings and comments, where the last semicolon of a block is redundant
+        if not code:
+            return
+        if code[0] == '}' and parts and parts[-1][-1] == ';':
+            parts[-1] = parts[-1][:-1]
+        parts.append(code.replace(';}', '}'))
+
+    position = 0
+    for match in _CSS_TOKEN.finditer(css):
+        append_code(css[position:match.start()])
+        position = match.end()
+        if match.group(1) is not None:
+            parts.append(match.group(1))
+            continue
+        previous = parts[-1][-1:] if parts else ''
+        following = css[position:position + 1]
+        if previous and previous not in '{};,:' and following and following not in '{};,)':
+            parts.append(' ')
+    append_code(css[position:])
+    return ''.join(parts).strip()
+
+
+class Asset:  # pylint: disable=too-few-public-methods
+    """
+    One static file held in memory.
+
+    Attributes:
+        name (str): Path relative to the static directory.
+        hashed_name (str): Path with the content hash before the extension, served as immutable.
+        content_type (str): Content-Type header.
+        digest (str): Content hash.
+        encodings (Dict[str, bytes]): Body per Content-Encoding, 'identity' is always present.
+    """
+    __slots__ = ('name', 'hashed_name', 'content_type', 'digest', 'encodings')
+
+    def __init__(self, name: str, data: bytes) -> None:
+        self.name: str = name
+        self.digest: str = hashlib.sha256(data).hexdigest()[:12]
+        root, extension = os.path.splitext(name)
+        self.hashed_name: str = f'{root}.{self.digest}{extension}'
+        content_type, _ = mimetypes.guess_type(name)
+        self.content_type: str = content_type or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type in ('application/javascript', 'application/json', 'image/svg+xml'):
+            self.content_type += '; charset=utf-8'
+        self.encodings: Dict[str, bytes] = {'identity': data}
+        if len(data) >= MIN_COMPRESS_SIZE and is_compressible(self.content_type):
+            for encoding in ('br', 'gzip') if SUPPORT_BROTLI else ('gzip',):
+                compressed = compress(data, encoding, best=True)
+                if len(compressed) < len(data):
+                    self.encodings[encoding] = compressed
+
+    def etag(self, encoding: str) -> str:
+        """Strong ETag of one representation."""
+        return f'"{self.digest}"' if encoding == 'identity' else f'"{self.digest}-{encoding}"'
+
+
+class AssetStore:
+    """
+    All static files, read once, with bundles, minified CSS, content hashed names and gzip/brotli variants.
+
+    Built at plugin startup (or on first use). With DEBUG enabled it is rebuilt whenever a source file changes.
+
+    Args:
+        root (Optional[str]): Static directory, defaults to the first of STATICFILES_DIRS.
+    """
+
+    def __init__(self, root: Optional[str] = None) -> None:
+        self.root: Optional[str] = root
+        self._assets: Dict[str, Asset] = {}
+        self._hashed: Dict[str, Asset] = {}
+        self._manifest: Dict[str, str] = {}
+        self._signature: Optional[Tuple] = None
+        self._lock: threading.Lock = threading.Lock()
+
+    def _root(self) -> Optional[str]:
+        if self.root is not None:
+            return self.root
+        return settings.STATICFILES_DIRS[0] if settings.STATICFILES_DIRS else None
+
+    def _sources(self, root: str) -> Dict[str, str]:
+        sources: Dict[str, str] = {}
+        for directory, _, files in os.walk(root):
+            for file_name in files:
+                path = os.path.join(directory, file_name)
+                sources[os.path.relpath(path, root).replace(os.sep, '/')] = path
+        return sources
+
+    def build(self) -> None:
+        """Read, bundle, minify, hash and compress all static files."""
+        start = time.perf_counter()
+        root = self._root()
+        sources = self._sources(root) if root is not None and os.path.isdir(root) else {}
+        signature = tuple(sorted((name, os.stat(path).st_mtime_ns) for name, path in sources.items()))
+        contents: Dict[str, bytes] = {}
+        for name, path in sources.items():
+            with open(path, 'rb') as file:
+                contents[name] = file.read()
+        for bundle, parts in BUNDLES.items():
+            if all(part in contents for part in parts):
+                contents[bundle] = b'\n'.join(contents[part] for part in parts)
+        assets: Dict[str, Asset] = {}
+        for name, data in contents.items():
+            if name.endswith('.css'):
+                data = minify_css(data.decode('utf-8')).encode('utf-8')
+            assets[name] = Asset(name, data)
+        manifest = {name: asset.hashed_name for name, asset in sorted(assets.items())}
+        assets[MANIFEST_NAME] = Asset(MANIFEST_NAME, json.dumps(manifest, indent=2).encode('utf-8'))
+        with self._lock:
+            self._assets = assets
+            self._hashed = {asset.hashed_name: asset for asset in assets.values()}
+            self._manifest = manifest
+            self._signature = signature
+        source_size = sum(len(data) for data in contents.values())
+        sizes = {encoding: sum(len(asset.encodings.get(encoding, asset.encodings['identity'])) for asset in assets.values())
+                 for encoding in ('identity', 'gzip', 'br')}
+        LOG.info('Built %d static assets in %.1f ms (%d bytes, minified %d, gzip %d%s)', len(assets), (time.perf_counter() - start) * 1000,
+                 source_size, sizes['identity'], sizes['gzip'], f', brotli {sizes["br"]}' if SUPPORT_BROTLI else '')
+
+    def _ensure_built(self) -> None:
+        if self._signature is None:
+            with self._lock:
+                built = self._signature is not None
+            if not built:
+                self.build()
+        elif settings.DEBUG:
+            root = self._root()
+            if root is not None and os.path.isdir(root):
+                signature = tuple(sorted((name, os.stat(path).st_mtime_ns) for name, path in self._sources(root).items()))
+                if signature != self._signature:
+                    self.build()
+
+    @property
+    def manifest(self) -> Dict[str, str]:
+        """Original name to hashed name of every asset."""
+        self._ensure_built()
+        return self._manifest
+
+    def hashed_name(self, name: str) -> str:
+        """The content hashed name of an asset, name itself if it is unknown."""
+        self._ensure_built()
+        return self._manifest.get(name, name)
+
+    def find(self, path: str) -> Optional[Tuple[Asset, bool]]:
+        """
+        Look up an asset by its hashed or original name.
+
+        Returns:
+            Optional[Tuple[Asset, bool]]: The asset and whether path was the hashed (immutable) name, None if unknown.
+        """
+        self._ensure_built()
+        asset = self._hashed.get(path)
+        if asset is not None:
+            return asset, True
+        asset = self._assets.get(path)
+        if asset is not None:
+            return asset, False
+        return None
+
+
+def negotiate_encoding(accept_encoding: str, asset: Asset) -> str:
+    """Pick the smallest encoding of asset the client accepts (Accept-Encoding with q-values), identity otherwise."""
+    accepted = accepted_encodings(accept_encoding)
+    best = 'identity'
+    for encoding in ('br', 'gzip'):
+        if encoding in asset.encodings and accepted.get(encoding, accepted.get('*', 0.0)) > 0 \
+                and len(asset.encodings[encoding]) < len(asset.encodings[best]):
+            best = encoding
+    return best
+
+
+class HashedAssetStorage(StaticFilesStorage):
+    """Static files storage making {% static %} return the content hashed URLs of the asset store."""
+
+    def url(self, name: Optional[str]) -> str:
+        return super().url(_asset_store.hashed_name(name) if name else name)
+
+
+_asset_store: AssetStore = AssetStore()
+
+
+def get_asset_store() -> AssetStore:
+    """Get the static asset store."""
+    return _asset_store
@@ -0,0 +1,345 @@
+"""Change-versioned caching of serialized CarConnectivity data."""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from django.core.cache.backends.locmem import LocMemCache
+
+from carconnectivity.observable import Observable
+
+if TYPE_CHECKING:
+    from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+    from carconnectivity.attributes import GenericAttribute
+    from carconnectivity.carconnectivity import CarConnectivity
+    from carconnectivity.objects import GenericObject
+
+
+class ChangeVersions:
+    """
+    Monotonically increasing change counters of the CarConnectivity object tree.
+
+    An observer on the tree increments the counter of every subtree a notification belongs to:
+    the whole tree, the garage, the vehicle and the section of the vehicle (e.g. drives, doors, charging).
+    Anything derived from a subtree stays valid as long as its counter did not move. Versions are only
+    handed out while the observer is attached, otherwise nothing would invalidate them.
+
+    The same observer keeps the newest update time of each of these subtrees for Last-Modified headers.
+    """
+
+    def __init__(self) -> None:
+        self.instance: str = uuid.uuid4().hex[:8]
+        self._epoch: int = 0
+        self._root: int = 0
+        self._garage: int = 0
+        self._vehicles: Dict[str, int] = {}
+        self._sections: Dict[str, int] = {}
+        self._modified: Dict[str, datetime] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._car_connectivity: Optional[CarConnectivity] = None
+        self._active: bool = False
+
+    def attach(self, car_connectivity: CarConnectivity) -> None:
+        """Start observing the object tree of car_connectivity."""
+        # The observer is registered only once and deactivated on detach(), Observable.remove_observer()
+        # would also drop the observers of everybody else
+        if self._car_connectivity is not car_connectivity:
+            self._car_connectivity = car_connectivity
+            car_connectivity.add_observer(self._on_change, Observable.ObserverEvent.ALL, priority=Observable.ObserverPriority.INTERNAL_FIRST)
+        with self._lock:
+            # Changes while detached were not counted, start a new epoch
+            self._epoch += 1
+            self._modified.clear()
+        self._active = True
+
+    def detach(self) -> None:
+        """Stop handing out versions."""
+        self._active = False
+
+    @property
+    def active(self) -> bool:
+        """True while the object tree is observed."""
+        return self._active
+
+    def root_version(self) -> Optional[str]:
+        """Version of the whole object tree, or None if changes are not tracked."""
+        if not self._active:
+            return None
+        return f'{self.instance}.{self._epoch}.{self._root}'
+
+    def garage_version(self) -> Optional[str]:
+        """Version of the garage, or None if changes are not tracked."""
+        if not self._active:
+            return None
+        return f'{self.instance}.{self._epoch}.{self._garage}'
+
+    def vehicle_version(self, vin: str) -> Optional[str]:
+        """Version of a vehicle, or None if changes are not tracked."""
+        if not self._active:
+            return None
+        return f'{self.instance}.{self._epoch}.{self._vehicles.get(vin, 0)}'
+
+    def section_version(self, path: str) -> Optional[str]:
+        """Version of a section of a vehicle given by its path, e.g. /garage/<vin>/drives, or None if changes are not tracked."""
+        if not self._active:
+            return None
+        return f'{self.instance}.{self._epoch}.{self._sections.get(path, 0)}'
+
+    def scope_version(self, path: str) -> Optional[str]:
+        """Version of the narrowest tracked subtree containing path (its vehicle section, vehicle, the garage or the whole tree)."""
+        if path.startswith('/garage/'):
+            # ['', 'garage', '<vin>', '<section>', '<rest of path>']
+            parts = path.split('/', 4)
+            if len(parts) >= 4:
+                return self.section_version('/'.join(parts[:4]))
+            return self.vehicle_version(parts[2])
+        if path == '/garage':
+            return self.garage_version()
+        return self.root_version()
+
+    def last_modified(self, element: GenericObject) -> Optional[datetime]:
+        """
+        Newest update time in the subtree of element (the whole tree, the garage or a vehicle).
+
+        The subtree is walked only the first time, afterwards the time is maintained by the observer.
+
+        Returns:
+            Optional[datetime]: The time, or None if changes are not tracked or nothing was updated yet.
+        """
+        if not self._active:
+            return None
+        path: str = element.get_absolute_path()
+        modified = self._modified.get(path)
+        if modified is None:
+            for attribute in element.get_attributes(recursive=True):
+                attribute_modified = _attribute_modified(attribute)
+                if attribute_modified is not None and (modified is None or attribute_modified > modified):
+                    modified = attribute_modified
+            if modified is not None:
+                with self._lock:
+                    # An update may have raced the walk
+                    if path not in self._modified or self._modified[path] < modified:
+                        self._modified[path] = modified
+        return modified
+
+    def _on_change(self, element: Any, flags: Observable.ObserverEvent) -> None:
+        if not self._active:
+            return
+        path: str = element.get_absolute_path()
+        if flags & (Observable.ObserverEvent.ENABLED | Observable.ObserverEvent.DISABLED):
+            # Structure changed, that is no attribute update but still a modification
+            modified: Optional[datetime] = datetime.now(tz=timezone.utc)
+        else:
+            modified = _attribute_modified(element)
+        with self._lock:
+            self._root += 1
+            scopes = ['']
+            if path == '/garage' or path.startswith('/garage/'):
+                self._garage += 1
+                scopes.append('/garage')
+                # ['', 'garage', '<vin>', '<section>', '<rest of path>']
+                parts = path.split('/', 4)
+                if len(parts) >= 3:
+                    self._vehicles[parts[2]] = self._vehicles.get(parts[2], 0) + 1
+                    scopes.append(f'/garage/{parts[2]}')
+                if len(parts) >= 4:
+                    section = '/'.join(parts[:4])
+                    self._sections[section] = self._sections.get(section, 0) + 1
+            if modified is not None:
+                for scope in scopes:
+                    # Scopes that were never asked for are computed on first use
+                    if scope in self._modified and self._modified[scope] < modified:
+                        self._modified[scope] = modified
+
+
+class _Flight:  # pylint: disable=too-few-public-methods
+    # A computation in progress that concurrent identical lookups wait for
+    __slots__ = ('done', 'value', 'failed')
+
+    def __init__(self) -> None:
+        self.done: threading.Event = threading.Event()
+        self.value: Any = None
+        self.failed: bool = False
+
+
+class VersionedResponseCache:
+    """
+    Bounded LRU cache of serialized responses, each entry valid for one change version.
+
+    Every key keeps only the result for the version it was computed at; a lookup with a newer
+    version recomputes and replaces it. Results are never served for a version they were not computed for.
+
+    With coalesce enabled, concurrent lookups of the same key and version that miss the cache wait for a single
+    computation and share its result (single-flight), instead of computing the same value in parallel.
+
+    Args:
+        max_entries (int): Maximum number of cached keys.
+        coalesce (bool): Share in-flight computations between threads.
+    """
+
+    def __init__(self, max_entries: int = 128, coalesce: bool = False) -> None:
+        self.max_entries: int = max_entries
+        self.coalesce: bool = coalesce
+        self.coalesced: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._entries: OrderedDict[Hashable, Tuple[str, Any]] = OrderedDict()
+        self._flights: Dict[Tuple[Hashable, Optional[str]], _Flight] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, version: Optional[str], compute: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for key at version, computing it if needed.
+
+        Args:
+            key: Identifies the response, e.g. view name and parameters.
+            version (Optional[str]): Change version of the data the response is built from. None disables caching
+                (concurrent computations are still coalesced).
+            compute (Callable[[], Any]): Builds the value.
+
+        Returns:
+            Any: The cached or freshly computed value.
+        """
+        if version is None and not self.coalesce:
+            return compute()
+        flight: Optional[_Flight] = None
+        with self._lock:
+            entry = self._entries.get(key) if version is not None else None
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if self.coalesce:
+                flight = self._flights.get((key, version))
+                if flight is None:
+                    self._flights[(key, version)] = _Flight()
+                    self.misses += 1
+                else:
+                    self.coalesced += 1
+            else:
+                self.misses += 1
+        if flight is not None:
+            flight.done.wait()
+            if not flight.failed:
+                return flight.value
+            # The computation failed, try on our own
+            return compute()
+        try:
+            value = compute()
+        except BaseException:
+            self._land(key, version, None, failed=True)
+            raise
+        self._land(key, version, value, failed=False)
+        return value
+
+    def _land(self, key: Hashable, version: Optional[str], value: Any, failed: bool) -> None:
+        with self._lock:
+            if not failed and version is not None:
+                self._entries[key] = (version, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+            flight = self._flights.pop((key, version), None)
+        if flight is not None:
+            flight.value = value
+            flight.failed = failed
+            flight.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        """Lookup counters and current size, for the metrics."""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'coalesced': self.coalesced,
+                'entries': len(self._entries)}
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+
+
+_MISSING: Any = object()
+
+# Counters of each StatsLocMemCache location, Django creates a backend instance per thread
+_locmem_stats: Dict[str, Dict[str, int]] = {}
+
+
+class StatsLocMemCache(LocMemCache):
+    """Django's local memory cache backend (used for the sessions) counting hits, misses and evictions for the metrics."""
+
+    def __init__(self, name: str, params: Dict[str, Any]) -> None:
+        super().__init__(name, params)
+        self._stats: Dict[str, int] = _locmem_stats.setdefault(name, {'hits': 0, 'misses': 0, 'evictions': 0})
+
+    def get(self, key: Any, default: Any = None, version: Optional[int] = None) -> Any:
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            self._stats['misses'] += 1
+            return default
+        self._stats['hits'] += 1
+        return value
+
+    def _cull(self) -> None:
+        # Called with the lock held when the cache is full
+        entries = len(self._cache)
+        super()._cull()
+        self._stats['evictions'] += entries - len(self._cache)
+
+    def stats(self) -> Dict[str, int]:
+        """Lookup counters and current size, for the metrics."""
+        return dict(self._stats, entries=len(self._cache))
+
+
+def attribute_version(attribute: GenericAttribute) -> Optional[str]:
+    """
+    Version of a single attribute value, e.g. an image, derived from the time it last changed.
+
+    Returns:
+        Optional[str]: The version, or None if the attribute has no value.
+    """
+    if attribute.value is None:
+        return None
+    changed = attribute.last_changed or attribute.last_changed_local
+    if changed is None:
+        return f'{_change_versions.instance}.{id(attribute.value):x}'
+    return f'{changed.timestamp():.6f}'
+
+
+def _attribute_modified(attribute: Any) -> Optional[datetime]:
+    # Newer of the measured update time and the time CarConnectivity received the value
+    last_updated = getattr(attribute, 'last_updated', None)
+    last_updated_local = getattr(attribute, 'last_updated_local', None)
+    if last_updated is None or (last_updated_local is not None and last_updated_local > last_updated):
+        return last_updated_local
+    return last_updated
+
+
+def make_etag(key: Hashable, version: Optional[str]) -> Optional[str]:
+    """
+    Build a strong ETag for the response identified by key at version.
+
+    Returns:
+        Optional[str]: The quoted ETag, or None if the version is unknown.
+    """
+    if version is None:
+        return None
+    variant = hashlib.sha1(repr(key).encode('utf-8'), usedforsecurity=False).hexdigest()[:8]
+    return f'"{version}-{variant}"'
+
+
+_change_versions: ChangeVersions = ChangeVersions()
+# Concurrent requests for the same document (e.g. a dashboard loading) serialize it only once
+_response_cache: VersionedResponseCache = VersionedResponseCache(coalesce=True)
+
+
+def get_change_versions() -> ChangeVersions:
+    """Get the change versions of the object tree."""
+    return _change_versions
+
+
+def get_response_cache() -> VersionedResponseCache:
+    """Get the versioned response cache."""
+    return _response_cache
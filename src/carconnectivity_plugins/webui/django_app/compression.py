@@ -0,0 +1,162 @@
+"""Negotiated gzip/brotli compression of responses."""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import gzip
+
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from carconnectivity_plugins.webui.django_app.cache import get_response_cache
+
+if TYPE_CHECKING:
+    from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+    from django.http import HttpRequest, HttpResponse
+
+# Check for brotli support
+SUPPORT_BROTLI: bool = False
+try:
+    import brotli
+    SUPPORT_BROTLI = True
+except ImportError:
+    pass
+
+# Content types worth compressing, images like PNG are compressed already
+COMPRESSIBLE_TYPES: Tuple[str, ...] = ('text/', 'application/javascript', 'application/json', 'application/msgpack', 'application/cbor',
+                                       'image/svg+xml')
+
+# Encodings in order of preference
+ENCODINGS: Tuple[str, ...] = ('br', 'gzip') if SUPPORT_BROTLI else ('gzip',)
+
+# Responses are compressed on every change or request, so speed matters more than the last percent
+GZIP_LEVEL: int = 6
+BROTLI_QUALITY: int = 5
+
+# Random bytes added to the gzip header of responses that are compressed per request, as
+# django.middleware.gzip.GZipMiddleware does against BREACH
+MAX_RANDOM_BYTES: int = 100
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header to the quality of each content coding."""
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def choose_encoding(accept_encoding: str, available: Iterable[str] = ENCODINGS) -> str:
+    """The first of the available encodings (in order of preference) the client accepts, identity otherwise."""
+    accepted = accepted_encodings(accept_encoding)
+    for encoding in available:
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return 'identity'
+
+
+def compress(data: bytes, encoding: str, best: bool = False, max_random_bytes: Optional[int] = None) -> bytes:
+    """
+    Compress data with the given content coding.
+
+    Args:
+        data (bytes): The data.
+        encoding (str): 'gzip' or 'br'.
+        best (bool): Use the highest compression level, for data compressed only once.
+        max_random_bytes (Optional[int]): Randomize the gzip output with up to this many bytes, see MAX_RANDOM_BYTES.
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if best else BROTLI_QUALITY)
+    if max_random_bytes is not None:
+        return compress_string(data, max_random_bytes=max_random_bytes)
+    return gzip.compress(data, compresslevel=9 if best else GZIP_LEVEL, mtime=0)
+
+
+def is_compressible(content_type: str) -> bool:
+    """Whether a response of this Content-Type benefits from compression."""
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class ResponseCompressor:
+    """
+    Compresses responses above a minimum size in the encoding the client prefers.
+
+    Responses of the versioned response cache are compressed once per change version and encoding,
+    the compressed body is kept in the same cache next to the uncompressed one.
+
+    Args:
+        min_size (int): Smallest body in bytes that is compressed.
+    """
+
+    def __init__(self, min_size: int = 1024) -> None:
+        self.enabled: bool = True
+        self.min_size: int = min_size
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        """Apply the compression settings of the plugin configuration."""
+        if config.get('compression') is not None:
+            self.enabled = bool(config['compression'])
+        if config.get('compression_min_size') is not None:
+            self.min_size = int(config['compression_min_size'])
+
+    def compress_response(self, request: HttpRequest, response: HttpResponse, key: Optional[Hashable] = None,
+                          version: Optional[str] = None) -> HttpResponse:
+        """
+        Compress the body of response in place if it is large enough and the client accepts it.
+
+        Args:
+            request: The request, checked for Accept-Encoding.
+            response: The response to compress.
+            key: Key of the body in the versioned response cache, its compressed body is cached next to it.
+            version: Change version of the body, None disables caching.
+
+        Returns:
+            HttpResponse: response.
+        """
+        if not self.enabled or response.streaming or response.has_header('Content-Encoding') or response.status_code in (206, 304) \
+                or len(response.content) < self.min_size or not is_compressible(response.get('Content-Type', '')):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding == 'identity':
+            return response
+        content = response.content
+        if key is not None:
+            compressed = get_response_cache().get_or_compute((key, encoding), version, lambda: compress(content, encoding))
+        else:
+            compressed = compress(content, encoding, max_random_bytes=MAX_RANDOM_BYTES)
+        if len(compressed) >= len(content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The ETag was computed for the uncompressed body, like GZipMiddleware only claim weak equality
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+class CompressionMiddleware:
+    """Compress HTML pages and other responses that were not compressed by their view, see ResponseCompressor."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        return _response_compressor.compress_response(request, self.get_response(request))
+
+
+_response_compressor: ResponseCompressor = ResponseCompressor()
+
+
+def get_response_compressor() -> ResponseCompressor:
+    """Get the response compressor."""
+    return _response_compressor
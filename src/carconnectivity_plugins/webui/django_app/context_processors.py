@@ -1,21 +1,43 @@
 """Context processors for CarConnectivity WebUI."""
 from __future__ import annotations
 from typing import TYPE_CHECKING, Dict, Any
-from django.urls import reverse
+from django.urls import get_script_prefix, reverse
 from carconnectivity_plugins.webui.django_app import get_car_connectivity
 
 if TYPE_CHECKING:
+    from typing import List, Optional, Tuple
     from django.http import HttpRequest
+    from carconnectivity.carconnectivity import CarConnectivity
+
+# The navbar with the key it was built for, see navbar()
+_navbar: Optional[Tuple[Tuple, List[Dict[str, Any]]]] = None
+
+
+def _navbar_key(car_connectivity: Optional[CarConnectivity]) -> Tuple:
+    # Everything the navbar depends on: the connectors and plugins and the prefix URLs are reversed with
+    connectors = car_connectivity.connectors if car_connectivity else None
+    plugins = car_connectivity.plugins if car_connectivity else None
+    return (get_script_prefix(), id(car_connectivity),
+            tuple(connectors.connectors) if connectors and connectors.enabled else None,
+            tuple(plugins.plugins) if plugins and plugins.enabled else None)
 
 
 def navbar(request: HttpRequest) -> Dict[str, Any]:
     """
     Build navigation bar structure.
+
+    The connectors and plugins are fixed after startup, so the structure is built once and only
+    rebuilt when they change. Templates must not modify it.
     
     Returns:
         Dictionary with navbar structure
     """
+    global _navbar  # pylint: disable=global-statement
     car_connectivity = get_car_connectivity()
+    key = _navbar_key(car_connectivity)
+    cached = _navbar
+    if cached is not None and cached[0] == key:
+        return {'navbar': cached[1]}
     
     plugins_sublinks = []
     connectors_sublinks = []
@@ -65,6 +87,7 @@ def navbar(request: HttpRequest) -> Dict[str, Any]:
         {"text": "Grafana", "url": "/grafana/"},
     ]
     
+    _navbar = (key, nav)
     return {'navbar': nav}
 
 
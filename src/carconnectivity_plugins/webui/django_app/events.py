@@ -0,0 +1,520 @@
+"""Server-Sent Events stream of changes in the CarConnectivity object tree."""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import asyncio
+import json
+import threading
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+
+from carconnectivity.attributes import GenericAttribute
+from carconnectivity.json_util import ExtendedWithNullEncoder
+from carconnectivity.observable import Observable
+
+if TYPE_CHECKING:
+    from typing import Any, Deque, Dict, Iterator, AsyncIterator, List, Optional, Set, Tuple
+    from carconnectivity.carconnectivity import CarConnectivity
+
+# Check if PIL is available
+SUPPORT_IMAGES = False
+try:
+    from PIL import Image
+    SUPPORT_IMAGES = True
+except ImportError:
+    pass
+
+
+class ChangeEvent:  # pylint: disable=too-few-public-methods
+    """
+    A single change in the object tree.
+
+    Attributes:
+        event_id (int): Monotonically increasing id of the event.
+        path (str): Absolute path of the changed attribute or object.
+        data (str): JSON payload sent to the clients.
+        values (Dict[str, Any]): The new state of the element (val, upd, uni and/or enabled) for the delta JSON API.
+        time (datetime): When the change was observed.
+        live (bool): Whether the event is sent to the streams, False for updates without a change of the value
+            that are only kept in the change journal.
+    """
+    __slots__ = ('event_id', 'path', 'data', 'values', 'time', 'live')
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, event_id: int, path: str, data: str, values: Dict[str, Any], time: datetime, live: bool = True) -> None:
+        self.event_id: int = event_id
+        self.path: str = path
+        self.data: str = data
+        self.values: Dict[str, Any] = values
+        self.time: datetime = time
+        self.live: bool = live
+
+    def matches(self, prefix: str) -> bool:
+        """Return True if the event concerns the subtree at prefix."""
+        return not prefix or self.path == prefix or self.path.startswith(prefix + '/')
+
+
+class EventSubscriber:
+    """
+    Per-client queue of pending events.
+
+    The queue is bounded: when a client does not keep up, the pending events are dropped and the
+    client is sent a reset event instead, so a slow client can never make the server buffer without limit.
+
+    Args:
+        prefix (Any): Only events for this subtree are queued, anything the events' matches() accepts.
+        max_pending (int): Number of events that may be pending before the client is reset.
+    """
+
+    def __init__(self, prefix: Any, max_pending: int) -> None:
+        self.prefix: Any = prefix
+        self.max_pending: int = max_pending
+        self.closed: bool = False
+        self.start_id: int = 0
+        self._pending: Deque[ChangeEvent] = deque()
+        self._overflowed: bool = False
+        self._lock: threading.Lock = threading.Lock()
+        self._wakeup: threading.Event = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_wakeup: Optional[asyncio.Event] = None
+
+    def bind_loop(self) -> None:
+        """Deliver wakeups to the running event loop instead of a thread."""
+        self._loop = asyncio.get_running_loop()
+        self._async_wakeup = asyncio.Event()
+
+    def push(self, event: ChangeEvent) -> None:
+        """Queue an event if it concerns the subscribed subtree."""
+        if not event.matches(self.prefix):
+            return
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self._pending.clear()
+                self._overflowed = True
+            elif not self._overflowed:
+                self._pending.append(event)
+        self._wake()
+
+    def close(self) -> None:
+        """Mark the subscriber as closed and wake up its stream."""
+        self.closed = True
+        self._wake()
+
+    def take(self) -> Tuple[List[ChangeEvent], bool]:
+        """
+        Take all pending events.
+
+        Returns:
+            Tuple[List[ChangeEvent], bool]: The pending events and whether events were dropped since the last call.
+        """
+        with self._lock:
+            self._wakeup.clear()
+            if self._async_wakeup is not None:
+                self._async_wakeup.clear()
+            events = list(self._pending)
+            self._pending.clear()
+            overflowed = self._overflowed
+            self._overflowed = False
+        return events, overflowed
+
+    def wait(self, timeout: float) -> None:
+        """Block until events are pending or the timeout expired."""
+        self._wakeup.wait(timeout)
+
+    async def wait_async(self, timeout: float) -> None:
+        """Wait on the event loop until events are pending or the timeout expired."""
+        assert self._async_wakeup is not None
+        try:
+            await asyncio.wait_for(self._async_wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _wake(self) -> None:
+        if self._loop is not None and self._async_wakeup is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._async_wakeup.set)
+            except RuntimeError:
+                # Event loop already closed
+                pass
+        else:
+            self._wakeup.set()
+
+
+class StreamBudget:
+    """
+    Number of event streams (live updates and log tail together) that may be open at the same time.
+
+    With the WSGI servers every open stream occupies a worker thread for as long as it is open, so streams are
+    limited to a quarter of the workers (and always leave at least one free) to keep pages and API requests
+    served; the single threaded simple server cannot stream at all. With the asgi server a stream only costs a
+    coroutine and just the max_clients limits of the brokers apply. Clients that find no free stream poll instead.
+
+    Args:
+        limit (Optional[int]): Number of streams, None for no limit.
+    """
+
+    def __init__(self, limit: Optional[int] = None) -> None:
+        self.limit: Optional[int] = limit
+        self._open: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        """Derive the limit from the server settings of the (validated) plugin configuration."""
+        mode = config.get('server_mode', 'pooled')
+        workers = int(config.get('server_workers', 8))
+        if mode == 'simple':
+            self.limit = 0
+        elif mode == 'pooled':
+            limit = config.get('server_max_streams')
+            self.limit = min(int(limit), workers - 1) if limit is not None else workers // 4
+        else:
+            self.limit = config.get('server_max_streams')
+
+    @property
+    def available(self) -> bool:
+        """Whether streams can be opened at all."""
+        return self.limit is None or self.limit > 0
+
+    def is_exhausted(self) -> bool:
+        """Return True if no further stream may be opened."""
+        return self.limit is not None and self._open >= self.limit
+
+    def acquire(self) -> bool:
+        """Take a stream slot, False if none is free."""
+        with self._lock:
+            if self.limit is not None and self._open >= self.limit:
+                return False
+            self._open += 1
+            return True
+
+    def release(self) -> None:
+        """Give a stream slot back."""
+        with self._lock:
+            self._open = max(self._open - 1, 0)
+
+
+class EventBroker:  # pylint: disable=too-many-instance-attributes
+    """
+    Observes the CarConnectivity object tree and fans out changes to the connected event stream clients.
+
+    Each change is serialized once, stored in a bounded history for clients reconnecting with Last-Event-ID
+    and handed to the queues of all subscribers interested in the changed subtree. The history is also the
+    change journal of the delta JSON API (see delta()). Updates that leave the value unchanged only refresh
+    the timestamps, they are kept in the journal but not streamed, and only the newest one per element.
+
+    Args:
+        history (int): Number of past events kept for reconnecting clients.
+        max_pending (int): Number of events that may be pending per client before it is reset.
+        max_clients (int): Number of concurrently connected clients.
+        heartbeat (float): Seconds between heartbeat comments on idle streams.
+        budget (Optional[StreamBudget]): Stream slots shared with other brokers, every client takes one.
+    """
+
+    EVENT_NAME: str = 'change'
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, history: int = 1000, max_pending: int = 256, max_clients: int = 64, heartbeat: float = 15.0,
+                 budget: Optional[StreamBudget] = None) -> None:
+        self.instance: str = uuid.uuid4().hex[:8]
+        self.max_pending: int = max_pending
+        self.max_clients: int = max_clients
+        self.heartbeat: float = heartbeat
+        self.budget: Optional[StreamBudget] = budget
+        self._history: Deque[ChangeEvent] = deque(maxlen=history)
+        self._subscribers: Set[EventSubscriber] = set()
+        self._last_id: int = 0
+        # The history holds every change after this id and time, older ones were dropped or not observed
+        self._journal_start_id: int = 0
+        self._journal_start_time: Optional[datetime] = None
+        # Journal-only update event in the history by path, replaced by the next event of the same element
+        self._updates: Dict[str, ChangeEvent] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._car_connectivity: Optional[CarConnectivity] = None
+        self._active: bool = False
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        """Apply the event stream settings of the plugin configuration."""
+        if config.get('events_history') is not None:
+            self._history = deque(self._history, maxlen=int(config['events_history']))
+        if config.get('events_max_pending') is not None:
+            self.max_pending = int(config['events_max_pending'])
+        if config.get('events_max_clients') is not None:
+            self.max_clients = int(config['events_max_clients'])
+        if config.get('events_heartbeat') is not None:
+            self.heartbeat = float(config['events_heartbeat'])
+
+    def attach(self, car_connectivity: CarConnectivity) -> None:
+        """Start observing the object tree of car_connectivity."""
+        # The observer is registered only once and deactivated on detach(), Observable.remove_observer()
+        # would also drop the observers of everybody else
+        if self._car_connectivity is not car_connectivity:
+            self._car_connectivity = car_connectivity
+            car_connectivity.add_observer(self._on_change, Observable.ObserverEvent.VALUE_CHANGED | Observable.ObserverEvent.ENABLED
+                                          | Observable.ObserverEvent.DISABLED | Observable.ObserverEvent.UPDATED
+                                          | Observable.ObserverEvent.UPDATED_NEW_MEASUREMENT, priority=Observable.ObserverPriority.USER_LOW)
+        with self._lock:
+            # Changes while detached were not observed
+            self._journal_start_id = self._last_id
+            self._journal_start_time = datetime.now(tz=timezone.utc)
+        self._active = True
+
+    def detach(self) -> None:
+        """Stop observing and close all open streams."""
+        self._active = False
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self._subscribers.clear()
+        for subscriber in subscribers:
+            if self.budget is not None:
+                self.budget.release()
+            subscriber.close()
+
+    @property
+    def last_id(self) -> int:
+        """Id of the newest event."""
+        return self._last_id
+
+    def format_id(self, event_id: int) -> str:
+        """Return the id sent to clients, it is bound to this process so ids of a previous run are not mistaken."""
+        return f'{self.instance}-{event_id}'
+
+    def parse_id(self, last_event_id: Optional[str]) -> Optional[int]:
+        """Return the event id from a Last-Event-ID value, or None if it is missing or from another run."""
+        if not last_event_id:
+            return None
+        instance, _, event_id = last_event_id.partition('-')
+        if instance != self.instance or not event_id.isdigit():
+            return None
+        return int(event_id)
+
+    def is_full(self) -> bool:
+        """Return True if the maximum number of clients is connected or the stream budget is used up."""
+        return len(self._subscribers) >= self.max_clients or (self.budget is not None and self.budget.is_exhausted())
+
+    def subscribe(self, prefix: str) -> Optional[EventSubscriber]:
+        """
+        Register a new client for the subtree at prefix.
+
+        Returns:
+            Optional[EventSubscriber]: The subscriber, or None if the maximum number of clients is reached.
+        """
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients or (self.budget is not None and not self.budget.acquire()):
+                return None
+            subscriber = EventSubscriber(prefix, self.max_pending)
+            # Every event after this one will be queued for the subscriber
+            subscriber.start_id = self._last_id
+            self._subscribers.add(subscriber)
+            return subscriber
+
+    def unsubscribe(self, subscriber: EventSubscriber) -> None:
+        """Remove a client."""
+        with self._lock:
+            if subscriber not in self._subscribers:
+                return
+            self._subscribers.discard(subscriber)
+        if self.budget is not None:
+            self.budget.release()
+
+    def events_since(self, event_id: int, prefix: str) -> Optional[Tuple[List[ChangeEvent], int]]:
+        """
+        Return the events after event_id for the subtree at prefix.
+
+        Returns:
+            Optional[Tuple[List[ChangeEvent], int]]: The events and the id of the newest event at that time,
+                or None if the history does not reach back far enough.
+        """
+        with self._lock:
+            if event_id > self._last_id or event_id < self._journal_start_id:
+                return None
+            return [event for event in self._history if event.event_id > event_id and event.matches(prefix)], self._last_id
+
+    def events_since_time(self, time: datetime, prefix: str) -> Optional[Tuple[List[ChangeEvent], int]]:
+        """
+        Return the events observed after time for the subtree at prefix.
+
+        Returns:
+            Optional[Tuple[List[ChangeEvent], int]]: The events and the id of the newest event at that time,
+                or None if the history does not reach back far enough.
+        """
+        with self._lock:
+            if self._journal_start_time is None or time < self._journal_start_time:
+                return None
+            return [event for event in self._history if event.time > time and event.matches(prefix)], self._last_id
+
+    def delta(self, since: str, prefix: str) -> Optional[Tuple[Dict[str, Dict[str, Any]], int]]:
+        """
+        Collect the changes in the subtree at prefix since a version (an event id as format_id() returns it) or an ISO timestamp.
+
+        Several changes of the same element are collapsed into its newest state.
+
+        Returns:
+            Optional[Tuple[Dict[str, Dict[str, Any]], int]]: The new state of each changed element by path and the id
+                of the newest event, or None if the changes are not known (not observed, too old or from another run).
+
+        Raises:
+            ValueError: If since is neither a version nor a timestamp.
+        """
+        if not self._active:
+            return None
+        instance, _, event_id = since.partition('-')
+        if event_id.isdigit() and len(instance) == len(self.instance):
+            # A version of a previous run is not known any more
+            found = self.events_since(int(event_id), prefix) if instance == self.instance else None
+        else:
+            try:
+                time = datetime.fromisoformat(since)
+            except ValueError as err:
+                raise ValueError(f'Invalid since "{since}", must be a version or an ISO 8601 timestamp') from err
+            if time.tzinfo is None:
+                time = time.replace(tzinfo=timezone.utc)
+            found = self.events_since_time(time, prefix)
+        if found is None:
+            return None
+        events, newest_id = found
+        changes: Dict[str, Dict[str, Any]] = {}
+        for event in events:
+            # Ordered by the newest change
+            changes.pop(event.path, None)
+            changes[event.path] = event.values
+        return changes, newest_id
+
+    def _on_change(self, element: Any, flags: Observable.ObserverEvent) -> None:
+        if not self._active or element is self._car_connectivity:
+            return
+        if not flags & (Observable.ObserverEvent.VALUE_CHANGED | Observable.ObserverEvent.ENABLED | Observable.ObserverEvent.DISABLED):
+            if isinstance(element, GenericAttribute):
+                self._on_update(element)
+            return
+        payload: Dict[str, Any] = {'path': element.get_absolute_path()}
+        if flags & Observable.ObserverEvent.DISABLED:
+            payload['enabled'] = False
+        elif isinstance(element, GenericAttribute):
+            if SUPPORT_IMAGES and isinstance(element.value, Image.Image):
+                payload['image'] = True
+            else:
+                payload.update(element.as_dict() or {})
+                payload['html'] = _format_html(element)
+            if flags & Observable.ObserverEvent.ENABLED:
+                payload['enabled'] = True
+        else:
+            payload['enabled'] = True
+        data = json.dumps(payload, cls=ExtendedWithNullEncoder, skipkeys=True, separators=(',', ':'))
+        values = {key: value for key, value in payload.items() if key not in ('path', 'html')}
+        event = self._record(payload['path'], data, values, live=True)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.push(event)
+
+    def _on_update(self, element: GenericAttribute) -> None:
+        # The value was written again (or measured anew) without changing, only the timestamps of the delta JSON API move
+        if SUPPORT_IMAGES and isinstance(element.value, Image.Image):
+            return
+        self._record(element.get_absolute_path(), '', element.as_dict() or {}, live=False)
+
+    def _record(self, path: str, data: str, values: Dict[str, Any], live: bool) -> ChangeEvent:
+        with self._lock:
+            self._last_id += 1
+            event = ChangeEvent(self._last_id, path, data, values, datetime.now(tz=timezone.utc), live=live)
+            # An earlier update of the element is superseded, delta() would collapse it into this event anyway
+            superseded = self._updates.pop(path, None)
+            if superseded is not None:
+                self._history.remove(superseded)
+            if self._history.maxlen is not None and len(self._history) == self._history.maxlen:
+                # The oldest event is dropped, changes up to its time are no longer known
+                dropped = self._history[0]
+                self._journal_start_id = dropped.event_id
+                self._journal_start_time = dropped.time
+                if self._updates.get(dropped.path) is dropped:
+                    del self._updates[dropped.path]
+            self._history.append(event)
+            if not live:
+                self._updates[path] = event
+        return event
+
+    def stream(self, prefix: str, last_event_id: Optional[str]) -> Iterator[str]:
+        """Blocking event stream for WSGI servers, one worker thread is occupied per client."""
+        # Subscribe only once the stream is consumed, so an unsent response does not leave a subscriber behind
+        subscriber = self.subscribe(prefix)
+        if subscriber is None:
+            yield self._format_reset()
+            return
+        try:
+            last_sent, chunk = self._stream_start(subscriber, last_event_id)
+            yield chunk
+            while not subscriber.closed:
+                subscriber.wait(self.heartbeat)
+                last_sent, chunk = self._stream_next(subscriber, last_sent)
+                yield chunk
+        finally:
+            self.unsubscribe(subscriber)
+
+    async def stream_async(self, prefix: str, last_event_id: Optional[str]) -> AsyncIterator[str]:
+        """Event stream for the ASGI server, one coroutine per client."""
+        subscriber = self.subscribe(prefix)
+        if subscriber is None:
+            yield self._format_reset()
+            return
+        subscriber.bind_loop()
+        try:
+            last_sent, chunk = self._stream_start(subscriber, last_event_id)
+            yield chunk
+            while not subscriber.closed:
+                await subscriber.wait_async(self.heartbeat)
+                last_sent, chunk = self._stream_next(subscriber, last_sent)
+                yield chunk
+        finally:
+            self.unsubscribe(subscriber)
+
+    def _stream_start(self, subscriber: EventSubscriber, last_event_id: Optional[str]) -> Tuple[int, str]:
+        chunk = 'retry: 3000\nevent: hello\ndata: {}\n\n'
+        if last_event_id:
+            event_id = self.parse_id(last_event_id)
+            replay = self.events_since(event_id, subscriber.prefix) if event_id is not None else None
+            if replay is None:
+                return self.last_id, chunk + self._format_reset()
+            events, newest_id = replay
+            return newest_id, chunk + ''.join(self._format_event(event) for event in events if event.live)
+        # Fresh clients start at the position they subscribed at, so a reconnect replays everything after it
+        return subscriber.start_id, f'retry: 3000\nid: {self.format_id(subscriber.start_id)}\nevent: hello\ndata: {{}}\n\n'
+
+    def _stream_next(self, subscriber: EventSubscriber, last_sent: int) -> Tuple[int, str]:
+        events, overflowed = subscriber.take()
+        if overflowed:
+            return self.last_id, self._format_reset()
+        chunks: List[str] = []
+        for event in events:
+            # Events replayed from the history may also have been queued
+            if event.event_id > last_sent:
+                chunks.append(self._format_event(event))
+                last_sent = event.event_id
+        if not chunks:
+            return last_sent, ': heartbeat\n\n'
+        return last_sent, ''.join(chunks)
+
+    def _format_event(self, event: ChangeEvent) -> str:
+        return f'id: {self.format_id(event.event_id)}\nevent: {self.EVENT_NAME}\ndata: {event.data}\n\n'
+
+    def _format_reset(self) -> str:
+        return f'id: {self.format_id(self.last_id)}\nevent: reset\ndata: {{}}\n\n'
+
+
+def _format_html(element: GenericAttribute) -> str:
+    # Same markup as the value cells rendered by the templates
+    from carconnectivity_plugins.webui.django_app.templatetags.carconnectivity_filters import format_cc_element
+    return str(format_cc_element(element, ''))
+
+
+_stream_budget: StreamBudget = StreamBudget()
+_event_broker: EventBroker = EventBroker(budget=_stream_budget)
+
+
+def get_stream_budget() -> StreamBudget:
+    """Get the budget of open event streams."""
+    return _stream_budget
+
+
+def get_event_broker() -> EventBroker:
+    """Get the event broker."""
+    return _event_broker
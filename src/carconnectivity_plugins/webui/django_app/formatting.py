@@ -0,0 +1,248 @@
+"""Cached HTML rendering of CarConnectivity elements for the templates and the live updates."""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import locale
+import weakref
+from decimal import Decimal
+from enum import Enum
+from functools import lru_cache
+
+from django.utils.html import escape
+from django.utils.safestring import SafeString
+from django.utils.translation import get_language
+
+from carconnectivity.attributes import GenericAttribute, FloatAttribute
+from carconnectivity.objects import GenericObject
+
+from carconnectivity_plugins.webui.django_app.cache import VersionedResponseCache, get_change_versions
+
+if TYPE_CHECKING:
+    from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+def numeric_locale() -> str:
+    """Locale numbers are formatted with (LC_NUMERIC of the process), part of every cache key."""
+    return locale.setlocale(locale.LC_NUMERIC)
+
+
+@lru_cache(maxsize=64)
+def precision_digits(precision: float) -> int:
+    """Number of decimal places needed to show a value with the given precision, e.g. 2 for 0.01."""
+    digits = 0
+    while precision < 1:
+        digits += 1
+        precision *= 10
+    return digits
+
+
+def _enum_text(value: Enum) -> str:
+    # Clean enum values - remove class prefix
+    text = str(value.value)
+    if '.' in text:
+        text = text.split('.')[-1]
+    return text.replace('_', ' ').title()
+
+
+def _plain_value(attribute: GenericAttribute) -> Tuple[Any, Any]:
+    if isinstance(attribute.value, Enum):
+        return _enum_text(attribute.value), None
+    return attribute.in_locale(locale=None)
+
+
+def _float_value(attribute: GenericAttribute) -> Tuple[Any, Any]:
+    if isinstance(attribute.value, Enum):
+        return _enum_text(attribute.value), None
+    value, unit = attribute.in_locale(locale=None)
+    if value is not None and attribute.precision is not None:
+        digits = precision_digits(attribute.precision)
+        value = f'{round(value, digits):.{digits}f}'
+    elif value is not None:
+        value = f'{Decimal(value):n}'
+    return value, unit
+
+
+@lru_cache(maxsize=None)
+def value_formatter(attribute_class: type) -> Callable[[GenericAttribute], Tuple[Any, Any]]:
+    """Format plan of an attribute class: the function returning the display value and unit of its instances."""
+    if issubclass(attribute_class, FloatAttribute):
+        return _float_value
+    return _plain_value
+
+
+@lru_cache(maxsize=None)
+def is_capabilities_class(object_class: type) -> bool:
+    """Whether objects of this class are rendered as capability badges."""
+    return 'capabilities' in str(object_class).lower()
+
+
+def _attribute_version(attribute: GenericAttribute) -> Tuple[Any, ...]:
+    # last_changed alone is not enough: it is the measurement time, which a new value may share with the previous one
+    return (attribute.last_changed, attribute.value, attribute.unit)
+
+
+class ElementRenderer:
+    """
+    Renders CarConnectivity elements to HTML, keeping the result of every attribute until it changes.
+
+    Attributes are cached by their path, the way they are rendered and the numeric locale, and their rendering
+    is reused as long as the attribute did not change (last_changed, value and unit). Objects are cached for
+    the change version of their vehicle (or of the whole tree outside the garage), their attribute children are
+    taken from the attribute cache when the object has to be rendered again.
+
+    Args:
+        max_entries (int): Maximum number of cached renderings.
+    """
+
+    def __init__(self, max_entries: int = 4096) -> None:
+        self._cache: VersionedResponseCache = VersionedResponseCache(max_entries=max_entries)
+        # Elements never move in the tree, their path is computed once
+        self._paths: weakref.WeakKeyDictionary[Any, str] = weakref.WeakKeyDictionary()
+
+    def path(self, element: Any) -> str:
+        """Absolute path of element, memoized."""
+        path = self._paths.get(element)
+        if path is None:
+            path = element.get_absolute_path()
+            self._paths[element] = path
+        return path
+
+    def render(self, element: Any, alt_title: Optional[str] = None, linebreak: bool = False) -> str:
+        """
+        Render element as HTML, see the format_cc_element template filter.
+
+        Returns:
+            str: The escaped HTML as SafeString, empty for disabled elements.
+        """
+        if isinstance(element, GenericAttribute):
+            if not element.enabled:
+                return ''
+            key: Hashable = (self.path(element), 'attribute', alt_title, linebreak, numeric_locale())
+            return self._cache.get_or_compute(key, _attribute_version(element),
+                                              lambda: SafeString(self._render_attribute(element, alt_title, linebreak)))
+        if isinstance(element, GenericObject):
+            if not element.enabled:
+                return ''
+            path: str = self.path(element)
+            key = (path, 'object', alt_title, linebreak, numeric_locale())
+            return self._cache.get_or_compute(key, get_change_versions().scope_version(path),
+                                              lambda: SafeString(self._render_object(element, linebreak)))
+        return str(element)
+
+    def stats(self) -> Dict[str, int]:
+        """Lookup counters and current size, for the metrics."""
+        return self._cache.stats()
+
+    def clear(self) -> None:
+        """Drop all cached renderings."""
+        self._cache.clear()
+        self._paths.clear()
+
+    @staticmethod
+    def _render_attribute(attribute: GenericAttribute, alt_title: Optional[str], linebreak: bool) -> str:
+        title = escape(alt_title if alt_title is not None else attribute.name)
+        value, unit = value_formatter(type(attribute))(attribute)
+        parts = [title, ': ', escape(str(value))] if title else [escape(str(value))]
+        if unit is not None:
+            parts.append(escape(str(unit)))
+        if linebreak:
+            parts.append('<br>')
+        return ''.join(parts)
+
+    def _render_item(self, attribute: Any) -> str:
+        # Key/value tile of an attribute of a nested object (drives, charging, position, ...)
+        if isinstance(attribute, GenericAttribute):
+            key: Hashable = (self.path(attribute), 'item', numeric_locale())
+            return self._cache.get_or_compute(key, _attribute_version(attribute), lambda: self._render_item_uncached(attribute))
+        return self._render_item_uncached(attribute)
+
+    @staticmethod
+    def _render_item_uncached(attribute: Any) -> str:
+        key = escape(attribute.id).replace('_', ' ').title()
+        if isinstance(attribute.value, Enum):
+            value = escape(_enum_text(attribute.value))
+        elif isinstance(attribute.value, float):
+            # Round floats to 1 decimal place
+            value = f'{attribute.value:.1f}'
+        else:
+            value = escape(str(attribute.value))
+        unit = ''
+        if getattr(attribute, 'unit', None):
+            unit = escape(str(attribute.unit))
+        return f'<div style="margin-bottom: 8px;"><span style="color: var(--color-text-secondary); font-size: var(--font-size-sm);">{key}:</span> ' \
+            f'<span style="color: var(--color-text-primary); font-weight: var(--font-weight-medium);">{value}{unit}</span></div>'
+
+    def _render_object(self, element: GenericObject, linebreak: bool) -> str:
+        children = element.children
+        # Special handling for capabilities - display as badges
+        if element.id == 'capabilities' or is_capabilities_class(type(element)):
+            badges = []
+            for child in children:
+                if child.enabled:
+                    child_id = escape(child.id).replace('_', ' ').title()
+                    child_text = str(child).lower()
+                    status_class = 'badge-success' if 'status' in child_text and 'true' in child_text else 'badge-primary'
+                    badges.append(f'<span class="badge {status_class}" style="margin: 2px; display: inline-block;">{child_id}</span>')
+            return '<div style="display: flex; flex-wrap: wrap; gap: 4px;">' + ''.join(badges) + '</div>'
+
+        # Special handling for nested objects (drives, charging, position_location, etc)
+        if any(hasattr(child, 'value') for child in children):
+            items = [self._render_item(child) for child in children if child.enabled and hasattr(child, 'value')]
+            if items:
+                return '<div style="display: grid; grid-template-columns: repeat(auto-fill, minmax(200px, 1fr)); gap: var(--space-sm);">' \
+                    + ''.join(items) + '</div>'
+
+        # Default handling for other objects
+        parts = [self.render(child, child.id, linebreak) for child in children if child.enabled]
+        if linebreak:
+            parts.append('<br>')
+        return ''.join(parts)
+
+
+class FragmentCache:
+    """
+    Rendered template fragments showing one CarConnectivity object, e.g. a section of the vehicle page.
+
+    A fragment is rendered again only when the change version of the object's subtree moved (for a
+    vehicle section only changes inside the section count) or the language or numeric locale differ.
+    Fragments must not depend on anything else than the object, e.g. the request or the user.
+
+    Args:
+        max_entries (int): Maximum number of cached fragments.
+    """
+
+    def __init__(self, max_entries: int = 512) -> None:
+        self._cache: VersionedResponseCache = VersionedResponseCache(max_entries=max_entries)
+
+    def get_or_render(self, name: Hashable, element: Any, render: Callable[[], str]) -> str:
+        """
+        Return the cached fragment name of element, rendering it if its subtree changed.
+
+        Args:
+            name: Identifies the fragment, together with the path of element.
+            element (GenericObject): The object the fragment shows.
+            render (Callable[[], str]): Renders the fragment.
+        """
+        path: str = _element_renderer.path(element)
+        return self._cache.get_or_compute((name, path, get_language(), numeric_locale()), get_change_versions().scope_version(path), render)
+
+    def stats(self) -> Dict[str, int]:
+        """Lookup counters and current size, for the metrics."""
+        return self._cache.stats()
+
+    def clear(self) -> None:
+        """Drop all fragments."""
+        self._cache.clear()
+
+
+_element_renderer: ElementRenderer = ElementRenderer()
+_fragment_cache: FragmentCache = FragmentCache()
+
+
+def get_element_renderer() -> ElementRenderer:
+    """Get the renderer used by the format_cc_element filter and the live updates."""
+    return _element_renderer
+
+
+def get_fragment_cache() -> FragmentCache:
+    """Get the cache of the cc_fragment template tag."""
+    return _fragment_cache
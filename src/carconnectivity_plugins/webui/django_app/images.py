@@ -0,0 +1,363 @@
+"""Cache of encoded vehicle images."""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import io
+import logging
+import queue
+import threading
+from base64 import b64encode
+from collections import OrderedDict
+
+from carconnectivity.observable import Observable
+
+from carconnectivity_plugins.webui.django_app.cache import attribute_version
+
+if TYPE_CHECKING:
+    from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple, Union
+    from carconnectivity.attributes import GenericAttribute
+    from carconnectivity.carconnectivity import CarConnectivity
+
+LOG: logging.Logger = logging.getLogger("carconnectivity.plugins.webui")
+
+# Check if PIL is available
+SUPPORT_IMAGES = False
+try:
+    from PIL import Image, features
+    SUPPORT_IMAGES = True
+except ImportError:
+    pass
+
+# Widths (and heights) resized variants are generated for, requested sizes are rounded up to one of them
+IMAGE_SIZES: Tuple[int, ...] = (160, 320, 480, 640, 960, 1280)
+
+# Widths pre-rendered by default: what the sizes hints of the garage (33vw to 100vw) and vehicle pages (33vw or
+# 100vw) select on common desktop and high density mobile screens. Other widths are encoded on first request
+PRERENDER_SIZES: Tuple[int, ...] = (640, 960)
+
+# Format name: (Pillow format, content type, save options), in order of preference
+IMAGE_FORMATS: Dict[str, Tuple[str, str, Dict[str, Any]]] = {}
+if SUPPORT_IMAGES:
+    for _name, _feature, _pil_format, _content_type, _options in (('avif', 'avif', 'AVIF', 'image/avif', {'quality': 60}),
+                                                                  ('webp', 'webp', 'WEBP', 'image/webp', {'quality': 80, 'method': 4})):
+        try:
+            if features.check(_feature):
+                IMAGE_FORMATS[_name] = (_pil_format, _content_type, _options)
+        except ValueError:
+            # Feature unknown to this Pillow version
+            pass
+    IMAGE_FORMATS['png'] = ('PNG', 'image/png', {})
+
+
+def encode_variant(image: Any, image_format: str, width: Optional[int] = None, height: Optional[int] = None) -> bytes:
+    """
+    Encode a PIL image in one of IMAGE_FORMATS, scaled down to fit width and height.
+
+    Images are never scaled up and keep their aspect ratio.
+    """
+    pil_format, _, options = IMAGE_FORMATS[image_format]
+    if (width is not None and image.width > width) or (height is not None and image.height > height):
+        image = image.copy()
+        image.thumbnail((width or image.width, height or image.height), Image.Resampling.LANCZOS)
+    if pil_format != 'PNG' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    img_io = io.BytesIO()
+    image.save(img_io, pil_format, **options)
+    return img_io.getvalue()
+
+
+def negotiate_format(accept: str) -> str:
+    """
+    Pick the preferred image format the client explicitly accepts.
+
+    A wildcard does not count, browsers send image/webp or image/avif when they can decode it.
+    """
+    accepted = {media_range.split(';', 1)[0].strip().lower() for media_range in accept.split(',')}
+    for name, (_, content_type, _) in IMAGE_FORMATS.items():
+        if content_type in accepted:
+            return name
+    return 'png'
+
+
+def round_size(requested: int) -> int:
+    """Round a positive width or height up to the next of IMAGE_SIZES, the largest for anything above."""
+    for size in IMAGE_SIZES:
+        if size >= requested:
+            return size
+    return IMAGE_SIZES[-1]
+
+
+def snap_size(value: Optional[str]) -> Optional[int]:
+    """
+    Round a requested width or height (query parameter) up to the next of IMAGE_SIZES.
+
+    Returns:
+        Optional[int]: The size, or None if nothing usable was requested (full size)
+    """
+    if not value:
+        return None
+    try:
+        requested = int(value)
+    except ValueError:
+        return None
+    if requested <= 0:
+        return None
+    return round_size(requested)
+
+
+class ImageCache:
+    """
+    Memory capped LRU cache of encoded vehicle images.
+
+    Entries are keyed by VIN, image id and variant (format and size, or a base64 string) and hold the
+    version (the time the image attribute last changed) they were encoded from. A lookup for another
+    version encodes again, and an observer drops the entries of an image as soon as it changes.
+
+    Args:
+        max_bytes (int): Maximum total size of the cached data.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self.max_bytes: int = max_bytes
+        self._entries: OrderedDict[Tuple[str, str, Hashable], Tuple[str, Union[bytes, str]]] = OrderedDict()
+        self._size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._lock: threading.Lock = threading.Lock()
+        self._car_connectivity: Optional[CarConnectivity] = None
+        self._active: bool = False
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        """Apply the image cache settings of the plugin configuration."""
+        if config.get('image_cache_size') is not None:
+            self.max_bytes = int(float(config['image_cache_size']) * 1024 * 1024)
+
+    def attach(self, car_connectivity: CarConnectivity) -> None:
+        """Start dropping entries of images that change in car_connectivity."""
+        # The observer is registered only once and deactivated on detach(), Observable.remove_observer()
+        # would also drop the observers of everybody else
+        if self._car_connectivity is not car_connectivity:
+            self._car_connectivity = car_connectivity
+            car_connectivity.add_observer(self._on_change, Observable.ObserverEvent.VALUE_CHANGED | Observable.ObserverEvent.DISABLED,
+                                          priority=Observable.ObserverPriority.INTERNAL_FIRST)
+        self._active = True
+
+    def detach(self) -> None:
+        """Stop observing and drop all entries."""
+        self._active = False
+        self.clear()
+
+    @property
+    def size(self) -> int:
+        """Total size of the cached data in bytes."""
+        return self._size
+
+    def stats(self) -> Dict[str, int]:
+        """Lookup counters and current size, for the metrics."""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self._entries), 'bytes': self._size}
+
+    def get_or_encode(self, vin: str, image_id: str, attribute: GenericAttribute, variant: Hashable,
+                      encode: Callable[[Any], Union[bytes, str]]) -> Union[bytes, str]:
+        """
+        Return the encoded image, encoding it only if the cache has no entry for its current value.
+
+        Args:
+            vin (str): VIN of the vehicle the image belongs to.
+            image_id (str): Id of the image, e.g. car_picture.
+            attribute (GenericAttribute): The image attribute.
+            variant (Hashable): Identifies the encoding, e.g. ('webp', 320, None) or 'png_base64'.
+            encode (Callable[[Any], Union[bytes, str]]): Encodes the image value.
+
+        Returns:
+            Union[bytes, str]: The encoded image.
+        """
+        version = attribute_version(attribute)
+        value = attribute.value
+        if version is None or not self._active:
+            return encode(value)
+        key = (vin, image_id, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        data = encode(value)
+        with self._lock:
+            self._remove(key)
+            if len(data) <= self.max_bytes:
+                self._entries[key] = (version, data)
+                self._size += len(data)
+                while self._size > self.max_bytes:
+                    self._remove(next(iter(self._entries)))
+                    self.evictions += 1
+        return data
+
+    def get_image(self, vin: str, image_id: str, attribute: GenericAttribute, image_format: str = 'png',
+                  width: Optional[int] = None, height: Optional[int] = None) -> bytes:
+        """Return the image encoded in image_format and scaled down to width and height, see encode_variant()."""
+        return self.get_or_encode(vin, image_id, attribute, (image_format, width, height),
+                                  lambda image: encode_variant(image, image_format, width, height))
+
+    def get_base64(self, vin: str, image_id: str, attribute: GenericAttribute) -> str:
+        """Return the full size PNG as base64 string, derived from the cached PNG."""
+        return self.get_or_encode(vin, image_id, attribute, 'png_base64',
+                                  lambda image: b64encode(self.get_image(vin, image_id, attribute)).decode())
+
+    def invalidate(self, vin: str, image_id: Optional[str] = None) -> None:
+        """Drop all entries of a vehicle, or of one of its images."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == vin and (image_id is None or key[1] == image_id)]:
+                self._remove(key)
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key: Tuple[str, str, Hashable]) -> None:
+        # Caller holds the lock
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+    def _on_change(self, element: Any, flags: Observable.ObserverEvent) -> None:
+        del flags
+        if not self._active:
+            return
+        # ['', 'garage', '<vin>', 'images', '<image id>']
+        parts = element.get_absolute_path().split('/')
+        if len(parts) == 5 and parts[1] == 'garage' and parts[3] == 'images':
+            self.invalidate(parts[2], parts[4])
+        elif len(parts) == 3 and parts[1] == 'garage':
+            # The vehicle itself was disabled
+            self.invalidate(parts[2])
+
+
+class ImagePrerenderer:
+    """
+    Background worker encoding vehicle pictures into the image cache before they are requested.
+
+    All pictures are encoded when the worker starts and again whenever a connector changes one. Only the full size
+    PNG and the variants browsers most likely request are encoded (encoding AVIF in particular is slow and runs in
+    the plugin process), any other variant is encoded on its first request and cached from then on.
+
+    Args:
+        image_cache (ImageCache): The cache to fill.
+        sizes (List[int]): Widths to encode, rounded up to IMAGE_SIZES.
+        formats (List[str]): Formats of IMAGE_FORMATS to encode the widths in, default is the preferred one.
+    """
+
+    IMAGE_ID: str = 'car_picture'
+
+    def __init__(self, image_cache: ImageCache, sizes: Optional[List[int]] = None, formats: Optional[List[str]] = None) -> None:
+        self.image_cache: ImageCache = image_cache
+        self.enabled: bool = True
+        self.sizes: List[int] = list(PRERENDER_SIZES) if sizes is None else sizes
+        # Modern browsers all accept the first (preferred) format
+        self.formats: List[str] = list(IMAGE_FORMATS)[:1] if formats is None else formats
+        self._queue: queue.Queue[Optional[str]] = queue.Queue()
+        self._pending: Set[str] = set()
+        self._lock: threading.Lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._car_connectivity: Optional[CarConnectivity] = None
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        """Apply the pre-rendering settings of the plugin configuration."""
+        if config.get('image_prerender') is not None:
+            self.enabled = bool(config['image_prerender'])
+        if config.get('image_prerender_sizes') is not None:
+            self.sizes = [int(size) for size in config['image_prerender_sizes']]
+        if config.get('image_prerender_formats') is not None:
+            # Formats this Pillow cannot encode are skipped
+            self.formats = [image_format for image_format in config['image_prerender_formats'] if image_format in IMAGE_FORMATS]
+
+    def start(self, car_connectivity: CarConnectivity) -> None:
+        """Start the worker and queue all vehicles."""
+        if not self.enabled or not SUPPORT_IMAGES or self._thread is not None:
+            return
+        # Registered once, like the other observers, and ignored while the worker is not running
+        if self._car_connectivity is not car_connectivity:
+            self._car_connectivity = car_connectivity
+            car_connectivity.add_observer(self._on_change, Observable.ObserverEvent.VALUE_CHANGED,
+                                          priority=Observable.ObserverPriority.USER_LOW)
+        self._thread = threading.Thread(target=self._run, name='carconnectivity.plugins.webui-imageprerender', daemon=True)
+        self._thread.start()
+        if car_connectivity.garage is not None:
+            for vehicle in car_connectivity.garage.list_vehicles():
+                if vehicle.vin.value is not None:
+                    self.schedule(vehicle.vin.value)
+
+    def stop(self) -> None:
+        """Stop the worker after the image it is currently encoding."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._thread = None
+        self._queue.put(None)
+        thread.join(timeout=5)
+        with self._lock:
+            self._pending.clear()
+
+    def schedule(self, vin: str) -> None:
+        """Queue the picture of a vehicle for encoding, unless it is already queued."""
+        with self._lock:
+            if vin in self._pending:
+                return
+            self._pending.add(vin)
+        self._queue.put(vin)
+
+    def _run(self) -> None:
+        while True:
+            vin = self._queue.get()
+            if vin is None:
+                return
+            with self._lock:
+                self._pending.discard(vin)
+            try:
+                self._render(vin)
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                LOG.warning('Pre-rendering the picture of vehicle %s failed: %s', vin, err)
+
+    def _render(self, vin: str) -> None:
+        if self._car_connectivity is None or self._car_connectivity.garage is None:
+            return
+        vehicle = self._car_connectivity.garage.get_vehicle(vin)
+        if vehicle is None or self.IMAGE_ID not in vehicle.images.images:
+            return
+        attribute = vehicle.images.images[self.IMAGE_ID]
+        if not attribute.enabled or attribute.value is None:
+            return
+        self.image_cache.get_image(vin, self.IMAGE_ID, attribute)
+        self.image_cache.get_base64(vin, self.IMAGE_ID, attribute)
+        for width in sorted({round_size(size) for size in self.sizes if size > 0}):
+            for image_format in self.formats:
+                if self._thread is None:
+                    return
+                self.image_cache.get_image(vin, self.IMAGE_ID, attribute, image_format, width)
+        LOG.debug('Pre-rendered the picture of vehicle %s', vin)
+
+    def _on_change(self, element: Any, flags: Observable.ObserverEvent) -> None:
+        del flags
+        if self._thread is None:
+            return
+        # ['', 'garage', '<vin>', 'images', '<image id>']
+        parts = element.get_absolute_path().split('/')
+        if len(parts) == 5 and parts[1] == 'garage' and parts[3] == 'images' and parts[4] == self.IMAGE_ID:
+            self.schedule(parts[2])
+
+
+_image_cache: ImageCache = ImageCache()
+_image_prerenderer: ImagePrerenderer = ImagePrerenderer(_image_cache)
+
+
+def get_image_cache() -> ImageCache:
+    """Get the encoded image cache."""
+    return _image_cache
+
+
+def get_image_prerenderer() -> ImagePrerenderer:
+    """Get the background image pre-renderer."""
+    return _image_prerenderer
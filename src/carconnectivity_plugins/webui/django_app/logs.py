@@ -0,0 +1,408 @@
+"""Paging and filtering of CarConnectivity log storages for the log views and the log JSON API."""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import json
+import logging
+import threading
+import weakref
+from datetime import datetime, timezone
+
+from django.http import HttpResponseBadRequest, JsonResponse
+
+from carconnectivity_plugins.webui.ansi import ansi_to_html
+from carconnectivity_plugins.webui.django_app.events import EventBroker, StreamBudget, get_stream_budget
+
+if TYPE_CHECKING:
+    from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+    from django.http import HttpRequest, HttpResponse
+    from carconnectivity.carconnectivity import CarConnectivity
+
+LOG_FORMAT: str = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_LEVELS: Tuple[str, ...] = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+DEFAULT_PAGE_SIZE: int = 200
+MAX_PAGE_SIZE: int = 1000
+# Safety net for records kept alive elsewhere, the log storages themselves hold at most a few thousand
+MAX_CACHED_RECORDS: int = 10000
+
+_formatter: logging.Formatter = logging.Formatter(LOG_FORMAT)
+
+
+def get_log_formatter() -> logging.Formatter:
+    """Get the formatter all log views render records with."""
+    return _formatter
+
+
+def record_cursor(record: logging.LogRecord) -> str:
+    """
+    Cursor identifying a record in its log storage.
+
+    The object id alone could be reused once the record was dropped from the storage, the creation time makes it unique.
+    """
+    return f'{id(record):x}-{record.created:.6f}'
+
+
+class RecordHTMLCache:
+    """
+    Formatted and escaped HTML of log records, keyed by record identity.
+
+    Records are immutable once stored, so each one is formatted only once. Entries are held by weak references
+    to their record: when the log storage drops a record (and nothing else refers to it), its entry goes with it,
+    so the cache follows the retention of the storages without an eviction policy of its own.
+
+    Args:
+        max_entries (int): Upper bound of entries, the cache is cleared when exceeded.
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHED_RECORDS) -> None:
+        self.max_entries: int = max_entries
+        self._entries: weakref.WeakKeyDictionary[logging.LogRecord, str] = weakref.WeakKeyDictionary()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, record: logging.LogRecord) -> str:
+        """Get the HTML of record, formatting it on the first request."""
+        html = self._entries.get(record)
+        if html is None:
+            self.misses += 1
+            html = ansi_to_html(_formatter.format(record))
+            with self._lock:
+                if len(self._entries) >= self.max_entries:
+                    self.evictions += len(self._entries)
+                    self._entries.clear()
+                self._entries[record] = html
+        else:
+            self.hits += 1
+        return html
+
+    def stats(self) -> Dict[str, int]:
+        """Lookup counters and current size, for the metrics."""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self._entries)}
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+
+
+_record_html_cache: RecordHTMLCache = RecordHTMLCache()
+
+
+def get_record_html_cache() -> RecordHTMLCache:
+    """Get the cache of formatted log records."""
+    return _record_html_cache
+
+
+def format_record_html(record: logging.LogRecord) -> str:
+    """Format a record and convert it to HTML, memoized per record."""
+    return _record_html_cache.get(record)
+
+
+class LogQuery:
+    """
+    Page and filter parameters of a log request.
+
+    Args:
+        order (str): 'desc' for latest first, 'asc' for oldest first.
+        cursor (Optional[str]): Cursor of the last record of the previous page, the page starts after it.
+        limit (int): Maximum number of records.
+        level (int): Minimum level.
+        logger (Optional[str]): Only records of this logger and its children.
+        text (Optional[str]): Only records whose message contains this text (case insensitive).
+    """
+
+    def __init__(self, order: str = 'desc', cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE, level: int = logging.NOTSET,
+                 logger: Optional[str] = None, text: Optional[str] = None) -> None:
+        self.order: str = order
+        self.cursor: Optional[str] = cursor
+        self.limit: int = limit
+        self.level: int = level
+        self.logger: Optional[str] = logger
+        self.text: Optional[str] = text or None
+        self._text_lower: Optional[str] = text.lower() if text else None
+
+    @classmethod
+    def from_request(cls, request: HttpRequest) -> LogQuery:
+        """
+        Parse order, cursor, limit, level, logger and q query parameters.
+
+        Raises:
+            ValueError: If a parameter is invalid.
+        """
+        order = request.GET.get('order', 'desc')
+        if order not in ('desc', 'asc'):
+            raise ValueError(f'Invalid order {order}, must be desc or asc')
+        limit_str = request.GET.get('limit')
+        limit = DEFAULT_PAGE_SIZE
+        if limit_str:
+            if not limit_str.isdigit() or int(limit_str) < 1:
+                raise ValueError(f'Invalid limit {limit_str}, must be a positive number')
+            limit = min(int(limit_str), MAX_PAGE_SIZE)
+        return cls(order=order, cursor=request.GET.get('cursor') or None, limit=limit, level=parse_level(request.GET.get('level')),
+                   logger=request.GET.get('logger') or None, text=request.GET.get('q') or None)
+
+    @property
+    def level_name(self) -> str:
+        """Name of the minimum level, empty if not filtered by level."""
+        return logging.getLevelName(self.level) if self.level > logging.NOTSET else ''
+
+    @property
+    def filtered(self) -> bool:
+        """True if any filter is set."""
+        return self.level > logging.NOTSET or self.logger is not None or self.text is not None
+
+    def matches(self, record: logging.LogRecord) -> bool:
+        """Check if record passes the filters."""
+        if record.levelno < self.level:
+            return False
+        if self.logger is not None and record.name != self.logger and not record.name.startswith(self.logger + '.'):
+            return False
+        if self._text_lower is not None and self._text_lower not in record.getMessage().lower():
+            return False
+        return True
+
+
+def parse_level(level: Optional[str]) -> int:
+    """
+    Parse a level name (e.g. WARNING) or number.
+
+    Raises:
+        ValueError: If the level is unknown.
+    """
+    if not level:
+        return logging.NOTSET
+    if level.isdigit():
+        return int(level)
+    level_no = logging.getLevelName(level.upper())
+    if not isinstance(level_no, int):
+        raise ValueError(f'Invalid level {level}')
+    return level_no
+
+
+def _walk(storage: Deque[logging.LogRecord], query: LogQuery) -> Tuple[List[logging.LogRecord], bool]:
+    # Iterates the deque in place, records are only collected for the page
+    records: Iterator[logging.LogRecord] = reversed(storage) if query.order == 'desc' else iter(storage)
+    page: List[logging.LogRecord] = []
+    if query.cursor is not None:
+        for record in records:
+            if record_cursor(record) == query.cursor:
+                break
+        else:
+            # The cursor record was dropped from the storage. Older records are gone as well,
+            # in ascending order everything still stored is newer
+            if query.order == 'desc':
+                return page, False
+            records = iter(storage)
+    for record in records:
+        if query.matches(record):
+            if len(page) == query.limit:
+                return page, True
+            page.append(record)
+    return page, False
+
+
+def query_log(storage: Optional[Deque[logging.LogRecord]], query: LogQuery) -> Tuple[List[logging.LogRecord], bool]:
+    """
+    Get one page of records of a log storage without copying the storage.
+
+    Returns:
+        Tuple[List[logging.LogRecord], bool]: The records and whether more records follow
+    """
+    if not storage:
+        return [], False
+    for _ in range(3):
+        try:
+            return _walk(storage, query)
+        except RuntimeError:
+            # A record was logged while walking (deque mutated during iteration), start over
+            continue
+    # Logging is too busy to walk the deque in place, fall back to a snapshot
+    return _walk(type(storage)(list(storage)), query)
+
+
+def record_to_dict(record: logging.LogRecord) -> Dict[str, Any]:
+    """JSON representation of a record as returned by the log API and stream."""
+    return {
+        'cursor': record_cursor(record),
+        'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+        'level': record.levelname,
+        'logger': record.name,
+        'message': record.getMessage(),
+        'html': format_record_html(record),
+    }
+
+
+def log_page(storage: Optional[Deque[logging.LogRecord]], query: LogQuery) -> Dict[str, Any]:
+    """
+    Build the JSON document of one page of a log storage.
+
+    Returns:
+        Dict[str, Any]: records (with cursor, time, level, logger, message and html), next_cursor and total
+    """
+    records, more = query_log(storage, query)
+    return {
+        'records': [record_to_dict(record) for record in records],
+        'next_cursor': record_cursor(records[-1]) if records and more else None,
+        'total': len(storage) if storage else 0,
+    }
+
+
+def log_json_response(request: HttpRequest, storage: Optional[Deque[logging.LogRecord]]) -> HttpResponse:
+    """Answer a log JSON API request for storage."""
+    try:
+        query = LogQuery.from_request(request)
+    except ValueError as err:
+        return HttpResponseBadRequest(str(err))
+    return JsonResponse(log_page(storage, query))
+
+
+def log_context(request: HttpRequest, storage: Optional[Deque[logging.LogRecord]], json_url: str, scope: Optional[str] = None,
+                empty_text: str = '', stream_url: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Template context of components/log_viewer.html with the first page of storage.
+
+    Raises:
+        ValueError: If a query parameter is invalid.
+    """
+    query = LogQuery.from_request(request)
+    # The page itself starts at the top, the viewer loads further pages by cursor
+    query.cursor = None
+    return {
+        'log_page': log_page(storage, query),
+        'log_query': query,
+        'log_levels': LOG_LEVELS,
+        'log_json_url': json_url,
+        # Without stream slots (simple server) there is no live tail
+        'log_stream_url': stream_url if get_stream_budget().available else None,
+        'log_scope': scope,
+        'log_empty_text': empty_text,
+    }
+
+
+class LogEvent:
+    """
+    A record emitted to the log, formatted only once it is sent to a client.
+
+    It is not a ChangeEvent (it has no path or values for the delta JSON API), but provides what the streams of
+    EventBroker use: event_id, time, live, data and matches().
+
+    Attributes:
+        event_id (int): Monotonically increasing id of the event.
+        record (logging.LogRecord): The record.
+        time (datetime): When the record was created.
+    """
+    __slots__ = ('event_id', 'record', 'time', '_data')
+
+    # Every record is streamed
+    live: bool = True
+
+    def __init__(self, event_id: int, record: logging.LogRecord) -> None:
+        self.event_id: int = event_id
+        self.record: logging.LogRecord = record
+        self.time: datetime = datetime.fromtimestamp(record.created, tz=timezone.utc)
+        self._data: Optional[str] = None
+
+    @property
+    def data(self) -> str:
+        """JSON payload sent to the clients."""
+        if self._data is None:
+            self._data = json.dumps(record_to_dict(self.record), separators=(',', ':'))
+        return self._data
+
+    def matches(self, prefix: LogQuery) -> bool:
+        """Return True if the record passes the filters of the query."""
+        return prefix.matches(self.record)
+
+
+class _LogTailHandler(logging.Handler):
+    """Handler next to the CarConnectivity log storage handing every stored record to the log tail."""
+
+    def __init__(self, log_tail: LogTail) -> None:
+        super().__init__()
+        self.log_tail: LogTail = log_tail
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.log_tail.publish(record)
+
+
+class LogTail(EventBroker):
+    """
+    Live tail of the CarConnectivity log as Server-Sent Events.
+
+    A handler is attached to the logger the CarConnectivity log storage is attached to, with the same filters,
+    so the stream carries exactly the records that are stored. Records are only formatted when a stream sends
+    them, each client receives only new records that match its LogQuery.
+
+    Args:
+        history (int): Number of past records kept for clients reconnecting with Last-Event-ID.
+        max_pending (int): Number of records that may be pending per client before it is reset.
+        max_clients (int): Number of concurrently connected clients.
+        heartbeat (float): Seconds between heartbeat comments on idle streams.
+        budget (Optional[StreamBudget]): Stream slots shared with the live updates, every client takes one.
+    """
+
+    EVENT_NAME: str = 'log'
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, history: int = 200, max_pending: int = 256, max_clients: int = 16,
+                 heartbeat: float = 15.0, budget: Optional[StreamBudget] = None) -> None:
+        super().__init__(history=history, max_pending=max_pending, max_clients=max_clients, heartbeat=heartbeat, budget=budget)
+        self._handler: _LogTailHandler = _LogTailHandler(self)
+        self._logger: Optional[logging.Logger] = None
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        """Apply the log stream settings of the plugin configuration."""
+        if config.get('log_stream_max_clients') is not None:
+            self.max_clients = int(config['log_stream_max_clients'])
+        if config.get('events_heartbeat') is not None:
+            self.heartbeat = float(config['events_heartbeat'])
+
+    def attach(self, car_connectivity: CarConnectivity) -> None:
+        """Start receiving the records stored in the log storage of car_connectivity."""
+        self._car_connectivity = car_connectivity
+        storage_handler = car_connectivity.log_storage
+        self._handler.setLevel(storage_handler.level)
+        self._handler.filters = list(storage_handler.filters)
+        self._logger = logging.getLogger('carconnectivity')
+        if self._handler not in self._logger.handlers:
+            self._logger.addHandler(self._handler)
+        with self._lock:
+            # Records while detached were not received
+            self._journal_start_id = self._last_id
+            self._journal_start_time = datetime.now(tz=timezone.utc)
+        self._active = True
+
+    def detach(self) -> None:
+        """Stop receiving records and close all open streams."""
+        if self._logger is not None:
+            self._logger.removeHandler(self._handler)
+            self._logger = None
+        super().detach()
+
+    def publish(self, record: logging.LogRecord) -> None:
+        """Hand a new record to the history and to the queues of all clients whose filters it passes."""
+        if not self._active:
+            return
+        with self._lock:
+            self._last_id += 1
+            event = LogEvent(self._last_id, record)
+            if self._history.maxlen is not None and len(self._history) == self._history.maxlen:
+                # The oldest record is dropped, clients that missed it are reset
+                self._journal_start_id = self._history[0].event_id
+                self._journal_start_time = self._history[0].time
+            self._history.append(event)  # type: ignore[arg-type]
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.push(event)
+
+
+_log_tail: LogTail = LogTail(budget=get_stream_budget())
+
+
+def get_log_tail() -> LogTail:
+    """Get the live log tail."""
+    return _log_tail
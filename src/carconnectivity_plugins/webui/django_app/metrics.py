@@ -0,0 +1,203 @@
+"""Request and cache metrics in the Prometheus text exposition format."""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import threading
+import time
+from bisect import bisect_left
+
+from django.core.cache import caches
+from django.urls import Resolver404, resolve
+
+from carconnectivity_plugins.webui.django_app.cache import get_response_cache
+from carconnectivity_plugins.webui.django_app.formatting import get_element_renderer, get_fragment_cache
+from carconnectivity_plugins.webui.django_app.images import get_image_cache
+from carconnectivity_plugins.webui.django_app.logs import get_record_html_cache
+from carconnectivity_plugins.webui.django_app.middleware import get_basic_auth_cache
+
+if TYPE_CHECKING:
+    from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+    from django.http import HttpRequest, HttpResponse
+
+PREFIX: str = 'carconnectivity_webui'
+
+LATENCY_BUCKETS: Tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS: Tuple[float, ...] = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Cache statistics exported as counters, everything else (entries, bytes) is a gauge
+COUNTER_STATS: Tuple[str, ...] = ('hits', 'misses', 'evictions', 'coalesced')
+
+
+class Histogram:
+    """
+    Bucketed observations, cumulated only when exported.
+
+    Args:
+        buckets (Sequence[float]): Upper bounds of the buckets, ascending.
+    """
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets: Sequence[float] = buckets
+        self.counts: List[int] = [0] * len(buckets)
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add an observation."""
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+
+class RouteMetrics:  # pylint: disable=too-few-public-methods
+    """Requests, latency and response sizes of one URL route."""
+    __slots__ = ('requests', 'duration', 'size')
+
+    def __init__(self) -> None:
+        self.requests: Dict[Tuple[str, int], int] = {}
+        self.duration: Histogram = Histogram(LATENCY_BUCKETS)
+        self.size: Histogram = Histogram(SIZE_BUCKETS)
+
+
+class MetricsRegistry:
+    """
+    Per-route request metrics recorded by MetricsMiddleware and the statistics of the registered caches.
+
+    Recording a request costs a lock and two bucket lookups, everything else is done when /metrics is scraped.
+    """
+
+    def __init__(self) -> None:
+        self.enabled: bool = True
+        self._routes: Dict[str, RouteMetrics] = {}
+        self._caches: Dict[str, Callable[[], Dict[str, int]]] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        """Apply the metrics settings of the plugin configuration."""
+        if config.get('metrics') is not None:
+            self.enabled = bool(config['metrics'])
+
+    def register_cache(self, name: str, stats: Callable[[], Dict[str, int]]) -> None:
+        """Export the statistics (hits, misses, evictions, entries, ...) stats returns under the cache label name."""
+        self._caches[name] = stats
+
+    def observe_request(self, route: str, method: str, status: int, duration: float, size: Optional[int]) -> None:
+        """Record a request, size is None for streaming responses."""
+        with self._lock:
+            metrics = self._routes.get(route)
+            if metrics is None:
+                metrics = self._routes[route] = RouteMetrics()
+            metrics.requests[(method, status)] = metrics.requests.get((method, status), 0) + 1
+            metrics.duration.observe(duration)
+            if size is not None:
+                metrics.size.observe(size)
+
+    def render(self) -> str:
+        """Export all metrics in the Prometheus text format."""
+        lines: List[str] = []
+        with self._lock:
+            routes = sorted(self._routes.items())
+            requests = [(route, method, status, count) for route, metrics in routes for (method, status), count in sorted(metrics.requests.items())]
+            histograms = [(route, _copy(metrics.duration), _copy(metrics.size)) for route, metrics in routes]
+
+        lines.append(f'# HELP {PREFIX}_requests_total Requests by URL route, method and status code.')
+        lines.append(f'# TYPE {PREFIX}_requests_total counter')
+        for route, method, status, count in requests:
+            lines.append(f'{PREFIX}_requests_total{{route="{_escape(route)}",method="{_escape(method)}",status="{status}"}} {count}')
+        for name, help_text, index in (('request_duration_seconds', 'Time from receiving a request to its response by URL route.', 1),
+                                       ('response_size_bytes', 'Size of response bodies by URL route (compressed if they were), '
+                                                               'streaming responses are not included.', 2)):
+            lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {PREFIX}_{name} histogram')
+            for entry in histograms:
+                route, histogram = entry[0], entry[index]
+                label = f'route="{_escape(route)}"'
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{PREFIX}_{name}_bucket{{{label},le="{_format(bound)}"}} {cumulative}')
+                lines.append(f'{PREFIX}_{name}_bucket{{{label},le="+Inf"}} {histogram.count}')
+                lines.append(f'{PREFIX}_{name}_sum{{{label}}} {_format(histogram.sum)}')
+                lines.append(f'{PREFIX}_{name}_count{{{label}}} {histogram.count}')
+
+        cache_stats: Dict[str, Dict[str, int]] = {}
+        for cache, stats in sorted(self._caches.items()):
+            try:
+                cache_stats[cache] = stats()
+            except Exception:  # pylint: disable=broad-exception-caught
+                # A cache that cannot report must not break the other metrics
+                continue
+        for stat in sorted({stat for stats in cache_stats.values() for stat in stats}):
+            counter = stat in COUNTER_STATS
+            metric = f'{PREFIX}_cache_{stat}_total' if counter else f'{PREFIX}_cache_{stat}'
+            lines.append(f'# HELP {metric} Cache {stat} by cache.')
+            lines.append(f'# TYPE {metric} {"counter" if counter else "gauge"}')
+            for cache, stats in cache_stats.items():
+                if stat in stats:
+                    lines.append(f'{metric}{{cache="{_escape(cache)}"}} {stats[stat]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _copy(histogram: Histogram) -> Histogram:
+    copy = Histogram(histogram.buckets)
+    copy.counts = list(histogram.counts)
+    copy.count = histogram.count
+    copy.sum = histogram.sum
+    return copy
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def route_name(request: HttpRequest) -> str:
+    """The name of the URL route of request, also for requests answered before URL resolution (e.g. login redirects)."""
+    match = request.resolver_match
+    if match is None:
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return 'unmatched'
+    return match.url_name or match.route
+
+
+class MetricsMiddleware:
+    """Record count, latency and response size of every request by URL route, see MetricsRegistry."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not _metrics.enabled:
+            return self.get_response(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        _metrics.observe_request(route_name(request), request.method or '', response.status_code, time.perf_counter() - start,
+                                 None if response.streaming else len(response.content))
+        return response
+
+
+def _register_caches(metrics: MetricsRegistry) -> None:
+    metrics.register_cache('response', get_response_cache().stats)
+    metrics.register_cache('element', get_element_renderer().stats)
+    metrics.register_cache('fragment', get_fragment_cache().stats)
+    metrics.register_cache('image', get_image_cache().stats)
+    metrics.register_cache('log_record', get_record_html_cache().stats)
+    metrics.register_cache('basic_auth', get_basic_auth_cache().stats)
+    # The sessions are stored in the default cache
+    metrics.register_cache('sessions', lambda: caches['default'].stats())
+
+
+_metrics: MetricsRegistry = MetricsRegistry()
+_register_caches(_metrics)
+
+
+def get_metrics() -> MetricsRegistry:
+    """Get the metrics registry."""
+    return _metrics
@@ -2,13 +2,34 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
 import base64
+import hashlib
+import hmac
+import threading
+import time
+from django.conf import settings
 from django.http import HttpResponseRedirect
 from django.urls import reverse
 from carconnectivity_plugins.webui.django_app import get_users
 
 if TYPE_CHECKING:
+    from typing import Dict, Optional, Tuple
     from django.http import HttpRequest, HttpResponse
 
+# Access policies of the first path segment, everything not listed requires a user
+ANONYMOUS: str = 'anonymous'  # No user needed at all, the session is not touched
+PUBLIC: str = 'public'  # Available without login, the user is still resolved (e.g. for the navbar)
+PATH_ACCESS: Dict[str, str] = {
+    'static': ANONYMOUS,
+    'favicon.ico': ANONYMOUS,
+    'healthcheck': ANONYMOUS,
+    'login': PUBLIC,
+    'about': PUBLIC,
+}
+
+# Verified Basic credentials are remembered for machine clients polling e.g. /json
+BASIC_AUTH_CACHE_TTL: float = 300.0
+BASIC_AUTH_CACHE_SIZE: int = 64
+
 
 class User:
     """Simple user object for authentication."""
@@ -21,28 +42,115 @@ class User:
         return self.username
 
 
+class BasicAuthCache:
+    """
+    Small TTL cache of verified HTTP Basic credentials.
+
+    Entries are keyed by a SHA-256 hash of the Authorization header, so the credentials themselves are not kept.
+    They are dropped when the configured users are replaced.
+
+    Args:
+        ttl (float): Seconds a verification is remembered.
+        max_entries (int): Maximum number of remembered credentials.
+    """
+
+    def __init__(self, ttl: float = BASIC_AUTH_CACHE_TTL, max_entries: int = BASIC_AUTH_CACHE_SIZE) -> None:
+        self.ttl: float = ttl
+        self.max_entries: int = max_entries
+        self._entries: Dict[bytes, Tuple[str, float]] = {}
+        self._users: Optional[Dict[str, str]] = None
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    def authenticate(self, auth_header: str, users: Dict[str, str]) -> Optional[str]:
+        """
+        Verify the value of a Basic Authorization header against users.
+
+        Returns:
+            Optional[str]: The username, or None if the credentials are invalid.
+        """
+        if users is not self._users:
+            with self._lock:
+                self._entries.clear()
+                self._users = users
+        key = hashlib.sha256(auth_header.encode('utf-8', 'surrogateescape')).digest()
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > now:
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        username = _verify_basic(auth_header, users)
+        if username is not None:
+            with self._lock:
+                if len(self._entries) >= self.max_entries:
+                    # Drop expired entries, all of them if that is not enough
+                    entries = len(self._entries)
+                    self._entries = {entry_key: value for entry_key, value in self._entries.items() if value[1] > now}
+                    if len(self._entries) >= self.max_entries:
+                        self._entries.clear()
+                    self.evictions += entries - len(self._entries)
+                self._entries[key] = (username, now + self.ttl)
+        return username
+
+    def stats(self) -> Dict[str, int]:
+        """Lookup counters and current size, for the metrics."""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self._entries)}
+
+    def clear(self) -> None:
+        """Forget all verified credentials."""
+        with self._lock:
+            self._entries.clear()
+
+
+def _verify_basic(auth_header: str, users: Dict[str, str]) -> Optional[str]:
+    try:
+        auth_decoded = base64.b64decode(auth_header[6:]).decode('utf-8')
+        username, password = auth_decoded.split(':', 1)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if username in users and hmac.compare_digest(users[username].encode('utf-8'), password.encode('utf-8')):
+        return username
+    return None
+
+
+_basic_auth_cache: BasicAuthCache = BasicAuthCache()
+
+
+def get_basic_auth_cache() -> BasicAuthCache:
+    """Get the cache of verified Basic credentials."""
+    return _basic_auth_cache
+
+
 class CarConnectivityAuthMiddleware:
     """
     Custom authentication middleware for CarConnectivity.
     
     Supports both session-based and HTTP Basic authentication.
+
+    The access policy of a request is looked up by the first segment of its path in PATH_ACCESS.
+    Anonymous paths (static files, health check) skip all authentication work, the session is
+    only loaded for requests that carry a session cookie.
     """
     
     def __init__(self, get_response):
         self.get_response = get_response
-        self.public_paths = ['/login', '/healthcheck', '/about', '/static/', '/favicon.ico']
     
     def __call__(self, request: HttpRequest) -> HttpResponse:
-        # Check if path is public
-        is_public = any(request.path.startswith(path) for path in self.public_paths)
+        access = PATH_ACCESS.get(request.path_info.split('/', 2)[1])
+        if access == ANONYMOUS:
+            request.user = None
+            return self.get_response(request)
         
         # Try to authenticate user
         user = None
+        users = get_users()
         
         # Check session first
-        if 'user_id' in request.session:
+        if settings.SESSION_COOKIE_NAME in request.COOKIES and 'user_id' in request.session:
             username = request.session['user_id']
-            users = get_users()
             if username in users:
                 user = User(username)
         
@@ -50,20 +158,15 @@ class CarConnectivityAuthMiddleware:
         if not user:
             auth_header = request.META.get('HTTP_AUTHORIZATION', '')
             if auth_header.startswith('Basic '):
-                try:
-                    auth_decoded = base64.b64decode(auth_header[6:]).decode('utf-8')
-                    username, password = auth_decoded.split(':', 1)
-                    users = get_users()
-                    if username in users and users[username] == password:
-                        user = User(username)
-                except (ValueError, UnicodeDecodeError):
-                    pass
+                username = _basic_auth_cache.authenticate(auth_header, users)
+                if username is not None:
+                    user = User(username)
         
         # Attach user to request
         request.user = user
         
         # Redirect to login if not authenticated and not public path
-        if not user and not is_public:
+        if not user and access != PUBLIC:
             return HttpResponseRedirect(reverse('login') + f'?next={request.path}')
         
         response = self.get_response(request)
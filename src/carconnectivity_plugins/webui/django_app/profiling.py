@@ -0,0 +1,299 @@
+"""Opt-in profiling of single requests, for diagnosing slow pages in place."""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import cProfile
+import collections
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.urls import reverse
+
+if TYPE_CHECKING:
+    from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+    from types import FrameType
+    from django.http import HttpRequest, HttpResponse
+
+LOG: logging.Logger = logging.getLogger("carconnectivity.plugins.webui")
+
+# A request is profiled if it carries the query parameter or the header
+PROFILE_PARAMETER: str = '_profile'
+PROFILE_HEADER: str = 'HTTP_X_PROFILE'
+
+# Number of functions listed in a report
+TOP_FUNCTIONS: int = 30
+
+# Frames deeper than this are cut off in the collapsed stacks
+MAX_STACK_DEPTH: int = 256
+
+
+class ProfileReport:  # pylint: disable=too-few-public-methods
+    """
+    Result of profiling one request.
+
+    Attributes:
+        id (str): Identifier of the report, part of its URL.
+        method (str): Request method.
+        path (str): Request path including the query string.
+        status (int): Response status code.
+        time (datetime): When the request was received.
+        duration (float): Seconds the request took while profiled.
+        sample_interval (float): Seconds between stack samples.
+        stacks (Dict[str, int]): Sample count of each stack, root first and joined by ';' (collapsed stack format).
+        functions (List[Dict[str, Any]]): The functions with the most own time, with calls, own and total milliseconds.
+        cumulative (List[Dict[str, Any]]): The functions with the most total time, including the functions they called.
+    """
+    __slots__ = ('id', 'method', 'path', 'status', 'time', 'duration', 'sample_interval', 'stacks', 'functions', 'cumulative')
+
+    def __init__(self, request: HttpRequest) -> None:
+        self.id: str = uuid.uuid4().hex[:12]
+        self.method: str = request.method or ''
+        self.path: str = request.get_full_path()
+        self.status: int = 0
+        self.time: datetime = datetime.now(tz=timezone.utc)
+        self.duration: float = 0.0
+        self.sample_interval: float = 0.0
+        self.stacks: Dict[str, int] = {}
+        self.functions: List[Dict[str, Any]] = []
+        self.cumulative: List[Dict[str, Any]] = []
+
+    def collapsed(self) -> str:
+        """The stacks in the collapsed format read by flamegraph.pl, speedscope and inferno, one 'frame;frame;... count' per line."""
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(self.stacks.items()))
+
+    def as_dict(self, collapsed_url: Optional[str] = None) -> Dict[str, Any]:
+        """The report as a JSON serializable dict."""
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'time': self.time.isoformat(),
+            'duration_ms': round(self.duration * 1000, 3),
+            'sample_interval_ms': round(self.sample_interval * 1000, 3),
+            'samples': sum(self.stacks.values()),
+            'collapsed_url': collapsed_url,
+            'functions': self.functions,
+            'cumulative': self.cumulative,
+        }
+
+
+class _StackSampler:
+    """Samples the stack of one thread at a fixed interval, counting each distinct stack below stop_frame."""
+
+    def __init__(self, thread_id: int, stop_frame: FrameType, interval: float) -> None:
+        self.thread_id: int = thread_id
+        self.stop_frame: FrameType = stop_frame
+        self.interval: float = interval
+        self.stacks: Dict[str, int] = {}
+        self._names: Dict[Any, str] = {}
+        self._stopped: threading.Event = threading.Event()
+        self._thread: threading.Thread = threading.Thread(target=self._run, name='webui-profile-sampler', daemon=True)
+
+    def _frame_name(self, frame: FrameType) -> str:
+        code = frame.f_code
+        name = self._names.get(code)
+        if name is None:
+            module = frame.f_globals.get('__name__', '?')
+            name = self._names[code] = f'{module}.{getattr(code, "co_qualname", code.co_name)}'.replace(';', ':').replace(' ', '_')
+        return name
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)  # pylint: disable=protected-access
+            names: List[str] = []
+            while frame is not None and frame is not self.stop_frame and len(names) < MAX_STACK_DEPTH:
+                names.append(self._frame_name(frame))
+                frame = frame.f_back
+            if names:
+                stack = ';'.join(reversed(names))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def start(self) -> None:
+        """Start sampling."""
+        self._thread.start()
+
+    def stop(self) -> Dict[str, int]:
+        """Stop sampling and return the stacks."""
+        self._stopped.set()
+        self._thread.join()
+        return self.stacks
+
+
+def _short_path(path: str) -> str:
+    # Paths below site-packages (or the standard library) are shown relative to it
+    for marker in ('site-packages' + os.sep, 'dist-packages' + os.sep):
+        index = path.rfind(marker)
+        if index >= 0:
+            return path[index + len(marker):]
+    prefix = os.path.dirname(os.__file__) + os.sep
+    return path[len(prefix):] if path.startswith(prefix) else path
+
+
+def _function_stats(profiler: cProfile.Profile) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    stats = pstats.Stats(profiler).stats  # type: ignore[attr-defined]
+    functions = []
+    for (file_name, line, name), (_, calls, own, total, _) in stats.items():
+        location = name if file_name == '~' else f'{name} ({_short_path(file_name)}:{line})'
+        functions.append({'function': location, 'calls': calls, 'own_ms': round(own * 1000, 3), 'total_ms': round(total * 1000, 3)})
+    by_own = sorted(functions, key=lambda function: function['own_ms'], reverse=True)[:TOP_FUNCTIONS]
+    by_total = sorted(functions, key=lambda function: function['total_ms'], reverse=True)[:TOP_FUNCTIONS]
+    return by_own, by_total
+
+
+class RequestProfiler:
+    """
+    Runs single requests under cProfile and a stack sampler, keeping the reports in memory.
+
+    Profiling is off unless enabled in the configuration. Only authenticated requests asking for it
+    (PROFILE_PARAMETER or the X-Profile header) are profiled, one at a time and at most one per min_interval,
+    so leaving it enabled costs nothing while no request is profiled. A sample interval below the GIL switch interval
+    (5 ms by default) lowers the switch interval of the whole process to it while a request is profiled, which makes
+    all concurrently running requests somewhat slower; the default sample interval leaves it unchanged.
+
+    Args:
+        min_interval (float): Minimum seconds between two profiled requests.
+        sample_interval (float): Seconds between stack samples for the collapsed stacks.
+        max_reports (int): Number of reports kept, the oldest is dropped first.
+    """
+
+    def __init__(self, min_interval: float = 60.0, sample_interval: float = 0.005, max_reports: int = 10) -> None:
+        self.enabled: bool = False
+        self.min_interval: float = min_interval
+        self.sample_interval: float = sample_interval
+        self._reports: Deque[ProfileReport] = collections.deque(maxlen=max_reports)
+        self._last_start: Optional[float] = None
+        self._previous_start: Optional[float] = None
+        self._running: bool = False
+        self._lock: threading.Lock = threading.Lock()
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        """Apply the profiling settings of the plugin configuration."""
+        if config.get('profiling') is not None:
+            self.enabled = bool(config['profiling'])
+        if config.get('profiling_min_interval') is not None:
+            self.min_interval = float(config['profiling_min_interval'])
+        if config.get('profiling_sample_interval') is not None:
+            self.sample_interval = float(config['profiling_sample_interval']) / 1000
+        if config.get('profiling_reports') is not None:
+            self._reports = collections.deque(self._reports, maxlen=int(config['profiling_reports']))
+
+    def requested(self, request: HttpRequest) -> bool:
+        """Whether request asks to be profiled."""
+        value = request.GET.get(PROFILE_PARAMETER, request.META.get(PROFILE_HEADER))
+        return value is not None and value.lower() not in ('', '0', 'false', 'no')
+
+    def _acquire(self) -> Optional[float]:
+        # Returns None if a profile may start now, otherwise the seconds until one may
+        with self._lock:
+            now = time.monotonic()
+            if self._running:
+                return self.min_interval
+            if self._last_start is not None and now - self._last_start < self.min_interval:
+                return self.min_interval - (now - self._last_start)
+            self._running = True
+            self._previous_start, self._last_start = self._last_start, now
+            return None
+
+    def _cancel(self) -> float:
+        # A profile could not start after all, it does not count against min_interval. Returns the seconds until one may
+        with self._lock:
+            self._last_start = self._previous_start
+            if self._last_start is None:
+                return 0.0
+            return max(self.min_interval - (time.monotonic() - self._last_start), 0.0)
+
+    def profile(self, request: HttpRequest, get_response: Callable[[HttpRequest], HttpResponse]) \
+            -> Tuple[HttpResponse, Optional[ProfileReport], Optional[float]]:
+        """
+        Handle request with get_response, profiled if the rate limit allows it.
+
+        Returns:
+            Tuple[HttpResponse, Optional[ProfileReport], Optional[float]]: The response, the report if the request was profiled,
+                otherwise the seconds until the next request can be.
+        """
+        retry_after = self._acquire()
+        if retry_after is not None:
+            return get_response(request), None, retry_after
+        try:
+            report = ProfileReport(request)
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as err:
+                # Another profiler (e.g. a debugger) is active in this process
+                LOG.warning('Cannot profile %s: %s', report.path, err)
+                return get_response(request), None, self._cancel()
+            # The GIL is handed over every switch interval (5 ms by default), sampling more often needs a shorter one.
+            # The switch interval is process wide: while the request is profiled all threads switch that often.
+            switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(min(switch_interval, self.sample_interval))
+            sampler = _StackSampler(threading.get_ident(), sys._getframe(), self.sample_interval)  # pylint: disable=protected-access
+            sampler.start()
+            start = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                report.duration = time.perf_counter() - start
+                profiler.disable()
+                report.stacks = sampler.stop()
+                sys.setswitchinterval(switch_interval)
+            report.status = response.status_code
+            report.sample_interval = self.sample_interval
+            report.functions, report.cumulative = _function_stats(profiler)
+            with self._lock:
+                self._reports.append(report)
+            LOG.info('Profiled %s %s in %.1f ms (%d samples), report %s', report.method, report.path, report.duration * 1000,
+                     sum(report.stacks.values()), report.id)
+            return response, report, None
+        finally:
+            with self._lock:
+                self._running = False
+
+    def get_report(self, report_id: str) -> Optional[ProfileReport]:
+        """A stored report by its id."""
+        with self._lock:
+            return next((report for report in self._reports if report.id == report_id), None)
+
+    def reports(self) -> List[ProfileReport]:
+        """The stored reports, newest first."""
+        with self._lock:
+            return list(reversed(self._reports))
+
+
+class ProfilingMiddleware:
+    """
+    Profile authenticated requests that ask for it, see RequestProfiler.
+
+    The response carries an X-Profile header with the URL of the report, or why the request was not profiled.
+    Placed after the authentication middleware, so only logged in users can profile.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not _request_profiler.enabled or not _request_profiler.requested(request):
+            return self.get_response(request)
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return self.get_response(request)
+        response, report, retry_after = _request_profiler.profile(request, self.get_response)
+        if report is not None:
+            response['X-Profile'] = reverse('profile_report', args=[report.id])
+        else:
+            response['X-Profile'] = f'rate-limited; retry-after={int(retry_after or 0) + 1}'
+        return response
+
+
+_request_profiler: RequestProfiler = RequestProfiler()
+
+
+def get_request_profiler() -> RequestProfiler:
+    """Get the request profiler."""
+    return _request_profiler
@@ -0,0 +1,118 @@
+"""Field projection and subtree selection of the JSON APIs."""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import json
+
+from carconnectivity.attributes import GenericAttribute
+from carconnectivity.json_util import ExtendedWithNullEncoder
+from carconnectivity.objects import GenericObject
+
+if TYPE_CHECKING:
+    from typing import Any, Dict, Optional, Tuple, Union
+
+    # Nested field names, an empty dict selects the whole subtree
+    FieldTree = Dict[str, 'FieldTree']
+
+# Check if PIL is available
+SUPPORT_IMAGES = False
+try:
+    from PIL import Image
+    SUPPORT_IMAGES = True
+except ImportError:
+    pass
+
+MAX_FIELDS: int = 64
+
+
+def parse_fields(value: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Parse the fields query parameter, e.g. drives.primary.level,doors.lock_state,position.
+
+    Fields covered by another field (doors.lock_state by doors) are dropped and the rest is sorted,
+    so equivalent parameters give the same result.
+
+    Returns:
+        Optional[Tuple[str, ...]]: The dotted fields, None to select everything.
+
+    Raises:
+        ValueError: If a field is empty or there are too many.
+    """
+    if value is None:
+        return None
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    if not fields:
+        return None
+    if len(fields) > MAX_FIELDS:
+        raise ValueError(f'At most {MAX_FIELDS} fields can be selected')
+    for field in fields:
+        if '' in field.split('.'):
+            raise ValueError(f'Invalid field "{field}"')
+    return tuple(sorted(field for field in fields
+                        if not any(field.startswith(other + '.') for other in fields)))
+
+
+def field_tree(fields: Tuple[str, ...]) -> FieldTree:
+    """Nest dotted fields into a tree of names."""
+    tree: FieldTree = {}
+    for field in fields:
+        node = tree
+        for name in field.split('.'):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def get_subtree(element: GenericObject, path: str) -> Optional[Union[GenericObject, GenericAttribute]]:
+    """
+    Resolve a path like drives/primary/level below element.
+
+    Only descends, parent references and absolute paths are not followed.
+
+    Returns:
+        Optional[Union[GenericObject, GenericAttribute]]: The enabled element at path, None if there is none.
+    """
+    for name in path.strip('/').split('/'):
+        if name in ('', '.', '..') or not isinstance(element, GenericObject):
+            return None
+        element = next((child for child in element.children if child.id == name and child.enabled), None)
+        if element is None:
+            return None
+    return element
+
+
+def _filter_images(value: Any) -> bool:
+    # Images are left out of the JSON documents, as GenericObject.as_json() does
+    return SUPPORT_IMAGES and isinstance(value, Image.Image)
+
+
+def project(element: Union[GenericObject, GenericAttribute], tree: Optional[FieldTree], in_locale: Optional[str] = None) -> Any:
+    """
+    Build the dict of element with only the fields in tree, walking only the selected children.
+
+    Selected names that do not exist (or are disabled) are left out. Below an attribute the keys of its
+    dict (val, uni, upd) can be selected.
+    """
+    if not tree:
+        return element.as_dict(_filter_images, in_locale)
+    if isinstance(element, GenericAttribute):
+        as_dict = element.as_dict(_filter_images, in_locale)
+        if as_dict is None:
+            return None
+        return {key: value for key, value in as_dict.items() if key in tree}
+    projection: Dict[str, Any] = {}
+    for child in element.children:
+        if child.enabled and child.id in tree:
+            child_dict = project(child, tree[child.id], in_locale)
+            if child_dict is not None:
+                projection[child.id] = child_dict
+    return projection
+
+
+def projected_json(element: Union[GenericObject, GenericAttribute], fields: Optional[Tuple[str, ...]] = None, pretty: bool = False,
+                   in_locale: Optional[str] = None) -> str:
+    """
+    Serialize element like its as_json(), restricted to fields (see parse_fields).
+
+    Attributes are serialized as their dict (val, uni, upd), the way they appear inside the document of their parent.
+    """
+    return json.dumps(project(element, field_tree(fields) if fields else None, in_locale),
+                      cls=ExtendedWithNullEncoder, skipkeys=True, indent=4 if pretty else 0)
@@ -0,0 +1,165 @@
+"""Helpers building the data and event stream responses of the API views."""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import json
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from carconnectivity.json_util import ExtendedWithNullEncoder
+from carconnectivity_plugins.webui.django_app.cache import get_response_cache, make_etag
+from carconnectivity_plugins.webui.django_app.compression import get_response_compressor
+from carconnectivity_plugins.webui.django_app.projection import parse_fields, project
+from carconnectivity_plugins.webui.django_app.serialization import DATA_FORMATS, negotiate_data_format, serialize
+
+if TYPE_CHECKING:
+    from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Union
+    from datetime import datetime
+    from django.http import HttpRequest
+    from carconnectivity.carconnectivity import CarConnectivity
+    from carconnectivity.attributes import GenericAttribute
+    from carconnectivity.objects import GenericObject
+    from carconnectivity_plugins.webui.django_app.events import EventBroker
+
+
+def get_json_options(request: HttpRequest, car_connectivity: CarConnectivity) -> Tuple[bool, Optional[str]]:
+    """
+    Parse the pretty and locale query parameters shared by the JSON views.
+
+    Returns:
+        Tuple[bool, Optional[str]]: Whether to pretty print and the locale to convert values to
+    """
+    pretty = request.GET.get('pretty', 'false').lower() == 'true'
+    in_locale = request.GET.get('in_locale', 'false').lower() == 'true'
+    with_locale = request.GET.get('with_locale', None)
+
+    if with_locale:
+        locale_str = with_locale
+    elif in_locale and car_connectivity.connectors and 'webui' in car_connectivity.connectors.connectors:
+        locale_str = car_connectivity.connectors.connectors['webui'].active_config.get('locale')
+    else:
+        locale_str = None
+    return pretty, locale_str
+
+
+def set_validators(response: HttpResponse, etag: Optional[str], last_modified: Optional[datetime]) -> None:
+    """Set the ETag, Last-Modified and Cache-Control headers clients revalidate with."""
+    if etag is not None:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Changes are visible immediately, clients revalidate instead of using a fixed max-age
+    response['Cache-Control'] = 'private, no-cache'
+
+
+def conditional_response(request: HttpRequest, etag: Optional[str], last_modified: Optional[datetime]) -> Optional[HttpResponse]:
+    """
+    Evaluate If-None-Match / If-Modified-Since before anything expensive is built.
+
+    Returns:
+        Optional[HttpResponse]: A 304 (or 412) response if the client's copy is still valid, None otherwise
+    """
+    if etag is None and last_modified is None:
+        return None
+    response = get_conditional_response(request, etag=etag,
+                                        last_modified=int(last_modified.timestamp()) if last_modified is not None else None)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def versioned_json_response(request: HttpRequest, key: Hashable, version: Optional[str], compute: Callable[[], Union[str, bytes]],
+                            last_modified: Optional[datetime] = None, content_type: str = 'application/json') -> HttpResponse:
+    """
+    Build a JSON response that is only serialized again when the data changed.
+
+    A client that already has the current version gets a 304 without the data being serialized at all.
+
+    Args:
+        request: The request, checked for If-None-Match / If-Modified-Since
+        key: Identifies the response (view and parameters)
+        version: Change version of the data the response is built from, None disables caching
+        compute: Serializes the data
+        last_modified: Newest update time of the data
+        content_type: Content-Type of what compute returns
+
+    Returns:
+        HttpResponse with the JSON document (compressed if the client accepts it), or 304, with an ETag for the version
+    """
+    etag = make_etag(key, version)
+    not_modified = conditional_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    json_str = get_response_cache().get_or_compute(key, version, compute)
+
+    response = HttpResponse(json_str, content_type=content_type)
+    set_validators(response, etag, last_modified)
+    # Compressed once per version and encoding as well
+    return get_response_compressor().compress_response(request, response, key, version)
+
+
+def element_data_response(request: HttpRequest, key: Tuple, version: Optional[str], element: Union[GenericObject, GenericAttribute],
+                          pretty: bool, locale_str: Optional[str], last_modified: Optional[datetime] = None) -> HttpResponse:
+    """
+    Build the versioned response with the document of element, see versioned_json_response().
+
+    Applies the fields projection and the format (JSON, MessagePack or CBOR, from the format parameter or the Accept header).
+
+    Args:
+        key: Identifies the document (view and element), the options are added
+    """
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+        data_format = negotiate_data_format(request.GET.get('format'), request.headers.get('Accept', ''))
+    except ValueError as err:
+        return HttpResponseBadRequest(str(err))
+    response = versioned_json_response(request, key + (pretty, locale_str, fields, data_format), version,
+                                       lambda: serialize(element, fields, pretty, locale_str, data_format), last_modified,
+                                       content_type=DATA_FORMATS[data_format][0])
+    if len(DATA_FORMATS) > 1 and 'format' not in request.GET:
+        patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def delta_json_response(request: HttpRequest, broker: EventBroker, element: GenericObject, since: str, pretty: bool) -> HttpResponse:
+    """
+    Build the JSON response with the changes of element since a version or timestamp, taken from the change journal of broker.
+
+    The document has the new version to pass as since the next time and the changed elements by path, or, if the
+    changes are not known (e.g. since is empty or too old), reset set to true and the whole element as data.
+    """
+    try:
+        delta = broker.delta(since, element.get_absolute_path()) if since else None
+    except ValueError as err:
+        return HttpResponseBadRequest(str(err))
+    if delta is None:
+        # Taken before the data is read, changes in between are sent again with the next delta
+        document: Dict[str, Any] = {'version': broker.format_id(broker.last_id), 'reset': True, 'data': project(element, None)}
+    else:
+        changes, newest_id = delta
+        document = {'version': broker.format_id(newest_id), 'changes': changes}
+    response = HttpResponse(json.dumps(document, cls=ExtendedWithNullEncoder, skipkeys=True, indent=4 if pretty else 0),
+                            content_type='application/json')
+    set_validators(response, None, None)
+    return response
+
+
+def event_stream_response(request: HttpRequest, broker: EventBroker, selector: Any) -> HttpResponse:
+    """Build the Server-Sent Events response streaming the events of broker that match selector."""
+    if broker.is_full():
+        response = HttpResponse('Too many event stream clients', status=503, content_type='text/plain')
+        response['Retry-After'] = '30'
+        return response
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    # The ASGI server consumes the stream on its event loop, WSGI servers need a blocking iterator
+    if isinstance(request, ASGIRequest):
+        stream = broker.stream_async(selector, last_event_id)
+    else:
+        stream = broker.stream(selector, last_event_id)
+
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
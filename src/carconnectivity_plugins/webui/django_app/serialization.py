@@ -0,0 +1,89 @@
+"""Serialization of the JSON API documents as JSON, MessagePack or CBOR."""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+from carconnectivity.json_util import ExtendedWithNullEncoder
+
+from carconnectivity_plugins.webui.django_app.projection import field_tree, project, projected_json
+
+if TYPE_CHECKING:
+    from typing import Any, Dict, Optional, Tuple, Union
+    from carconnectivity.attributes import GenericAttribute
+    from carconnectivity.objects import GenericObject
+
+# Check for MessagePack support
+SUPPORT_MSGPACK: bool = False
+try:
+    import msgpack
+    SUPPORT_MSGPACK = True
+except ImportError:
+    pass
+
+# Check for CBOR support
+SUPPORT_CBOR: bool = False
+try:
+    import cbor2
+    SUPPORT_CBOR = True
+except ImportError:
+    pass
+
+# Available formats with their Content-Type and further media types clients may ask for them with
+DATA_FORMATS: Dict[str, Tuple[str, Tuple[str, ...]]] = {'json': ('application/json', ())}
+if SUPPORT_MSGPACK:
+    DATA_FORMATS['msgpack'] = ('application/msgpack', ('application/x-msgpack', 'application/vnd.msgpack'))
+if SUPPORT_CBOR:
+    DATA_FORMATS['cbor'] = ('application/cbor', ())
+
+# Formats that exist but need an optional dependency, for the error message
+OPTIONAL_FORMATS: Tuple[str, ...] = ('msgpack', 'cbor')
+
+_encoder: ExtendedWithNullEncoder = ExtendedWithNullEncoder()
+
+
+def negotiate_data_format(format_parameter: Optional[str], accept: str) -> str:
+    """
+    Pick the format of a document: the format query parameter if given, otherwise a binary format the client explicitly accepts, JSON otherwise.
+
+    Raises:
+        ValueError: If the format parameter names an unknown or unavailable format.
+    """
+    if format_parameter:
+        data_format = format_parameter.lower()
+        if data_format not in DATA_FORMATS:
+            if data_format in OPTIONAL_FORMATS:
+                raise ValueError(f'Format "{data_format}" is not available, install the {data_format} extra')
+            raise ValueError(f'Unknown format "{format_parameter}", must be one of {", ".join(DATA_FORMATS)}')
+        return data_format
+    if len(DATA_FORMATS) > 1 and accept:
+        accepted = {media_range.split(';', 1)[0].strip().lower() for media_range in accept.split(',')}
+        for data_format, (content_type, aliases) in DATA_FORMATS.items():
+            if data_format != 'json' and (content_type in accepted or accepted.intersection(aliases)):
+                return data_format
+    return 'json'
+
+
+def to_plain(value: Any) -> Any:
+    """Convert a document to the types JSON has, the way ExtendedWithNullEncoder does (datetimes to ISO strings, enums to values, ...)."""
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, dict):
+        # JSON skips keys it cannot represent
+        return {key: to_plain(item) for key, item in value.items() if isinstance(key, (str, int, float, bool)) or key is None}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    return to_plain(_encoder.default(value))
+
+
+def serialize(element: Union[GenericObject, GenericAttribute], fields: Optional[Tuple[str, ...]] = None, pretty: bool = False,
+              in_locale: Optional[str] = None, data_format: str = 'json') -> Union[str, bytes]:
+    """
+    Serialize element restricted to fields (see projection.parse_fields) in one of DATA_FORMATS.
+
+    All formats have the same structure as the JSON document, pretty only applies to JSON.
+    """
+    if data_format == 'json':
+        return projected_json(element, fields, pretty, in_locale)
+    document = to_plain(project(element, field_tree(fields) if fields else None, in_locale))
+    if data_format == 'msgpack':
+        return msgpack.packb(document)
+    return cbor2.dumps(document)
@@ -38,11 +38,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'carconnectivity_plugins.webui.django_app.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'carconnectivity_plugins.webui.django_app.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'carconnectivity_plugins.webui.django_app.middleware.CarConnectivityAuthMiddleware',
+    'carconnectivity_plugins.webui.django_app.profiling.ProfilingMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -52,8 +55,14 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Templates are compiled once and kept (filled by the warm-up at plugin startup)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -66,6 +75,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'carconnectivity_plugins.webui.django_app.wsgi.application'
+ASGI_APPLICATION = 'carconnectivity_plugins.webui.django_app.asgi.application'
 
 # Database - not used, but required by Django
 DATABASES = {}
@@ -79,7 +89,7 @@ SESSION_COOKIE_SAMESITE = 'Lax'
 # Cache configuration
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'carconnectivity_plugins.webui.django_app.cache.StatsLocMemCache',
         'LOCATION': 'carconnectivity-cache',
         'TIMEOUT': 300,
         'OPTIONS': {
@@ -119,6 +129,16 @@ else:
 # For serving static files in production without collectstatic
 STATIC_ROOT = None
 
+# {% static %} emits the content hashed names of the in-memory asset store
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'carconnectivity_plugins.webui.django_app.assets.HashedAssetStorage',
+    },
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -153,10 +173,7 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
-        'carconnectivity': {
-            'handlers': ['console'],
-            'level': 'DEBUG',
-            'propagate': False,
-        },
+        # The carconnectivity logger is configured by CarConnectivity itself, replacing its handlers
+        # would detach the log storage the log pages and the live log stream read from
     },
 }
@@ -18,6 +18,8 @@
     initTooltips();
     initScrollReveal();
     initMobileMenu();
+    initLiveUpdates();
+    initLogViewer();
   });
 
   // ============================================
@@ -273,6 +275,260 @@
     });
   }
 
+  // ============================================
+  // Live Updates (Server-Sent Events)
+  // ============================================
+  
+  function initLiveUpdates() {
+    const container = document.querySelector('[data-live-poll]');
+    if (!container) return;
+    
+    // Polling for changes when no event stream is available (server mode or all stream slots taken)
+    const POLL_INTERVAL = 15000;
+    let refreshTimer = null;
+    
+    // Re-render cells that cannot be patched from a single attribute (e.g. nested objects)
+    function scheduleRefresh() {
+      if (refreshTimer) return;
+      refreshTimer = setTimeout(() => {
+        refreshTimer = null;
+        fetch(window.location.href, { credentials: 'same-origin' })
+          .then(response => response.ok ? response.text() : Promise.reject(response.status))
+          .then(html => {
+            const doc = new DOMParser().parseFromString(html, 'text/html');
+            doc.querySelectorAll('[data-cc-path]').forEach(fresh => {
+              const path = fresh.getAttribute('data-cc-path');
+              const current = container.querySelector('[data-cc-path="' + CSS.escape(path) + '"]');
+              if (current) {
+                current.innerHTML = fresh.innerHTML;
+              }
+            });
+          })
+          .catch(err => console.error('Failed to refresh live values:', err));
+      }, 2000);
+    }
+    
+    function findCell(path) {
+      // Exact attribute first, then the closest enclosing object rendered as one cell
+      let candidate = path;
+      while (candidate) {
+        const cell = container.querySelector('[data-cc-path="' + CSS.escape(candidate) + '"]');
+        if (cell) return { cell: cell, exact: candidate === path };
+        candidate = candidate.substring(0, candidate.lastIndexOf('/'));
+      }
+      return null;
+    }
+    
+    function updateLevel(path, value) {
+      const battery = container.querySelector('[data-cc-level-path="' + CSS.escape(path) + '"]');
+      if (battery && typeof value === 'number') {
+        battery.setAttribute('data-level', value);
+        const level = battery.querySelector('.battery-level');
+        if (level) level.style.width = value + '%';
+      }
+    }
+    
+    function startPolling() {
+      const pollUrl = container.getAttribute('data-live-poll');
+      let version = container.getAttribute('data-live-version') || '';
+      function poll() {
+        fetch(pollUrl + '?since=' + encodeURIComponent(version), { credentials: 'same-origin' })
+          .then(response => response.ok ? response.json() : Promise.reject(response.status))
+          .then(delta => {
+            if (delta.reset) {
+              scheduleRefresh();
+            } else {
+              const paths = Object.keys(delta.changes);
+              paths.forEach(path => updateLevel(path, delta.changes[path].val));
+              // Changes carry no rendered HTML, the cells are refreshed from the page
+              if (paths.length) scheduleRefresh();
+            }
+            version = delta.version;
+          })
+          .catch(err => console.error('Failed to poll for changes:', err))
+          .finally(() => setTimeout(poll, POLL_INTERVAL));
+      }
+      setTimeout(poll, POLL_INTERVAL);
+    }
+    
+    const streamUrl = container.getAttribute('data-live-events');
+    if (!streamUrl || !window.EventSource) {
+      startPolling();
+      return;
+    }
+    
+    const source = new EventSource(streamUrl);
+    
+    source.addEventListener('change', e => {
+      const change = JSON.parse(e.data);
+      updateLevel(change.path, change.val);
+      
+      const found = findCell(change.path);
+      if (!found) return;
+      if (found.exact && change.html !== undefined) {
+        found.cell.innerHTML = change.html;
+        found.cell.classList.add('live-updated');
+        setTimeout(() => found.cell.classList.remove('live-updated'), 1500);
+      } else {
+        scheduleRefresh();
+      }
+    });
+    
+    // Too many changes were missed (slow connection or restart), refresh everything
+    source.addEventListener('reset', scheduleRefresh);
+    
+    // The server refused the stream (all stream slots taken), EventSource does not retry that
+    source.addEventListener('error', () => {
+      if (source.readyState === EventSource.CLOSED) startPolling();
+    });
+  }
+
+  // ============================================
+  // Log Viewer (incremental, windowed)
+  // ============================================
+  
+  function initLogViewer() {
+    const viewer = document.querySelector('[data-log-url]');
+    if (!viewer) return;
+    
+    const url = viewer.getAttribute('data-log-url');
+    const params = new URLSearchParams(window.location.search);
+    const order = params.get('order') === 'asc' ? 'asc' : 'desc';
+    const oppositeOrder = order === 'desc' ? 'asc' : 'desc';
+    // Records kept in the DOM, records scrolled far away are dropped and loaded again when needed
+    const MAX_RECORDS = 1000;
+    const THRESHOLD = 400;
+    
+    let nextCursor = viewer.getAttribute('data-next-cursor');
+    let hasAbove = false;
+    let loading = false;
+    
+    function fetchPage(pageOrder, cursor) {
+      const query = new URLSearchParams(params);
+      query.set('order', pageOrder);
+      query.set('cursor', cursor);
+      return fetch(url + '?' + query.toString(), { credentials: 'same-origin' })
+        .then(response => response.ok ? response.json() : Promise.reject(response.status));
+    }
+    
+    function renderRecords(records) {
+      const fragment = document.createDocumentFragment();
+      records.forEach(record => {
+        const div = document.createElement('div');
+        div.className = 'log-record';
+        div.setAttribute('data-cursor', record.cursor);
+        div.innerHTML = record.html;
+        fragment.appendChild(div);
+      });
+      return fragment;
+    }
+    
+    // Drop records above the viewport, keeping the visible ones in place
+    function trimTop() {
+      const excess = viewer.children.length - MAX_RECORDS;
+      if (excess <= 0) return;
+      const heightBefore = viewer.scrollHeight;
+      for (let i = 0; i < excess; i++) viewer.firstElementChild.remove();
+      viewer.scrollTop -= heightBefore - viewer.scrollHeight;
+      hasAbove = true;
+    }
+    
+    function trimBottom() {
+      const excess = viewer.children.length - MAX_RECORDS;
+      if (excess <= 0) return;
+      for (let i = 0; i < excess; i++) viewer.lastElementChild.remove();
+      nextCursor = viewer.lastElementChild.getAttribute('data-cursor');
+    }
+    
+    function loadBelow() {
+      if (loading || !nextCursor) return;
+      loading = true;
+      fetchPage(order, nextCursor)
+        .then(page => {
+          viewer.appendChild(renderRecords(page.records));
+          nextCursor = page.next_cursor;
+          trimTop();
+        })
+        .catch(err => console.error('Failed to load log entries:', err))
+        .finally(() => { loading = false; });
+    }
+    
+    function loadAbove() {
+      if (loading || !hasAbove || !viewer.firstElementChild) return;
+      loading = true;
+      // Page in the opposite order starting at the first shown record, nearest record first
+      fetchPage(oppositeOrder, viewer.firstElementChild.getAttribute('data-cursor'))
+        .then(page => {
+          const heightBefore = viewer.scrollHeight;
+          viewer.insertBefore(renderRecords(page.records.reverse()), viewer.firstElementChild);
+          viewer.scrollTop += viewer.scrollHeight - heightBefore;
+          hasAbove = page.next_cursor !== null;
+          trimBottom();
+        })
+        .catch(err => console.error('Failed to load log entries:', err))
+        .finally(() => { loading = false; });
+    }
+    
+    viewer.addEventListener('scroll', () => {
+      if (viewer.scrollTop + viewer.clientHeight > viewer.scrollHeight - THRESHOLD) {
+        loadBelow();
+      } else if (viewer.scrollTop < THRESHOLD) {
+        loadAbove();
+      }
+    }, { passive: true });
+    
+    // Live tail: new records arrive over Server-Sent Events, filtered on the server
+    const streamUrl = viewer.getAttribute('data-log-stream');
+    const liveToggle = document.querySelector('[data-log-live]');
+    if (!streamUrl || !liveToggle || !window.EventSource) return;
+    
+    let source = null;
+    
+    function addLiveRecord(record) {
+      if (order === 'desc') {
+        // Newest records are not shown while the top of the log is unloaded, scrolling up loads them
+        if (hasAbove) return;
+        const heightBefore = viewer.scrollHeight;
+        viewer.insertBefore(renderRecords([record]), viewer.firstElementChild);
+        if (viewer.scrollTop > 0) viewer.scrollTop += viewer.scrollHeight - heightBefore;
+        trimBottom();
+      } else {
+        if (nextCursor) return;
+        const atBottom = viewer.scrollTop + viewer.clientHeight >= viewer.scrollHeight - 5;
+        viewer.appendChild(renderRecords([record]));
+        trimTop();
+        if (atBottom) viewer.scrollTop = viewer.scrollHeight;
+      }
+    }
+    
+    function setLive(live) {
+      if (source) {
+        source.close();
+        source = null;
+      }
+      if (live) {
+        const query = new URLSearchParams();
+        ['level', 'logger', 'q'].forEach(name => { if (params.get(name)) query.set(name, params.get(name)); });
+        source = new EventSource(streamUrl + '?' + query.toString());
+        source.addEventListener('log', e => addLiveRecord(JSON.parse(e.data)));
+        // Records were missed, start over with a fresh page
+        source.addEventListener('reset', () => window.location.reload());
+        // The server refused the stream (all stream slots taken), EventSource does not retry that
+        source.addEventListener('error', () => {
+          if (source && source.readyState === EventSource.CLOSED) {
+            setLive(false);
+            liveToggle.title = 'No live stream available right now, try again later';
+          }
+        });
+        liveToggle.removeAttribute('title');
+      }
+      liveToggle.classList.toggle('btn-primary', live);
+      liveToggle.classList.toggle('btn-outline', !live);
+    }
+    
+    liveToggle.addEventListener('click', () => setLive(!source));
+  }
+
   // ============================================
   // Clickable Rows
   // ============================================
@@ -1,14 +1,13 @@
 """Custom template filters for CarConnectivity elements."""
 from __future__ import annotations
 from typing import TYPE_CHECKING, Optional
-from enum import Enum
-from decimal import Decimal
 from datetime import timedelta
 from django import template
 from django.utils.safestring import mark_safe
 from django.utils.html import escape
-from carconnectivity.attributes import GenericAttribute, FloatAttribute
-from carconnectivity.objects import GenericObject
+from django.urls import reverse
+from carconnectivity_plugins.webui.ansi import ansi_to_html
+from carconnectivity_plugins.webui.django_app.formatting import get_element_renderer, get_fragment_cache
 
 if TYPE_CHECKING:
     pass
@@ -20,122 +19,20 @@ register = template.Library()
 def format_cc_element(element, alt_title: Optional[str] = None, with_tooltip: bool = True, linebreak: bool = False) -> str:
     """
     Format CarConnectivity element for display.
+
+    Renderings are cached per attribute until it changes, see ElementRenderer.
     
     Args:
         element: GenericAttribute or GenericObject to format
         alt_title: Alternative title to display
-        with_tooltip: Whether to include tooltip with timestamps
+        with_tooltip: Whether to include tooltip with timestamps (currently unused, last update is shown near the title)
         linebreak: Whether to add line break at end
     
     Returns:
         Formatted HTML string
     """
-    if isinstance(element, GenericAttribute):
-        if not element.enabled:
-            return ''
-        
-        return_str = ''
-        
-        # Add title
-        if alt_title is not None:
-            return_str += escape(alt_title)
-        else:
-            return_str += escape(element.name)
-        
-        if len(return_str) > 0:
-            return_str += ': '
-        
-        # Remove tooltip - we show last update near title instead
-        # if with_tooltip:
-        #     return_str += f'<a href="#" data-toggle="tooltip" title="Last updated {element.last_updated} &#10;Last changed {element.last_changed}" class="js-convert-time-title text-decoration-none text-reset">'
-        
-        # Format value
-        unit = None
-        if isinstance(element.value, Enum):
-            # Clean enum values - remove class prefix
-            value = str(element.value.value)
-            if '.' in value:
-                value = value.split('.')[-1]
-            value = value.replace('_', ' ').title()
-        elif isinstance(element, FloatAttribute):
-            value, unit = element.in_locale(locale=None)
-            if value is not None and element.precision is not None:
-                precision_digits = 0
-                precision_tmp = element.precision
-                while precision_tmp < 1:
-                    precision_digits += 1
-                    precision_tmp *= 10
-                value = round(value, precision_digits)
-                value = f'{value:.{precision_digits}f}'
-            elif value is not None:
-                value = f'{Decimal(value):n}'
-        else:
-            value, unit = element.in_locale(locale=None)
-        
-        return_str += escape(str(value))
-        if unit is not None:
-            return_str += escape(str(unit))
-        
-        # if with_tooltip:
-        #     return_str += '</a>'
-        
-        if linebreak:
-            return_str += '<br>'
-        
-        return mark_safe(return_str)
-    
-    elif isinstance(element, GenericObject):
-        if not element.enabled:
-            return ''
-        
-        # Special handling for capabilities - display as badges
-        if element.id == 'capabilities' or 'capabilities' in str(type(element)).lower():
-            badges = []
-            for child in element.children:
-                if child.enabled:
-                    child_id = escape(child.id).replace('_', ' ').title()
-                    status_class = 'badge-success' if 'status' in str(child).lower() and 'true' in str(child).lower() else 'badge-primary'
-                    badges.append(f'<span class="badge {status_class}" style="margin: 2px; display: inline-block;">{child_id}</span>')
-            return mark_safe('<div style="display: flex; flex-wrap: wrap; gap: 4px;">' + ''.join(badges) + '</div>')
-        
-        # Special handling for nested objects (drives, charging, position_location, etc)
-        if len(element.children) > 0 and any(hasattr(child, 'value') for child in element.children):
-            items = []
-            for child in element.children:
-                if child.enabled and hasattr(child, 'value'):
-                    key = escape(child.id).replace('_', ' ').title()
-                    
-                    # Format value
-                    if isinstance(child.value, Enum):
-                        value = str(child.value.value)
-                        if '.' in value:
-                            value = value.split('.')[-1]
-                        value = escape(value.replace('_', ' ').title())
-                    elif isinstance(child.value, float):
-                        # Round floats to 1 decimal place
-                        value = f'{child.value:.1f}'
-                    else:
-                        value = escape(str(child.value))
-                    
-                    unit = ''
-                    if hasattr(child, 'unit') and child.unit:
-                        unit = escape(str(child.unit))
-                    items.append(f'<div style="margin-bottom: 8px;"><span style="color: var(--color-text-secondary); font-size: var(--font-size-sm);">{key}:</span> <span style="color: var(--color-text-primary); font-weight: var(--font-weight-medium);">{value}{unit}</span></div>')
-            if items:
-                return mark_safe('<div style="display: grid; grid-template-columns: repeat(auto-fill, minmax(200px, 1fr)); gap: var(--space-sm);">' + ''.join(items) + '</div>')
-        
-        # Default handling for other objects
-        return_str = ''
-        for child in element.children:
-            if child.enabled:
-                return_str += format_cc_element(child, child.id, with_tooltip, linebreak)
-        
-        if linebreak:
-            return_str += '<br>'
-        
-        return mark_safe(return_str)
-    
-    return str(element)
+    del with_tooltip
+    return get_element_renderer().render(element, alt_title, linebreak)
 
 
 @register.filter
@@ -171,32 +68,8 @@ def ansi2html(ansi_str: str) -> str:
     Returns:
         HTML string with color spans
     """
-    ansi_str = escape(ansi_str)
-    
-    # Standard colors
-    ansi_str = ansi_str.replace('\033[30m', '<span style="color:black;">')
-    ansi_str = ansi_str.replace('\033[31m', '<span style="color:red;">')
-    ansi_str = ansi_str.replace('\033[32m', '<span style="color:green;">')
-    ansi_str = ansi_str.replace('\033[33m', '<span style="color:yellow;">')
-    ansi_str = ansi_str.replace('\033[34m', '<span style="color:blue;">')
-    ansi_str = ansi_str.replace('\033[35m', '<span style="color:magenta;">')
-    ansi_str = ansi_str.replace('\033[36m', '<span style="color:cyan;">')
-    ansi_str = ansi_str.replace('\033[37m', '<span style="color:white;">')
-    
-    # Bright colors
-    ansi_str = ansi_str.replace('\033[90m', '<span style="color:black;">')
-    ansi_str = ansi_str.replace('\033[91m', '<span style="color:red;">')
-    ansi_str = ansi_str.replace('\033[92m', '<span style="color:green;">')
-    ansi_str = ansi_str.replace('\033[93m', '<span style="color:yellow;">')
-    ansi_str = ansi_str.replace('\033[94m', '<span style="color:blue;">')
-    ansi_str = ansi_str.replace('\033[95m', '<span style="color:magenta;">')
-    ansi_str = ansi_str.replace('\033[96m', '<span style="color:cyan;">')
-    ansi_str = ansi_str.replace('\033[97m', '<span style="color:white;">')
-    
-    # Reset
-    ansi_str = ansi_str.replace('\033[0m', '</span>')
-    
-    return mark_safe(ansi_str)
+    # Single pass over the string, see carconnectivity_plugins.webui.ansi
+    return mark_safe(ansi_to_html(str(ansi_str)))
 
 
 @register.simple_tag
@@ -213,6 +86,60 @@ def timedelta_filter(seconds: int) -> timedelta:
     return timedelta(seconds=seconds)
 
 
+@register.simple_tag
+def vehicle_img_srcset(vin: str, fallback: Optional[str] = None) -> str:
+    """
+    Build the srcset attribute value offering all resized variants of a vehicle image.
+
+    Args:
+        vin: VIN of the vehicle
+        fallback: Static file served if the vehicle has no picture
+
+    Returns:
+        srcset attribute value
+    """
+    from carconnectivity_plugins.webui.django_app.images import IMAGE_SIZES
+    url = reverse('vehicle_img', kwargs={'vin': vin})
+    suffix = f'&fallback={fallback}' if fallback else ''
+    return ', '.join(f'{url}?w={width}{suffix} {width}w' for width in IMAGE_SIZES)
+
+
+class FragmentNode(template.Node):
+    """Renders its content once per change version of a CarConnectivity object, see cc_fragment."""
+
+    def __init__(self, nodelist: template.NodeList, name: template.base.FilterExpression, element: template.base.FilterExpression) -> None:
+        self.nodelist: template.NodeList = nodelist
+        self.name: template.base.FilterExpression = name
+        self.element: template.base.FilterExpression = element
+
+    def render(self, context: template.Context) -> str:
+        element = self.element.resolve(context)
+        if element is None or not hasattr(element, 'get_absolute_path'):
+            return self.nodelist.render(context)
+        name = (self.origin.name if self.origin is not None else None, self.name.resolve(context))
+        return get_fragment_cache().get_or_render(name, element, lambda: self.nodelist.render(context))
+
+
+@register.tag
+def cc_fragment(parser, token) -> FragmentNode:
+    """
+    Cache the rendered content for the current state of a CarConnectivity object.
+
+    Usage::
+
+        {% cc_fragment 'drives' vehicle.drives %}...{% endcc_fragment %}
+
+    The content is rendered again only after something in the subtree of the object (for vehicle
+    sections: in the section) changed, so it must depend on nothing but the object.
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and a CarConnectivity object")
+    nodelist = parser.parse(('endcc_fragment',))
+    parser.delete_first_token()
+    return FragmentNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
+
+
 @register.filter
 def format_log_record(record, formatter) -> str:
     """
@@ -16,8 +16,11 @@ urlpatterns = [
     path('garage/', include([
         path('', garage.garage_view, name='garage'),
         path('json', garage.garage_json, name='garage_json'),
+        path('events', garage.garage_events, name='garage_events'),
         path('<str:vin>/', garage.vehicle_view, name='vehicle'),
         path('<str:vin>/json', garage.vehicle_json, name='vehicle_json'),
+        path('<str:vin>/json/<path:path>', garage.vehicle_json_path, name='vehicle_json_path'),
+        path('<str:vin>/events', garage.vehicle_events, name='vehicle_events'),
         path('<str:vin>-car.png.json', garage.vehicle_img_json, name='vehicle_img_json'),
         path('<str:vin>-car.png', garage.vehicle_img, name='vehicle_img'),
     ])),
@@ -27,6 +30,7 @@ urlpatterns = [
         path('status', connectors.status_view, name='connectors_status'),
         path('<str:connector_id>/config', connectors.config_view, name='connector_config'),
         path('<str:connector_id>/log', connectors.log_view, name='connector_log'),
+        path('<str:connector_id>/log/json', connectors.log_json, name='connector_log_json'),
     ])),
     
     # Plugins
@@ -34,12 +38,19 @@ urlpatterns = [
         path('status', plugins.status_view, name='plugins_status'),
         path('<str:plugin_id>/config', plugins.config_view, name='plugin_config'),
         path('<str:plugin_id>/log', plugins.log_view, name='plugin_log'),
+        path('<str:plugin_id>/log/json', plugins.log_json, name='plugin_log_json'),
     ])),
     
     # System
     path('log', api.log_view, name='log'),
+    path('log/json', api.log_json, name='log_json'),
+    path('log/stream', api.log_stream, name='log_stream'),
     path('about', api.about_view, name='about'),
     path('healthcheck', api.healthcheck, name='healthcheck'),
+    path('metrics', api.metrics_view, name='metrics'),
+    path('profile/', api.profile_list, name='profile_list'),
+    path('profile/<str:report_id>', api.profile_report, name='profile_report'),
+    path('profile/<str:report_id>/collapsed', api.profile_collapsed, name='profile_collapsed'),
     path('restart', api.restart_view, name='restart'),
     path('restartrefresh', api.restartrefresh_view, name='restartrefresh'),
     path('json', api.json_status, name='json_status'),
@@ -47,8 +58,8 @@ urlpatterns = [
 
 # Serve static files (always, not just in DEBUG mode)
 # This is needed because we're running as a plugin, not a traditional Django app
-from django.views.static import serve
+# Files are served from memory with content hashed names, see assets.py
 if settings.STATICFILES_DIRS:
     urlpatterns += [
-        path('static/<path:path>', serve, {'document_root': settings.STATICFILES_DIRS[0]}),
+        path('static/<path:path>', api.static_asset, name='static_asset'),
     ]
@@ -5,12 +5,18 @@ import sys
 import os
 import time
 import threading
-import logging
 from django.shortcuts import render
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, HttpResponseBadRequest, Http404, JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
 from django.views.decorators.http import require_http_methods
-from django.views.decorators.cache import cache_page
 from carconnectivity_plugins.webui.django_app import get_car_connectivity
+from carconnectivity_plugins.webui.django_app.assets import get_asset_store, negotiate_encoding
+from carconnectivity_plugins.webui.django_app.cache import get_change_versions
+from carconnectivity_plugins.webui.django_app.logs import LogQuery, get_log_tail, log_context, log_json_response
+from carconnectivity_plugins.webui.django_app.metrics import get_metrics
+from carconnectivity_plugins.webui.django_app.profiling import get_request_profiler
+from carconnectivity_plugins.webui.django_app.responses import element_data_response, event_stream_response, get_json_options
 
 if TYPE_CHECKING:
     from django.http import HttpRequest
@@ -28,6 +34,80 @@ def healthcheck(request: HttpRequest) -> HttpResponse:
     return HttpResponse('unhealthy', status=503)
 
 
+@require_http_methods(["GET"])
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """Request and cache metrics in the Prometheus text format."""
+    metrics = get_metrics()
+    if not metrics.enabled:
+        raise Http404("Metrics are disabled")
+    response = HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@require_http_methods(["GET"])
+def profile_list(request: HttpRequest) -> HttpResponse:
+    """The stored request profiles, newest first."""
+    profiler = get_request_profiler()
+    if not profiler.enabled:
+        raise Http404("Profiling is disabled")
+    reports = [{'id': report.id, 'method': report.method, 'path': report.path, 'status': report.status, 'time': report.time.isoformat(),
+                'duration_ms': round(report.duration * 1000, 3), 'url': reverse('profile_report', args=[report.id])}
+               for report in profiler.reports()]
+    return JsonResponse({'reports': reports}, headers={'Cache-Control': 'no-store'})
+
+
+@require_http_methods(["GET"])
+def profile_report(request: HttpRequest, report_id: str) -> HttpResponse:
+    """One request profile: duration and the functions with the most own and total time."""
+    profiler = get_request_profiler()
+    report = profiler.get_report(report_id) if profiler.enabled else None
+    if report is None:
+        raise Http404("Profile not found")
+    return JsonResponse(report.as_dict(reverse('profile_collapsed', args=[report.id])), headers={'Cache-Control': 'no-store'})
+
+
+@require_http_methods(["GET"])
+def profile_collapsed(request: HttpRequest, report_id: str) -> HttpResponse:
+    """The sampled stacks of a request profile in the collapsed format of flame graph tools."""
+    profiler = get_request_profiler()
+    report = profiler.get_report(report_id) if profiler.enabled else None
+    if report is None:
+        raise Http404("Profile not found")
+    response = HttpResponse(report.collapsed(), content_type='text/plain; charset=utf-8')
+    response['Cache-Control'] = 'no-store'
+    response['Content-Disposition'] = f'attachment; filename="profile-{report.id}.folded"'
+    return response
+
+
+@require_http_methods(["GET", "HEAD"])
+def static_asset(request: HttpRequest, path: str) -> HttpResponse:
+    """
+    Serve a static file from memory, pre-compressed.
+
+    Content hashed names (as {% static %} emits them) are cached by the browser for a year, the
+    original names stay available for revalidation only.
+    """
+    found = get_asset_store().find(path)
+    if found is None:
+        raise Http404(f"Static file {path} not found")
+    asset, immutable = found
+    encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), asset)
+    etag = asset.etag(encoding)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        body = asset.encodings[encoding]
+        response = HttpResponse(body if request.method == 'GET' else b'', content_type=asset.content_type)
+        response['Content-Length'] = str(len(body))
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    if len(asset.encodings) > 1:
+        response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = 'public, max-age=31536000, immutable' if immutable else 'public, no-cache'
+    return response
+
+
 @require_http_methods(["GET"])
 def log_view(request: HttpRequest) -> HttpResponse:
     """Display system log."""
@@ -35,18 +115,40 @@ def log_view(request: HttpRequest) -> HttpResponse:
     if not car_connectivity:
         raise Http404("CarConnectivity instance not connected")
     
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    order = request.GET.get('order', 'desc')  # desc = latest first, asc = oldest first
-    storage = car_connectivity.log_storage.storage or []
-    # Django template slice filter does not support ::-1, so reverse in the view
-    log_entries = list(storage)[::-1] if order == 'desc' else list(storage)
+    # Only the first page is rendered, the log viewer loads further pages from log_json
+    try:
+        context = log_context(request, car_connectivity.log_storage.storage, reverse('log_json'), scope='CarConnectivity process only',
+                              empty_text='System logs will appear here once the application starts generating them.',
+                              stream_url=reverse('log_stream'))
+    except ValueError as err:
+        return HttpResponseBadRequest(str(err))
     
-    return render(request, 'log.html', {
-        'car_connectivity': car_connectivity,
-        'formatter': formatter,
-        'log_order': order,
-        'log_entries': log_entries,
-    })
+    return render(request, 'log.html', context)
+
+
+@require_http_methods(["GET"])
+def log_json(request: HttpRequest) -> HttpResponse:
+    """Return a page of the system log as JSON (order, cursor, limit, level, logger and q parameters)."""
+    car_connectivity = get_car_connectivity()
+    if not car_connectivity:
+        raise Http404("CarConnectivity instance not connected")
+
+    return log_json_response(request, car_connectivity.log_storage.storage)
+
+
+@require_http_methods(["GET"])
+def log_stream(request: HttpRequest) -> HttpResponse:
+    """Stream new system log records as Server-Sent Events (level, logger and q parameters)."""
+    car_connectivity = get_car_connectivity()
+    if not car_connectivity:
+        raise Http404("CarConnectivity instance not connected")
+
+    try:
+        query = LogQuery.from_request(request)
+    except ValueError as err:
+        return HttpResponseBadRequest(str(err))
+
+    return event_stream_response(request, get_log_tail(), query)
 
 
 @require_http_methods(["GET"])
@@ -94,26 +196,14 @@ def restartrefresh_view(request: HttpRequest) -> HttpResponse:
 
 
 @require_http_methods(["GET"])
-@cache_page(5)
 def json_status(request: HttpRequest) -> HttpResponse:
     """Return full CarConnectivity status as JSON."""
     car_connectivity = get_car_connectivity()
     if not car_connectivity:
         raise Http404("CarConnectivity instance not connected")
     
-    pretty = request.GET.get('pretty', 'false').lower() == 'true'
-    in_locale = request.GET.get('in_locale', 'false').lower() == 'true'
-    with_locale = request.GET.get('with_locale', None)
-    
-    if with_locale:
-        locale_str = with_locale
-    elif in_locale and car_connectivity.connectors and 'webui' in car_connectivity.connectors.connectors:
-        locale_str = car_connectivity.connectors.connectors['webui'].active_config.get('locale')
-    else:
-        locale_str = None
+    pretty, locale_str = get_json_options(request, car_connectivity)
     
-    json_str = car_connectivity.as_json(pretty=pretty, in_locale=locale_str)
-    
-    response = HttpResponse(json_str, content_type='application/json')
-    response['Cache-Control'] = 'private, max-age=5'
-    return response
+    change_versions = get_change_versions()
+    return element_data_response(request, ('json_status',), change_versions.root_version(), car_connectivity, pretty, locale_str,
+                                 last_modified=change_versions.last_modified(car_connectivity))
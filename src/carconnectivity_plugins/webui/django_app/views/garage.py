@@ -1,16 +1,20 @@
 """Garage views for CarConnectivity WebUI."""
 from __future__ import annotations
 from typing import TYPE_CHECKING
-import io
-import json
-from base64 import b64encode
 from django.shortcuts import render, redirect
-from django.http import JsonResponse, HttpResponse, FileResponse, Http404
+from django.http import JsonResponse, HttpResponse, Http404
 from django.views.decorators.http import require_http_methods
-from django.views.decorators.cache import cache_page
+from django.templatetags.static import static
 from carconnectivity_plugins.webui.django_app import get_car_connectivity
+from carconnectivity_plugins.webui.django_app.cache import attribute_version, get_change_versions, make_etag
+from carconnectivity_plugins.webui.django_app.events import get_event_broker, get_stream_budget
+from carconnectivity_plugins.webui.django_app.images import IMAGE_FORMATS, get_image_cache, negotiate_format, snap_size
+from carconnectivity_plugins.webui.django_app.projection import get_subtree
+from carconnectivity_plugins.webui.django_app.responses import conditional_response, delta_json_response, element_data_response, \
+    event_stream_response, get_json_options, set_validators
 
 if TYPE_CHECKING:
+    from typing import Any, Dict
     from django.http import HttpRequest
 
 # Check if PIL is available
@@ -22,6 +26,13 @@ except ImportError:
     pass
 
 
+def live_update_context() -> Dict[str, Any]:
+    """Template context of the live updates: whether to stream and the version to poll for changes from otherwise."""
+    broker = get_event_broker()
+    # Taken before the page is rendered, changes in between are fetched again by the first poll
+    return {'live_streams': get_stream_budget().available, 'live_version': broker.format_id(broker.last_id)}
+
+
 @require_http_methods(["GET"])
 def root(request: HttpRequest) -> HttpResponse:
     """Redirect root to garage."""
@@ -36,34 +47,35 @@ def garage_view(request: HttpRequest) -> HttpResponse:
         raise Http404("CarConnectivity instance not connected")
     
     return render(request, 'garage/garage.html', {
-        'garage': car_connectivity.garage
+        'garage': car_connectivity.garage,
+        **live_update_context()
     })
 
 
 @require_http_methods(["GET"])
-@cache_page(5)
-def garage_json(request: HttpRequest) -> JsonResponse:
+def garage_json(request: HttpRequest) -> HttpResponse:
     """Return garage data as JSON."""
     car_connectivity = get_car_connectivity()
     if not car_connectivity or not car_connectivity.garage:
         raise Http404("Garage not found")
     
-    pretty = request.GET.get('pretty', 'false').lower() == 'true'
-    in_locale = request.GET.get('in_locale', 'false').lower() == 'true'
-    with_locale = request.GET.get('with_locale', None)
+    pretty, locale_str = get_json_options(request, car_connectivity)
+    if 'since' in request.GET:
+        return delta_json_response(request, get_event_broker(), car_connectivity.garage, request.GET['since'], pretty)
     
-    if with_locale:
-        locale_str = with_locale
-    elif in_locale and car_connectivity.connectors and 'webui' in car_connectivity.connectors.connectors:
-        locale_str = car_connectivity.connectors.connectors['webui'].active_config.get('locale')
-    else:
-        locale_str = None
-    
-    vehicle_json_str = car_connectivity.garage.as_json(pretty=pretty, in_locale=locale_str)
+    change_versions = get_change_versions()
+    return element_data_response(request, ('garage_json',), change_versions.garage_version(), car_connectivity.garage, pretty, locale_str,
+                                 last_modified=change_versions.last_modified(car_connectivity.garage))
+
+
+@require_http_methods(["GET"])
+def garage_events(request: HttpRequest) -> HttpResponse:
+    """Stream changes of all vehicles as Server-Sent Events."""
+    car_connectivity = get_car_connectivity()
+    if not car_connectivity or not car_connectivity.garage:
+        raise Http404("Garage not found")
     
-    response = HttpResponse(vehicle_json_str, content_type='application/json')
-    response['Cache-Control'] = 'private, max-age=5'
-    return response
+    return event_stream_response(request, get_event_broker(), car_connectivity.garage.get_absolute_path())
 
 
 @require_http_methods(["GET"])
@@ -78,12 +90,12 @@ def vehicle_view(request: HttpRequest, vin: str) -> HttpResponse:
         raise Http404(f"Vehicle with VIN {vin} not found")
     
     return render(request, 'garage/vehicle.html', {
-        'vehicle': vehicle
+        'vehicle': vehicle,
+        **live_update_context()
     })
 
 
 @require_http_methods(["GET"])
-@cache_page(5)
 def vehicle_json(request: HttpRequest, vin: str) -> HttpResponse:
     """Return vehicle data as JSON."""
     car_connectivity = get_car_connectivity()
@@ -94,22 +106,51 @@ def vehicle_json(request: HttpRequest, vin: str) -> HttpResponse:
     if not vehicle:
         raise Http404(f"Vehicle with VIN {vin} not found")
     
-    pretty = request.GET.get('pretty', 'false').lower() == 'true'
-    in_locale = request.GET.get('in_locale', 'false').lower() == 'true'
-    with_locale = request.GET.get('with_locale', None)
+    pretty, locale_str = get_json_options(request, car_connectivity)
+    if 'since' in request.GET:
+        return delta_json_response(request, get_event_broker(), vehicle, request.GET['since'], pretty)
     
-    if with_locale:
-        locale_str = with_locale
-    elif in_locale and car_connectivity.connectors and 'webui' in car_connectivity.connectors.connectors:
-        locale_str = car_connectivity.connectors.connectors['webui'].active_config.get('locale')
-    else:
-        locale_str = None
+    change_versions = get_change_versions()
+    return element_data_response(request, ('vehicle_json', vin), change_versions.vehicle_version(vin), vehicle, pretty, locale_str,
+                                 last_modified=change_versions.last_modified(vehicle))
+
+
+@require_http_methods(["GET"])
+def vehicle_json_path(request: HttpRequest, vin: str, path: str) -> HttpResponse:
+    """Return a subtree of the vehicle data (e.g. drives/primary) as JSON, attributes as their val, uni and upd."""
+    car_connectivity = get_car_connectivity()
+    if not car_connectivity:
+        raise Http404("CarConnectivity instance not connected")
     
-    vehicle_json_str = vehicle.as_json(pretty=pretty, in_locale=locale_str)
+    vehicle = car_connectivity.garage.get_vehicle(vin)
+    if not vehicle:
+        raise Http404(f"Vehicle with VIN {vin} not found")
     
-    response = HttpResponse(vehicle_json_str, content_type='application/json')
-    response['Cache-Control'] = 'private, max-age=5'
-    return response
+    element = get_subtree(vehicle, path)
+    if element is None:
+        raise Http404(f"{path} not found in vehicle with VIN {vin}")
+
+    pretty, locale_str = get_json_options(request, car_connectivity)
+
+    change_versions = get_change_versions()
+    element_path = element.get_absolute_path()
+    # Only the update time of whole vehicles is maintained, it is never older than the one of the subtree
+    return element_data_response(request, ('vehicle_json_path', element_path), change_versions.scope_version(element_path), element,
+                                 pretty, locale_str, last_modified=change_versions.last_modified(vehicle))
+
+
+@require_http_methods(["GET"])
+def vehicle_events(request: HttpRequest, vin: str) -> HttpResponse:
+    """Stream changes of a vehicle as Server-Sent Events."""
+    car_connectivity = get_car_connectivity()
+    if not car_connectivity:
+        raise Http404("CarConnectivity instance not connected")
+
+    vehicle = car_connectivity.garage.get_vehicle(vin)
+    if not vehicle:
+        raise Http404(f"Vehicle with VIN {vin} not found")
+
+    return event_stream_response(request, get_event_broker(), vehicle.get_absolute_path())
 
 
 @require_http_methods(["GET"])
@@ -123,13 +164,13 @@ def vehicle_img(request: HttpRequest, vin: str) -> HttpResponse:
     if not vehicle:
         fallback = request.GET.get('fallback')
         if fallback:
-            return redirect(f'/static/{fallback}')
+            return redirect(static(fallback))
         raise Http404(f"Vehicle with VIN {vin} not found")
     
     if not SUPPORT_IMAGES:
         fallback = request.GET.get('fallback')
         if fallback:
-            return redirect(f'/static/{fallback}')
+            return redirect(static(fallback))
         raise Http404("PIL module not available, cannot serve vehicle images")
     
     # Check if vehicle has car picture
@@ -138,15 +179,30 @@ def vehicle_img(request: HttpRequest, vin: str) -> HttpResponse:
         vehicle.images.images['car_picture'].value is None):
         fallback = request.GET.get('fallback')
         if fallback:
-            return redirect(f'/static/{fallback}')
+            return redirect(static(fallback))
         raise Http404(f"Vehicle with VIN {vin} has no car picture")
     
-    # Serve image
-    img_io = io.BytesIO()
-    vehicle.images.images['car_picture'].value.save(img_io, 'PNG')
-    img_io.seek(0)
-    
-    return FileResponse(img_io, content_type='image/png')
+    # Sizes are rounded to a fixed set so only a few variants are ever encoded
+    width = snap_size(request.GET.get('w'))
+    height = snap_size(request.GET.get('h'))
+    image_format = negotiate_format(request.headers.get('Accept', ''))
+    variant = (image_format, width, height)
+    
+    # Revalidation is answered without encoding the image again
+    picture = vehicle.images.images['car_picture']
+    etag = make_etag(('vehicle_img', vin, variant), attribute_version(picture))
+    last_modified = picture.last_changed
+    not_modified = conditional_response(request, etag, last_modified)
+    if not_modified is None:
+        # Serve image
+        data = get_image_cache().get_image(vin, 'car_picture', picture, image_format, width, height)
+        response = HttpResponse(data, content_type=IMAGE_FORMATS[image_format][1])
+        set_validators(response, etag, last_modified)
+    else:
+        response = not_modified
+    # The format depends on what the browser accepts
+    response['Vary'] = 'Accept'
+    return response
 
 
 @require_http_methods(["GET"])
@@ -174,14 +230,22 @@ def vehicle_img_json(request: HttpRequest, vin: str) -> JsonResponse:
             'url': f'/static/{fallback}'
         })
     
-    # Serve image as JSON
-    img_io = io.BytesIO()
-    vehicle.images.images['car_picture'].value.save(img_io, 'PNG')
-    img_io.seek(0)
+    # Revalidation is answered without encoding the image again
+    picture = vehicle.images.images['car_picture']
+    etag = make_etag(('vehicle_img_json', vin), attribute_version(picture))
+    last_modified = picture.last_changed
+    not_modified = conditional_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    # Serve image as JSON, the base64 string is cached next to the PNG it is derived from
+    data = get_image_cache().get_base64(vin, 'car_picture', picture)
     
     json_map = {
         'type': 'image/png',
         'encoding': 'base64',
-        'data': b64encode(img_io.read()).decode()
+        'data': data
     }
-    return JsonResponse(json_map)
+    response = JsonResponse(json_map)
+    set_validators(response, etag, last_modified)
+    return response
@@ -1,11 +1,12 @@
 """Plugin views for CarConnectivity WebUI."""
 from __future__ import annotations
 from typing import TYPE_CHECKING
-import logging
 from django.shortcuts import render
-from django.http import Http404
+from django.http import HttpResponseBadRequest, Http404
+from django.urls import reverse
 from django.views.decorators.http import require_http_methods
 from carconnectivity_plugins.webui.django_app import get_car_connectivity
+from carconnectivity_plugins.webui.django_app.logs import log_context, log_json_response
 
 if TYPE_CHECKING:
     from django.http import HttpRequest, HttpResponse
@@ -51,9 +52,24 @@ def log_view(request: HttpRequest, plugin_id: str) -> HttpResponse:
         raise Http404(f"Plugin {plugin_id} not found")
     
     plugin = car_connectivity.plugins.plugins[plugin_id]
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        context = log_context(request, plugin.log_storage.storage, reverse('plugin_log_json', kwargs={'plugin_id': plugin_id}),
+                              empty_text='Logs will appear here once the plugin starts generating them.')
+    except ValueError as err:
+        return HttpResponseBadRequest(str(err))
+    context['plugin'] = plugin
     
-    return render(request, 'plugins/log.html', {
-        'plugin': plugin,
-        'formatter': formatter
-    })
+    return render(request, 'plugins/log.html', context)
+
+
+@require_http_methods(["GET"])
+def log_json(request: HttpRequest, plugin_id: str) -> HttpResponse:
+    """Return a page of the plugin log as JSON (order, cursor, limit, level, logger and q parameters)."""
+    car_connectivity = get_car_connectivity()
+    if not car_connectivity:
+        raise Http404("CarConnectivity instance not connected")
+
+    if plugin_id not in car_connectivity.plugins.plugins:
+        raise Http404(f"Plugin {plugin_id} not found")
+
+    return log_json_response(request, car_connectivity.plugins.plugins[plugin_id].log_storage.storage)
@@ -0,0 +1,96 @@
+"""Warm-up of templates and render caches at plugin startup."""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import base64
+import io
+import logging
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler, WSGIRequest
+from django.urls import reverse
+
+from carconnectivity_plugins.webui.django_app import get_users
+
+if TYPE_CHECKING:
+    from typing import Dict, List, Optional
+    from carconnectivity.carconnectivity import CarConnectivity
+
+LOG: logging.Logger = logging.getLogger("carconnectivity.plugins.webui")
+
+
+def warmup_paths(car_connectivity: CarConnectivity) -> List[str]:
+    """Pages rendered by the warm-up: the login page, every vehicle of the live garage and the system pages."""
+    paths = [reverse('login'), reverse('garage')]
+    if car_connectivity.garage is not None:
+        paths.extend(reverse('vehicle', kwargs={'vin': vehicle.vin.value})
+                     for vehicle in car_connectivity.garage.list_vehicles() if vehicle.vin.value is not None)
+    paths.extend([reverse('log'), reverse('connectors_status'), reverse('plugins_status'), reverse('about')])
+    return paths
+
+
+def _host() -> str:
+    # A host the request passes ALLOWED_HOSTS with
+    for host in settings.ALLOWED_HOSTS:
+        if host == '*':
+            break
+        return host.lstrip('.')
+    return 'localhost'
+
+
+def _environ(path: str, host: str, authorization: Optional[str]) -> Dict:
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': '',
+        'SERVER_NAME': host,
+        'SERVER_PORT': '80',
+        'HTTP_HOST': host,
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.url_scheme': 'http',
+    }
+    if authorization is not None:
+        environ['HTTP_AUTHORIZATION'] = authorization
+    return environ
+
+
+def warm_up(car_connectivity: CarConnectivity) -> Dict[str, float]:
+    """
+    Render each page once against the live garage, through the full middleware stack.
+
+    Compiles the templates into the cached template loader and fills the render caches, so the
+    first users after a (re)start do not pay for it. Failures are logged and do not stop the warm-up.
+
+    Returns:
+        Dict[str, float]: Milliseconds each page took, by path.
+    """
+    handler = WSGIHandler()
+    users = get_users()
+    authorization: Optional[str] = None
+    if users:
+        username, password = next(iter(users.items()))
+        authorization = 'Basic ' + base64.b64encode(f'{username}:{password}'.encode('utf-8')).decode('ascii')
+    host = _host()
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    for path in warmup_paths(car_connectivity):
+        if authorization is None and path != reverse('login'):
+            # Without users every other page redirects to the login
+            continue
+        page_start = time.perf_counter()
+        try:
+            response = handler.get_response(WSGIRequest(_environ(path, host, authorization)))
+            response.close()
+            if response.status_code != 200:
+                LOG.debug('Warm-up of %s answered %d', path, response.status_code)
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            LOG.warning('Warm-up of %s failed: %s', path, err)
+            continue
+        timings[path] = (time.perf_counter() - page_start) * 1000
+    LOG.info('Warmed up %d pages in %.1f ms (%s)', len(timings), (time.perf_counter() - start) * 1000,
+             ', '.join(f'{path} {duration:.1f} ms' for path, duration in timings.items()))
+    return timings
@@ -5,14 +5,23 @@ import logging
 import threading
 import os
 import locale
-from wsgiref.simple_server import make_server, WSGIServer
 
 from carconnectivity.errors import ConfigurationError
 from carconnectivity.util import config_remove_credentials
 from carconnectivity_plugins.base.plugin import BasePlugin
+from carconnectivity_plugins.webui.django_app.assets import get_asset_store
+from carconnectivity_plugins.webui.django_app.cache import get_change_versions
+from carconnectivity_plugins.webui.django_app.compression import get_response_compressor
+from carconnectivity_plugins.webui.django_app.events import get_event_broker, get_stream_budget
+from carconnectivity_plugins.webui.django_app.images import get_image_cache, get_image_prerenderer
+from carconnectivity_plugins.webui.django_app.logs import get_log_tail
+from carconnectivity_plugins.webui.django_app.metrics import get_metrics
+from carconnectivity_plugins.webui.django_app.profiling import get_request_profiler
 
 if TYPE_CHECKING:
-    from typing import Dict, Optional
+    from typing import Dict, Optional, Union
+    from wsgiref.simple_server import WSGIServer
+    from carconnectivity_plugins.webui.server import AsyncHTTPServer
     from carconnectivity.carconnectivity import CarConnectivity
 
 # Check for PIL support
@@ -45,7 +54,7 @@ class Plugin(BasePlugin):
                           config=config, log=LOG, *args, initialization=initialization, **kwargs)
         
         self.webthread: Optional[threading.Thread] = None
-        self.server: Optional[WSGIServer] = None
+        self.server: Optional[Union[WSGIServer, AsyncHTTPServer]] = None
         
         # Configure host and port
         if 'host' not in config or not config['host']:
@@ -59,6 +68,51 @@ class Plugin(BasePlugin):
                 raise ConfigurationError('Invalid port specified in config ("port" out of range, must be 1-65535)')
         else:
             self.active_config['port'] = 4000
+
+        # Configure HTTP server
+        from carconnectivity_plugins.webui.server import SERVER_MODES
+        if 'server_mode' in config and config['server_mode'] is not None:
+            if config['server_mode'] not in SERVER_MODES:
+                raise ConfigurationError(f'Invalid server_mode specified in config (must be one of {", ".join(SERVER_MODES)})')
+            self.active_config['server_mode'] = config['server_mode']
+        else:
+            self.active_config['server_mode'] = 'pooled'
+
+        if 'server_workers' in config and config['server_workers'] is not None:
+            if not isinstance(config['server_workers'], int) or config['server_workers'] < 1:
+                raise ConfigurationError('Invalid server_workers specified in config (must be at least 1)')
+            self.active_config['server_workers'] = config['server_workers']
+        else:
+            self.active_config['server_workers'] = 8
+
+        if 'server_max_queue' in config and config['server_max_queue'] is not None:
+            if not isinstance(config['server_max_queue'], int) or config['server_max_queue'] < 0:
+                raise ConfigurationError('Invalid server_max_queue specified in config (must be 0 or more)')
+            self.active_config['server_max_queue'] = config['server_max_queue']
+        else:
+            self.active_config['server_max_queue'] = 32
+
+        if 'server_keep_alive' in config and config['server_keep_alive'] is not None:
+            self.active_config['server_keep_alive'] = bool(config['server_keep_alive'])
+        else:
+            self.active_config['server_keep_alive'] = True
+
+        if 'server_keep_alive_timeout' in config and config['server_keep_alive_timeout'] is not None:
+            if not isinstance(config['server_keep_alive_timeout'], (int, float)) or config['server_keep_alive_timeout'] <= 0:
+                raise ConfigurationError('Invalid server_keep_alive_timeout specified in config (must be greater than 0)')
+            self.active_config['server_keep_alive_timeout'] = config['server_keep_alive_timeout']
+        else:
+            self.active_config['server_keep_alive_timeout'] = 15
+
+        if 'server_max_streams' in config and config['server_max_streams'] is not None:
+            if not isinstance(config['server_max_streams'], int) or config['server_max_streams'] < 0:
+                raise ConfigurationError('Invalid server_max_streams specified in config (must be 0 or more)')
+            self.active_config['server_max_streams'] = config['server_max_streams']
+
+        if 'warmup' in config and config['warmup'] is not None:
+            self.active_config['warmup'] = bool(config['warmup'])
+        else:
+            self.active_config['warmup'] = True
         
         # Configure users
         users: Dict[str, str] = {}
@@ -100,24 +154,55 @@ class Plugin(BasePlugin):
         from carconnectivity_plugins.webui.django_app import configure_from_plugin
         configure_from_plugin(config, car_connectivity, users)
         
-        # Get WSGI application (call function to initialize Django)
-        from carconnectivity_plugins.webui.django_app.wsgi import get_application
+        get_stream_budget().configure(self.active_config)
+        get_event_broker().configure(config)
+        get_log_tail().configure(config)
+        get_image_cache().configure(config)
+        get_image_prerenderer().configure(config)
+        get_response_compressor().configure(config)
+        get_metrics().configure(config)
+        get_request_profiler().configure(config)
+
+        # Get WSGI or ASGI application (call function to initialize Django)
+        if self.active_config['server_mode'] == 'asgi':
+            from carconnectivity_plugins.webui.django_app.asgi import get_application
+        else:
+            from carconnectivity_plugins.webui.django_app.wsgi import get_application
         self.application = get_application()
         
-        # Create WSGI server
+        # Create HTTP server
+        from carconnectivity_plugins.webui.server import make_server
         self.server = make_server(
+            self.active_config['server_mode'],
             self.active_config['host'],
             self.active_config['port'],
             self.application,
-            server_class=WSGIServer
+            workers=self.active_config['server_workers'],
+            max_queue=self.active_config['server_max_queue'],
+            keep_alive=self.active_config['server_keep_alive'],
+            keep_alive_timeout=self.active_config['server_keep_alive_timeout']
         )
         
         LOG.info("Loading Django WebUI plugin with config %s", config_remove_credentials(config))
     
     def startup(self) -> None:
-        """Start the Django WSGI server."""
-        LOG.info("Starting Django WebUI plugin on %s:%s", 
-                self.active_config['host'], self.active_config['port'])
+        """Start the Django WebUI server."""
+        LOG.info("Starting Django WebUI plugin on %s:%s (%s server)",
+                self.active_config['host'], self.active_config['port'], self.active_config['server_mode'])
+
+        get_change_versions().attach(self.car_connectivity)
+        get_event_broker().attach(self.car_connectivity)
+        get_log_tail().attach(self.car_connectivity)
+        get_image_cache().attach(self.car_connectivity)
+        # Encode vehicle pictures in the background so the first request is already a cache hit
+        get_image_prerenderer().start(self.car_connectivity)
+        # Bundle, hash and compress the static files once instead of per request
+        get_asset_store().build()
+
+        if self.active_config['warmup']:
+            # Compile templates and fill the render caches before the first user arrives
+            from carconnectivity_plugins.webui.django_app.warmup import warm_up
+            warm_up(self.car_connectivity)
         
         self.webthread = threading.Thread(target=self.server.serve_forever)
         self.webthread.name = 'carconnectivity.plugins.webui-webthread'
@@ -128,13 +213,23 @@ class Plugin(BasePlugin):
         LOG.debug("Django WebUI plugin started successfully")
     
     def shutdown(self) -> None:
-        """Shutdown the Django WSGI server."""
+        """Shutdown the Django WebUI server."""
+        # Close open event streams first, they would otherwise keep workers busy
+        get_event_broker().detach()
+        get_log_tail().detach()
+        get_change_versions().detach()
+        get_image_prerenderer().stop()
+        get_image_cache().detach()
+
         if self.server is not None:
             LOG.info("Shutting down Django WebUI plugin")
             self.server.shutdown()
         
         if self.webthread is not None and self.webthread.is_alive():
             self.webthread.join(timeout=5)
+
+        if self.server is not None:
+            self.server.server_close()
         
         return super().shutdown()
     
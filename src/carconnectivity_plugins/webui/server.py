@@ -0,0 +1,737 @@
+"""HTTP servers used to run the Django WebUI inside the plugin."""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Union
+import asyncio
+import logging
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+from urllib.parse import unquote
+from wsgiref import simple_server
+
+from django.core.servers.basehttp import WSGIServer, WSGIRequestHandler, ServerHandler
+
+if TYPE_CHECKING:
+    from typing import Tuple, Any, Callable, Optional, Set, List, Dict
+
+LOG: logging.Logger = logging.getLogger("carconnectivity.plugins.webui")
+
+SERVER_MODES = ('pooled', 'simple', 'asgi')
+
+ACCESS_LOG: logging.Logger = logging.getLogger("django.server")
+
+MAX_REQUEST_LINE: int = 65536
+MAX_HEADERS: int = 100
+MAX_REQUEST_BODY: int = 10 * 1024 * 1024
+
+# Seconds a worker waits for the rest of a request once the client started sending it
+REQUEST_READ_TIMEOUT: float = 5.0
+
+# Idle keep-alive connections watched at the same time, further ones are closed after their response
+MAX_IDLE_CONNECTIONS: int = 256
+
+_OVERLOAD_RESPONSE: bytes = (b'HTTP/1.1 503 Service Unavailable\r\n'
+                             b'Content-Type: text/plain\r\n'
+                             b'Content-Length: 11\r\n'
+                             b'Retry-After: 1\r\n'
+                             b'Connection: close\r\n'
+                             b'\r\n'
+                             b'overloaded\n')
+
+
+class KeepAliveServerHandler(ServerHandler):
+    """WSGI handler that keeps HTTP/1.1 connections open whenever the response length is known."""
+
+    def cleanup_headers(self) -> None:
+        # Skip Django's ServerHandler, it forces "Connection: close" for servers not based on ThreadingMixIn
+        super(ServerHandler, self).cleanup_headers()  # pylint: disable=bad-super-call
+        if self.environ['REQUEST_METHOD'] == 'HEAD' and str(self.headers.get('Content-Length')) == '0':
+            del self.headers['Content-Length']
+        if self.environ['REQUEST_METHOD'] != 'HEAD' and 'Content-Length' not in self.headers:
+            self.headers['Connection'] = 'close'
+        elif not self.request_handler.server.keep_alive:
+            self.headers['Connection'] = 'close'
+        if self.headers.get('Connection') == 'close':
+            self.request_handler.close_connection = True
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """
+    Request handler serving one request (plus any the client already pipelined) each time it is dispatched.
+
+    Unlike BaseRequestHandler the constructor only sets up the connection. PooledWSGIServer calls handle()
+    whenever a request arrives; in between, keep-alive connections wait in the server's IdleConnections
+    instead of occupying a worker.
+    """
+
+    # pylint: disable-next=super-init-not-called
+    def __init__(self, request: Any, client_address: Any, server: PooledWSGIServer) -> None:
+        self.request = request
+        self.client_address = client_address
+        self.server = server
+        self.close_connection = True
+        self.setup()
+
+    def setup(self) -> None:
+        self.timeout = min(REQUEST_READ_TIMEOUT, self.server.keep_alive_timeout)
+        super().setup()
+
+    def handle(self) -> None:
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self.has_pending_request():
+            self.handle_one_request()
+
+    def has_pending_request(self) -> bool:
+        """Whether (part of) the next request was already received, e.g. a pipelined one, without waiting for it."""
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            # Left to the next read to report
+            return True
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def close(self) -> None:
+        """Flush and close the connection."""
+        try:
+            self.connection.shutdown(socket.SHUT_WR)
+        except (AttributeError, OSError):
+            pass
+        self.finish()
+
+    def handle_one_request(self) -> None:
+        try:
+            self.raw_requestline = self.rfile.readline(65537)
+        except (TimeoutError, ConnectionError):
+            self.close_connection = True
+            return
+        if not self.raw_requestline:
+            self.close_connection = True
+            return
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ''
+            self.request_version = ''
+            self.command = ''
+            self.send_error(414)
+            return
+
+        if not self.parse_request():
+            return
+
+        handler = KeepAliveServerHandler(self.rfile, self.wfile, self.get_stderr(), self.get_environ(), multithread=True)
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+
+
+class IdleConnections:
+    """
+    Keep-alive connections between two requests, watched by a single thread.
+
+    A connection is handed back to its server (resume) as soon as it becomes readable, i.e. the client sent the
+    next request or closed it, and closed (expire) when it stays idle for longer than timeout.
+
+    Args:
+        resume (Callable[[Any, Any, KeepAliveRequestHandler], None]): Called with socket, client address and handler of a readable connection.
+        expire (Callable[[Any, KeepAliveRequestHandler], None]): Called with socket and handler of a connection to close.
+        timeout (float): Seconds a connection may stay idle.
+        max_connections (int): Number of connections watched at the same time.
+    """
+
+    def __init__(self, resume: Callable[[Any, Any, KeepAliveRequestHandler], None], expire: Callable[[Any, KeepAliveRequestHandler], None],
+                 timeout: float, max_connections: int = MAX_IDLE_CONNECTIONS) -> None:
+        self.resume: Callable[[Any, Any, KeepAliveRequestHandler], None] = resume
+        self.expire: Callable[[Any, KeepAliveRequestHandler], None] = expire
+        self.timeout: float = timeout
+        self.max_connections: int = max_connections
+        self._selector: selectors.BaseSelector = selectors.DefaultSelector()
+        self._wakeup_receive, self._wakeup_send = socket.socketpair()
+        self._wakeup_receive.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self._selector.register(self._wakeup_receive, selectors.EVENT_READ)
+        # Connections by socket with their deadline, in the order they were parked (and so of their deadlines)
+        self._idle: Dict[Any, Tuple[float, Any, KeepAliveRequestHandler]] = {}
+        self._added: List[Tuple[Any, Any, KeepAliveRequestHandler]] = []
+        self._count: int = 0
+        self._closed: bool = False
+        self._thread: Optional[threading.Thread] = None
+        self._lock: threading.Lock = threading.Lock()
+
+    def park(self, request: Any, client_address: Any, handler: KeepAliveRequestHandler) -> bool:
+        """
+        Watch a connection until its next request arrives.
+
+        Returns:
+            bool: False if the connection cannot be watched (too many idle connections or closed) and must be closed instead.
+        """
+        with self._lock:
+            if self._closed or self._count >= self.max_connections:
+                return False
+            self._count += 1
+            self._added.append((request, client_address, handler))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='carconnectivity.plugins.webui-idle', daemon=True)
+                self._thread.start()
+        self._wake()
+        return True
+
+    def close(self) -> None:
+        """Stop watching and close all idle connections."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        self._wake()
+        if thread is not None:
+            thread.join(timeout=5)
+        with self._lock:
+            connections = [(request, handler) for request, _, handler in self._added]
+            connections += [(request, handler) for request, (_, _, handler) in self._idle.items()]
+            self._added.clear()
+            self._idle.clear()
+        for request, handler in connections:
+            self.expire(request, handler)
+        self._selector.close()
+        self._wakeup_receive.close()
+        self._wakeup_send.close()
+
+    def _wake(self) -> None:
+        try:
+            self._wakeup_send.send(b'\0')
+        except (BlockingIOError, OSError):
+            # A wakeup is pending already, or the wakeup socket is closed
+            pass
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if self._closed:
+                    return
+                added, self._added = self._added, []
+            now = time.monotonic()
+            for request, client_address, handler in added:
+                try:
+                    self._selector.register(request, selectors.EVENT_READ)
+                except (ValueError, OSError):
+                    # Closed by the client in the meantime
+                    self._remove(request)
+                    self.expire(request, handler)
+                    continue
+                self._idle[request] = (now + self.timeout, client_address, handler)
+
+            timeout = next(iter(self._idle.values()))[0] - now if self._idle else None
+            for key, _ in self._selector.select(max(timeout, 0) if timeout is not None else None):
+                if key.fileobj is self._wakeup_receive:
+                    try:
+                        while self._wakeup_receive.recv(1024):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                _, client_address, handler = self._idle.pop(key.fileobj)
+                self._remove(key.fileobj)
+                self.resume(key.fileobj, client_address, handler)
+
+            now = time.monotonic()
+            for request, (deadline, _, handler) in list(self._idle.items()):
+                if deadline > now:
+                    break
+                del self._idle[request]
+                self._remove(request)
+                self.expire(request, handler)
+
+    def _remove(self, request: Any) -> None:
+        try:
+            self._selector.unregister(request)
+        except (KeyError, ValueError):
+            pass
+        with self._lock:
+            self._count -= 1
+
+
+class PooledWSGIServer(WSGIServer):
+    """
+    WSGI server handing requests to a bounded pool of worker threads.
+
+    Requests that arrive while all workers are busy wait in a queue of at most max_queue entries.
+    When that queue is full as well the connection is answered with 503 right away instead of
+    piling up on the listening socket. Keep-alive connections only occupy a worker while a request
+    is served; between requests they are watched by IdleConnections.
+
+    Args:
+        server_address (Tuple[str, int]): Host and port to listen on.
+        workers (int): Number of worker threads serving requests.
+        max_queue (int): Number of requests allowed to wait for a free worker.
+        keep_alive (bool): Whether HTTP/1.1 connections are kept open between requests.
+        keep_alive_timeout (float): Seconds an idle keep-alive connection is kept open.
+    """
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, server_address: Tuple[str, int], workers: int = 8, max_queue: int = 32, keep_alive: bool = True,
+                 keep_alive_timeout: float = 15.0, **kwargs) -> None:
+        self.workers: int = workers
+        self.max_queue: int = max_queue
+        self.keep_alive: bool = keep_alive
+        self.keep_alive_timeout: float = keep_alive_timeout
+        self.request_queue_size = max(workers + max_queue, 5)
+        self._slots: threading.BoundedSemaphore = threading.BoundedSemaphore(workers + max_queue)
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='carconnectivity.plugins.webui-worker')
+        self._idle_connections: IdleConnections = IdleConnections(self._dispatch, self._close_connection, keep_alive_timeout)
+        super().__init__(server_address, KeepAliveRequestHandler, **kwargs)
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        try:
+            handler = KeepAliveRequestHandler(request, client_address, self)
+        except OSError:
+            self.shutdown_request(request)
+            return
+        # Browsers open connections ahead of time, those wait for their first request outside the pool as well
+        if handler.has_pending_request() or not self._idle_connections.park(request, client_address, handler):
+            self._dispatch(request, client_address, handler)
+
+    def _dispatch(self, request: Any, client_address: Any, handler: KeepAliveRequestHandler) -> None:
+        if not self._slots.acquire(blocking=False):
+            LOG.warning('WebUI request queue is full (%d workers, %d queued), rejecting connection from %s',
+                        self.workers, self.max_queue, client_address[0])
+            try:
+                request.sendall(_OVERLOAD_RESPONSE)
+            except OSError:
+                pass
+            self._close_connection(request, handler)
+            return
+        try:
+            self._executor.submit(self._process_request_worker, request, client_address, handler)
+        except RuntimeError:
+            # Executor is already shut down
+            self._slots.release()
+            self._close_connection(request, handler)
+
+    def _process_request_worker(self, request: Any, client_address: Any, handler: KeepAliveRequestHandler) -> None:
+        keep_open = False
+        try:
+            handler.handle()
+            keep_open = not handler.close_connection
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.handle_error(request, client_address)
+        finally:
+            self._slots.release()
+            if not keep_open or not self._idle_connections.park(request, client_address, handler):
+                self._close_connection(request, handler)
+
+    def _close_connection(self, request: Any, handler: Optional[KeepAliveRequestHandler]) -> None:
+        if handler is not None:
+            try:
+                handler.close()
+            except OSError:
+                pass
+        self.shutdown_request(request)
+
+    def server_close(self) -> None:
+        super().server_close()
+        self._idle_connections.close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _ClientDisconnected(ConnectionError):
+    """Raised by the ASGI send callable when the client went away."""
+
+
+class AsyncHTTPServer:  # pylint: disable=too-many-instance-attributes
+    """
+    Embedded asyncio HTTP/1.1 server driving an ASGI application.
+
+    Every connection is a coroutine on a single event loop, so idle keep-alive connections and long lived
+    streams cost no thread. At most `workers` requests are dispatched to the application at the same time;
+    Django runs sync views for each of them in its own thread, so this also bounds the number of executor
+    threads. A slot is freed as soon as the response headers are sent, streaming responses therefore do not
+    hold one. Requests beyond that wait in a queue of at most `max_queue` entries, further ones get a 503.
+    While a request is served the connection is watched, a client closing or resetting it is reported to the
+    application as http.disconnect, so e.g. event streams end with their client.
+
+    The interface follows socketserver (serve_forever(), shutdown(), server_close()) so the plugin can run it
+    the same way as the WSGI servers.
+
+    Args:
+        server_address (Tuple[str, int]): Host and port to listen on.
+        application: The ASGI application to serve.
+        workers (int): Number of requests dispatched to the application concurrently.
+        max_queue (int): Number of requests allowed to wait for a free slot.
+        keep_alive (bool): Whether HTTP/1.1 connections are kept open between requests.
+        keep_alive_timeout (float): Seconds an idle keep-alive connection is kept open.
+    """
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, server_address: Tuple[str, int], application: Any, workers: int = 8, max_queue: int = 32, keep_alive: bool = True,
+                 keep_alive_timeout: float = 15.0) -> None:
+        self.server_address: Tuple[str, int] = server_address
+        self.application: Any = application
+        self.workers: int = workers
+        self.max_queue: int = max_queue
+        self.keep_alive: bool = keep_alive
+        self.keep_alive_timeout: float = keep_alive_timeout
+
+        # Bind right away so configuration errors (e.g. port in use) show up while loading the plugin
+        family = socket.AF_INET6 if ':' in server_address[0] else socket.AF_INET
+        self.socket: socket.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self.socket.bind(server_address)
+            self.socket.listen(128)
+        except OSError:
+            self.socket.close()
+            raise
+        self.server_port: int = self.socket.getsockname()[1]
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._waiting: int = 0
+        self._connections: Set[asyncio.Task] = set()
+        self._shutdown_requested: bool = False
+        self._is_shut_down: threading.Event = threading.Event()
+
+    def serve_forever(self) -> None:
+        """Run the event loop until shutdown() is called."""
+        self._is_shut_down.clear()
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._serve())
+        finally:
+            self._loop.close()
+            self._is_shut_down.set()
+
+    def shutdown(self) -> None:
+        """Stop serve_forever() and wait for it to return."""
+        self._shutdown_requested = True
+        loop = self._loop
+        if loop is not None and not loop.is_closed() and self._stop_event is not None:
+            try:
+                loop.call_soon_threadsafe(self._stop_event.set)
+            except RuntimeError:
+                # Loop closed in the meantime
+                pass
+            self._is_shut_down.wait(timeout=10)
+
+    def server_close(self) -> None:
+        """Close the listening socket."""
+        self.socket.close()
+
+    async def _serve(self) -> None:
+        self._stop_event = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.workers)
+        if self._shutdown_requested:
+            return
+        server = await asyncio.start_server(self._handle_connection, sock=self.socket, limit=MAX_REQUEST_LINE)
+        async with server:
+            await self._stop_event.wait()
+        for task in list(self._connections):
+            task.cancel()
+        if self._connections:
+            await asyncio.wait(list(self._connections), timeout=5)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        if task is not None:
+            self._connections.add(task)
+        # Bytes of the next request read while watching the client during the previous one
+        read_ahead = bytearray()
+        try:
+            keep_open = True
+            while keep_open:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), timeout=self.keep_alive_timeout)
+                except asyncio.TimeoutError:
+                    break
+                except ValueError:
+                    # Longer than the stream limit
+                    await self._send_error(writer, HTTPStatus.REQUEST_URI_TOO_LONG)
+                    break
+                request_line = bytes(read_ahead) + request_line
+                read_ahead.clear()
+                if not request_line:
+                    break
+                keep_open = await self._handle_request(request_line, reader, writer, read_ahead)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        except asyncio.CancelledError:
+            pass
+        except Exception:  # pylint: disable=broad-exception-caught
+            LOG.exception('Error while handling a connection')
+        finally:
+            if task is not None:
+                self._connections.discard(task)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, asyncio.CancelledError):
+                pass
+
+    # pylint: disable-next=too-many-locals, too-many-branches, too-many-statements, too-many-return-statements
+    async def _handle_request(self, request_line: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                              read_ahead: bytearray) -> bool:
+        try:
+            method, target, http_version = request_line.decode('latin-1').rstrip('\r\n').split(' ')
+            if not http_version.startswith('HTTP/1.'):
+                raise ValueError(http_version)
+        except ValueError:
+            await self._send_error(writer, HTTPStatus.BAD_REQUEST)
+            return False
+        http_version = http_version[5:]
+
+        headers: List[Tuple[bytes, bytes]] = []
+        header_dict: Dict[bytes, bytes] = {}
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                # Longer than the stream limit
+                await self._send_error(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+                return False
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(headers) >= MAX_HEADERS:
+                await self._send_error(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+                return False
+            name, _, value = line.partition(b':')
+            name = name.strip().lower()
+            # Drop headers with underscores to prevent header spoofing (same as Django's runserver)
+            if not name or b'_' in name:
+                continue
+            value = value.strip()
+            headers.append((name, value))
+            header_dict[name] = value
+
+        connection_header = header_dict.get(b'connection', b'').lower()
+        if http_version == '1.1':
+            keep_alive = self.keep_alive and connection_header != b'close'
+        else:
+            keep_alive = self.keep_alive and connection_header == b'keep-alive'
+
+        # Read the complete request body before dispatching, requests of the WebUI are small
+        body = b''
+        if header_dict.get(b'transfer-encoding', b'').lower() == b'chunked':
+            try:
+                chunked_body = await self._read_chunked_body(reader)
+            except ValueError:
+                await self._send_error(writer, HTTPStatus.BAD_REQUEST)
+                return False
+            if chunked_body is None:
+                await self._send_error(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+                return False
+            body = chunked_body
+        elif b'content-length' in header_dict:
+            try:
+                content_length = int(header_dict[b'content-length'])
+            except ValueError:
+                await self._send_error(writer, HTTPStatus.BAD_REQUEST)
+                return False
+            if content_length > MAX_REQUEST_BODY:
+                await self._send_error(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+                return False
+            if content_length > 0:
+                body = await reader.readexactly(content_length)
+
+        path, _, query = target.partition('?')
+        peer = writer.get_extra_info('peername')
+        sock = writer.get_extra_info('sockname')
+        scope: Dict[str, Any] = {
+            'type': 'http',
+            'asgi': {'version': '3.0', 'spec_version': '2.3'},
+            'http_version': http_version,
+            'method': method,
+            'scheme': 'http',
+            'path': unquote(path),
+            'raw_path': path.encode('latin-1'),
+            'query_string': query.encode('latin-1'),
+            'root_path': '',
+            'headers': headers,
+            'client': (peer[0], peer[1]) if peer else None,
+            'server': (sock[0], sock[1]) if sock else None,
+        }
+
+        assert self._slots is not None
+        if self._slots.locked() and self._waiting >= self.max_queue:
+            LOG.warning('WebUI request queue is full (%d workers, %d queued), rejecting request from %s',
+                        self.workers, self.max_queue, scope['client'][0] if scope['client'] else '-')
+            await self._send_error(writer, HTTPStatus.SERVICE_UNAVAILABLE)
+            return False
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+
+        state: Dict[str, Any] = {'slot': True, 'started': False, 'complete': False, 'chunked': False, 'status': 0, 'size': 0}
+        disconnected: asyncio.Future = asyncio.get_running_loop().create_future()
+        request_sent = False
+
+        def release_slot() -> None:
+            if state['slot']:
+                state['slot'] = False
+                assert self._slots is not None
+                self._slots.release()
+
+        async def watch_client() -> None:
+            # The request is read completely, so the client only sends again when it goes away (EOF or reset) or
+            # pipelines its next request. A byte of that request is handed back to the connection loop.
+            try:
+                data = await reader.read(1)
+            except ConnectionError:
+                data = b''
+            if data:
+                read_ahead.extend(data)
+            elif not disconnected.done():
+                disconnected.set_result(None)
+
+        async def receive() -> Dict[str, Any]:
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            await disconnected
+            return {'type': 'http.disconnect'}
+
+        async def send(message: Dict[str, Any]) -> None:
+            nonlocal keep_alive
+            if disconnected.done():
+                raise _ClientDisconnected()
+            try:
+                if message['type'] == 'http.response.start':
+                    state['started'] = True
+                    state['status'] = message['status']
+                    response_headers = list(message.get('headers', []))
+                    names = {name.lower() for name, _ in response_headers}
+                    if b'content-length' not in names and method != 'HEAD':
+                        if http_version == '1.1':
+                            state['chunked'] = True
+                            response_headers.append((b'Transfer-Encoding', b'chunked'))
+                        else:
+                            keep_alive = False
+                    if not keep_alive:
+                        response_headers.append((b'Connection', b'close'))
+                    if b'date' not in names:
+                        response_headers.append((b'Date', formatdate(usegmt=True).encode('latin-1')))
+                    status_line = f'HTTP/1.1 {state["status"]} {_reason(state["status"])}\r\n'.encode('latin-1')
+                    writer.write(status_line + b''.join(name + b': ' + value + b'\r\n' for name, value in response_headers) + b'\r\n')
+                    await writer.drain()
+                    release_slot()
+                elif message['type'] == 'http.response.body':
+                    chunk = message.get('body', b'')
+                    more_body = message.get('more_body', False)
+                    if method != 'HEAD':
+                        state['size'] += len(chunk)
+                        if state['chunked']:
+                            if chunk:
+                                writer.write(b'%x\r\n' % len(chunk) + chunk + b'\r\n')
+                            if not more_body:
+                                writer.write(b'0\r\n\r\n')
+                        elif chunk:
+                            writer.write(chunk)
+                        await writer.drain()
+                    if not more_body:
+                        state['complete'] = True
+                        if not disconnected.done():
+                            disconnected.set_result(None)
+            except ConnectionError as err:
+                if not disconnected.done():
+                    disconnected.set_result(None)
+                raise _ClientDisconnected() from err
+
+        watcher = asyncio.ensure_future(watch_client())
+        try:
+            await self.application(scope, receive, send)
+        except _ClientDisconnected:
+            keep_alive = False
+        except Exception:  # pylint: disable=broad-exception-caught
+            LOG.exception('Error while serving %s %s', method, path)
+            keep_alive = False
+            if not state['started']:
+                await self._send_error(writer, HTTPStatus.INTERNAL_SERVER_ERROR)
+        finally:
+            release_slot()
+            if not disconnected.done():
+                disconnected.set_result(None)
+            # The next request is read by the connection loop, the watcher must not wait for it as well
+            watcher.cancel()
+            await asyncio.wait([watcher])
+
+        ACCESS_LOG.info('"%s %s HTTP/%s" %d %d', method, target, http_version, state['status'], state['size'])
+        return keep_alive and state['complete']
+
+    async def _read_chunked_body(self, reader: asyncio.StreamReader) -> Optional[bytes]:
+        """
+        Read a body with chunked transfer encoding.
+
+        Returns:
+            Optional[bytes]: The body, None if it is larger than MAX_REQUEST_BODY.
+
+        Raises:
+            ValueError: If a chunk size is not a hex number or a line is longer than the stream limit.
+        """
+        chunks: List[bytes] = []
+        size = 0
+        while True:
+            chunk_size = int((await reader.readline()).split(b';', 1)[0].strip() or b'0', 16)
+            if chunk_size < 0:
+                raise ValueError(f'Invalid chunk size {chunk_size}')
+            if chunk_size == 0:
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            size += chunk_size
+            if size > MAX_REQUEST_BODY:
+                return None
+            chunks.append(await reader.readexactly(chunk_size))
+            await reader.readline()
+
+    async def _send_error(self, writer: asyncio.StreamWriter, status: HTTPStatus) -> None:
+        body = f'{status.value} {status.phrase}\n'.encode('latin-1')
+        writer.write(f'HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: text/plain\r\nContent-Length: {len(body)}\r\n'
+                     'Connection: close\r\n\r\n'.encode('latin-1') + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+def _reason(status: int) -> str:
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        return ''
+
+
+def make_server(mode: str, host: str, port: int, application: Any, workers: int = 8, max_queue: int = 32,  # pylint: disable=too-many-arguments
+                keep_alive: bool = True, keep_alive_timeout: float = 15.0) -> Union[simple_server.WSGIServer, AsyncHTTPServer]:
+    """
+    Create the HTTP server for the selected mode.
+
+    Args:
+        mode (str): One of SERVER_MODES, 'simple' is the single threaded wsgiref server.
+        host (str): Host to listen on.
+        port (int): Port to listen on.
+        application: The WSGI application to serve, or the ASGI application for the 'asgi' mode.
+        workers (int): Worker threads (concurrently dispatched requests for 'asgi').
+        max_queue (int): Queued connections (queued requests for 'asgi').
+        keep_alive (bool): Keep HTTP/1.1 connections open.
+        keep_alive_timeout (float): Idle timeout of keep-alive connections in seconds.
+
+    Returns:
+        Union[simple_server.WSGIServer, AsyncHTTPServer]: The server, ready for serve_forever().
+    """
+    if mode == 'simple':
+        return simple_server.make_server(host, port, application, server_class=simple_server.WSGIServer)
+    if mode == 'pooled':
+        server = PooledWSGIServer((host, port), workers=workers, max_queue=max_queue, keep_alive=keep_alive,
+                                  keep_alive_timeout=keep_alive_timeout, ipv6=':' in host)
+        server.set_app(application)
+        return server
+    if mode == 'asgi':
+        return AsyncHTTPServer((host, port), application, workers=workers, max_queue=max_queue, keep_alive=keep_alive,
+                               keep_alive_timeout=keep_alive_timeout)
+    raise ValueError(f'Unknown server mode {mode}')
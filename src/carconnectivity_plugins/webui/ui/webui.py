@@ -31,13 +31,14 @@ from carconnectivity.objects import GenericObject
 from carconnectivity_connectors.base.ui.connector_ui import BaseConnectorUI
 
 from carconnectivity_plugins.base.ui.plugin_ui import BasePluginUI
+from carconnectivity_plugins.webui.ansi import ansi_to_html
 from carconnectivity_plugins.webui.ui.cache import cache
 from carconnectivity_plugins.webui.ui.plugins import bp_plugins
 from carconnectivity_plugins.webui.ui.connectors import bp_connectors
 from carconnectivity_plugins.webui.ui.garage import blueprint as bp_garage
 
 if TYPE_CHECKING:
-    from typing import Dict, Optional, Literal
+    from typing import Dict, List, Optional, Literal, Tuple
     from types import ModuleType
 
     from carconnectivity.carconnectivity import CarConnectivity
@@ -122,6 +123,8 @@ class WebUI:  # pylint: disable=too-few-public-methods
 
         self.plugin_uis: Dict[str, BasePluginUI] = {}
         self.connector_uis: Dict[str, BaseConnectorUI] = {}
+        # The navbar with the key it was built for, see inject_dict_for_all_templates()
+        self.navbar: Optional[Tuple[Tuple, List[Dict]]] = None
 
         @self.app.context_processor
         def utility_processor() -> Dict:  # pylint: disable=too-many-statements
@@ -179,32 +182,25 @@ class WebUI:  # pylint: disable=too-few-public-methods
                 return str(element)
 
             def ansi2html(ansi_str: str) -> str:
-                ansi_str = markupsafe.escape(ansi_str)
-                ansi_str = ansi_str.replace('\033[30m', markupsafe.Markup('<span style="color:black;">'))
-                ansi_str = ansi_str.replace('\033[31m', markupsafe.Markup('<span style="color:red;">'))
-                ansi_str = ansi_str.replace('\033[32m', markupsafe.Markup('<span style="color:green;">'))
-                ansi_str = ansi_str.replace('\033[33m', markupsafe.Markup('<span style="color:yellow;">'))
-                ansi_str = ansi_str.replace('\033[34m', markupsafe.Markup('<span style="color:blue;">'))
-                ansi_str = ansi_str.replace('\033[35m', markupsafe.Markup('<span style="color:magenta;">'))
-                ansi_str = ansi_str.replace('\033[36m', markupsafe.Markup('<span style="color:cyan;">'))
-                ansi_str = ansi_str.replace('\033[37m', markupsafe.Markup('<span style="color:white;">'))
-                ansi_str = ansi_str.replace('\033[90m', markupsafe.Markup('<span style="color:black;">'))
-                ansi_str = ansi_str.replace('\033[91m', markupsafe.Markup('<span style="color:red;">'))
-                ansi_str = ansi_str.replace('\033[92m', markupsafe.Markup('<span style="color:green;">'))
-                ansi_str = ansi_str.replace('\033[93m', markupsafe.Markup('<span style="color:yellow;">'))
-                ansi_str = ansi_str.replace('\033[94m', markupsafe.Markup('<span style="color:blue;">'))
-                ansi_str = ansi_str.replace('\033[95m', markupsafe.Markup('<span style="color:magenta;">'))
-                ansi_str = ansi_str.replace('\033[96m', markupsafe.Markup('<span style="color:cyan;">'))
-                ansi_str = ansi_str.replace('\033[97m', markupsafe.Markup('<span style="color:white;">'))
-                ansi_str = ansi_str.replace('\033[0m', markupsafe.Markup('</span>'))
-                return ansi_str
+                return markupsafe.Markup(ansi_to_html(str(ansi_str)))
 
             return {'format_cc_element': format_cc_element, 'ansi2html': ansi2html, 'timedelta': timedelta, 'hasattr': hasattr}
 
         @self.app.context_processor
         def inject_dict_for_all_templates() -> Dict:
             """ Build the navbar and pass this to Jinja for every route
+
+            The connector and plugin UIs are fixed once they are loaded, so the navbar is built once
+            and only rebuilt when they (or the script root the URLs are relative to) change.
             """
+            connector_uis: Optional[Dict] = flask.current_app.extensions.get('carconnectivity_connector_uis')
+            plugin_uis: Optional[Dict] = flask.current_app.extensions.get('carconnectivity_plugin_uis')
+            key: Tuple = (flask.request.script_root if flask.has_request_context() else '',
+                          tuple(connector_uis) if connector_uis is not None else None,
+                          tuple(plugin_uis) if plugin_uis is not None else None)
+            navbar = self.navbar
+            if navbar is not None and navbar[0] == key:
+                return {'navbar': navbar[1]}
             plugins_sublinks = []
             connectors_sublinks = []
             # Build the Navigation Bar
@@ -222,8 +218,7 @@ class WebUI:  # pylint: disable=too-few-public-methods
                 },
                 {"text": "Log", "url": flask.url_for('log')},
             ]
-            if 'carconnectivity_connector_uis' in flask.current_app.extensions and flask.current_app.extensions['carconnectivity_connector_uis'] is not None:
-                connector_uis: Dict = flask.current_app.extensions['carconnectivity_connector_uis']
+            if connector_uis is not None:
                 connectors_sublinks.append({"text": "Status", "url": flask.url_for('connectors.status')})
                 connectors_sublinks.append({"divider": True})
                 for connector_ui in connector_uis.values():
@@ -235,8 +230,7 @@ class WebUI:  # pylint: disable=too-few-public-methods
                         }
                     ]
                     connectors_sublinks.extend(connector_nav)
-            if 'carconnectivity_plugin_uis' in flask.current_app.extensions and flask.current_app.extensions['carconnectivity_plugin_uis'] is not None:
-                plugin_uis: Dict = flask.current_app.extensions['carconnectivity_plugin_uis']
+            if plugin_uis is not None:
                 plugins_sublinks.append({"text": "Status", "url": flask.url_for('plugins.status')})
                 plugins_sublinks.append({"divider": True})
                 for plugin_ui in plugin_uis.values():
@@ -248,6 +242,7 @@ class WebUI:  # pylint: disable=too-few-public-methods
                         }
                     ]
                     plugins_sublinks.extend(plugin_nav)
+            self.navbar = (key, nav)
             return {'navbar': nav}
 
         @self.app.before_request
@@ -0,0 +1,57 @@
+"""
+Micro-benchmark of the ANSI to HTML conversion used by the log views.
+
+Compares the single pass converter with the previous chain of str.replace() calls on a
+synthetic log of 10k colored records. Run with: python test/benchmark/ansi2html_benchmark.py
+"""
+import random
+import timeit
+from html import escape
+
+from carconnectivity_plugins.webui.ansi import ansi_to_html
+
+RECORDS = 10000
+REPEAT = 5
+
+LEGACY_REPLACEMENTS = [(f'\033[{code}m', f'<span style="color:{color};">')
+                       for offset in (30, 90)
+                       for code, color in enumerate(('black', 'red', 'green', 'yellow', 'blue', 'magenta', 'cyan', 'white'), start=offset)]
+LEGACY_REPLACEMENTS.append(('\033[0m', '</span>'))
+
+
+def legacy_ansi2html(ansi_str: str) -> str:
+    """The converter before the single pass implementation (17 str.replace() passes)."""
+    ansi_str = escape(ansi_str)
+    for sequence, html in LEGACY_REPLACEMENTS:
+        ansi_str = ansi_str.replace(sequence, html)
+    return ansi_str
+
+
+TRACEBACK = ''.join(f'\n  File "/usr/lib/python3/site-packages/carconnectivity/module{frame}.py", line {frame * 17}, in function_{frame}\n'
+                    f'    result = self._call(<argument {frame}>, "value")' for frame in range(20))
+
+
+def make_log(count: int, traceback_every: int = 0) -> list:
+    """Records as produced by a colored log formatter, some with combined and 256 color codes."""
+    rng = random.Random(42)
+    levels = [('\033[32m', 'INFO'), ('\033[33m', 'WARNING'), ('\033[31m', 'ERROR'), ('\033[1;31m', 'CRITICAL'), ('\033[38;5;244m', 'DEBUG')]
+    records = []
+    for index in range(count):
+        color, level = rng.choice(levels)
+        records.append(f'2026-01-01 12:00:{index % 60:02d},000:{color}{level}\033[0m:carconnectivity.connectors.example:'
+                       f'Received <{rng.randint(0, 999)}> values for vehicle "TESTVIN{index % 3}" & updated {rng.randint(1, 50)} attributes'
+                       + (TRACEBACK if traceback_every and index % traceback_every == 0 else ''))
+    return records
+
+
+def main() -> None:
+    """Run the benchmark and print the timings."""
+    for title, records in (('Single line records', make_log(RECORDS)), ('Every 10th record with a traceback', make_log(RECORDS, 10))):
+        print(f'{title} ({sum(len(record) for record in records) // 1024} KiB):')
+        for name, function in (('str.replace chain', legacy_ansi2html), ('single pass', ansi_to_html)):
+            best = min(timeit.repeat(lambda function=function: [function(record) for record in records], number=1, repeat=REPEAT))
+            print(f'{name:>20}: {best * 1000:8.1f} ms for {RECORDS} records ({best / RECORDS * 1e6:.2f} us/record)')
+
+
+if __name__ == '__main__':
+    main()
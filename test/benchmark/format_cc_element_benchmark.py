@@ -0,0 +1,186 @@
+"""
+Micro-benchmark of the format_cc_element filter on a fully populated vehicle.
+
+Renders every child of every section the way garage/vehicle.html does, with the previous uncached
+implementation, with a cold render cache and with a warm one (repeat page view, nothing changed).
+Run with: python test/benchmark/format_cc_element_benchmark.py
+"""
+import timeit
+from datetime import datetime, timezone
+from decimal import Decimal
+from enum import Enum
+
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from carconnectivity.attributes import GenericAttribute, FloatAttribute, BooleanAttribute
+from carconnectivity.doors import Doors
+from carconnectivity.drive import ElectricDrive
+from carconnectivity.garage import Garage
+from carconnectivity.objects import GenericObject
+from carconnectivity.vehicle import ElectricVehicle
+from carconnectivity.windows import Windows
+
+from carconnectivity_plugins.webui.django_app.cache import get_change_versions
+from carconnectivity_plugins.webui.django_app.formatting import get_element_renderer
+from carconnectivity_plugins.webui.django_app.templatetags.carconnectivity_filters import format_cc_element
+
+REPEAT = 20
+CAPABILITIES = 40
+
+
+def legacy_format_cc_element(element, alt_title=None, with_tooltip=True, linebreak=False):  # pylint: disable=too-many-branches
+    """The filter before the render cache, formatting every element on every call."""
+    if isinstance(element, GenericAttribute):
+        if not element.enabled:
+            return ''
+        return_str = escape(alt_title) if alt_title is not None else escape(element.name)
+        if len(return_str) > 0:
+            return_str += ': '
+        unit = None
+        if isinstance(element.value, Enum):
+            value = str(element.value.value)
+            if '.' in value:
+                value = value.split('.')[-1]
+            value = value.replace('_', ' ').title()
+        elif isinstance(element, FloatAttribute):
+            value, unit = element.in_locale(locale=None)
+            if value is not None and element.precision is not None:
+                precision_digits = 0
+                precision_tmp = element.precision
+                while precision_tmp < 1:
+                    precision_digits += 1
+                    precision_tmp *= 10
+                value = f'{round(value, precision_digits):.{precision_digits}f}'
+            elif value is not None:
+                value = f'{Decimal(value):n}'
+        else:
+            value, unit = element.in_locale(locale=None)
+        return_str += escape(str(value))
+        if unit is not None:
+            return_str += escape(str(unit))
+        if linebreak:
+            return_str += '<br>'
+        return mark_safe(return_str)
+    if isinstance(element, GenericObject):
+        if not element.enabled:
+            return ''
+        if element.id == 'capabilities' or 'capabilities' in str(type(element)).lower():
+            badges = []
+            for child in element.children:
+                if child.enabled:
+                    child_id = escape(child.id).replace('_', ' ').title()
+                    status_class = 'badge-success' if 'status' in str(child).lower() and 'true' in str(child).lower() else 'badge-primary'
+                    badges.append(f'<span class="badge {status_class}" style="margin: 2px; display: inline-block;">{child_id}</span>')
+            return mark_safe('<div style="display: flex; flex-wrap: wrap; gap: 4px;">' + ''.join(badges) + '</div>')
+        if len(element.children) > 0 and any(hasattr(child, 'value') for child in element.children):
+            items = []
+            for child in element.children:
+                if child.enabled and hasattr(child, 'value'):
+                    key = escape(child.id).replace('_', ' ').title()
+                    if isinstance(child.value, Enum):
+                        value = str(child.value.value)
+                        if '.' in value:
+                            value = value.split('.')[-1]
+                        value = escape(value.replace('_', ' ').title())
+                    elif isinstance(child.value, float):
+                        value = f'{child.value:.1f}'
+                    else:
+                        value = escape(str(child.value))
+                    unit = ''
+                    if hasattr(child, 'unit') and child.unit:
+                        unit = escape(str(child.unit))
+                    items.append(f'<div style="margin-bottom: 8px;"><span style="color: var(--color-text-secondary); font-size: var(--font-size-sm);">'
+                                 f'{key}:</span> <span style="color: var(--color-text-primary); font-weight: var(--font-weight-medium);">'
+                                 f'{value}{unit}</span></div>')
+            if items:
+                return mark_safe('<div style="display: grid; grid-template-columns: repeat(auto-fill, minmax(200px, 1fr)); gap: var(--space-sm);">'
+                                 + ''.join(items) + '</div>')
+        return_str = ''
+        for child in element.children:
+            if child.enabled:
+                return_str += legacy_format_cc_element(child, child.id, with_tooltip, linebreak)
+        if linebreak:
+            return_str += '<br>'
+        return mark_safe(return_str)
+    return str(element)
+
+
+def _attributes(element):
+    for child in element.children:
+        if isinstance(child, GenericAttribute):
+            yield child
+        else:
+            yield from _attributes(child)
+
+
+def make_vehicle() -> ElectricVehicle:
+    """Vehicle where every attribute has a value, plus doors, windows, a drive and capabilities."""
+    # Object tree without a CarConnectivity instance, which would need network access for its NTP check
+    root = GenericObject(object_id='', parent=None)
+    garage = Garage(parent=root)
+    vehicle = ElectricVehicle(vin='BENCHVIN1', garage=garage)
+    garage.add_vehicle('BENCHVIN1', vehicle)
+    drive = ElectricDrive(drive_id='primary', drives=vehicle.drives)
+    vehicle.drives.drives['primary'] = drive
+    for door_id in ('front_left', 'front_right', 'rear_left', 'rear_right', 'trunk', 'bonnet'):
+        vehicle.doors.doors[door_id] = Doors.Door(door_id=door_id, doors=vehicle.doors)
+    for window_id in ('front_left', 'front_right', 'rear_left', 'rear_right', 'sunroof'):
+        vehicle.windows.windows[window_id] = Windows.Window(window_id=window_id, windows=vehicle.windows)
+    capabilities = GenericObject(object_id='capabilities', parent=vehicle)
+    for index in range(CAPABILITIES):
+        capability = GenericObject(object_id=f'capability_{index}', parent=capabilities)
+        BooleanAttribute(name='status', parent=capability, value=index % 2 == 0)
+        BooleanAttribute(name='user_disabling_allowed', parent=capability, value=False)
+    now = datetime.now(tz=timezone.utc)
+    for index, attribute in enumerate(_attributes(vehicle)):
+        value_type = attribute.value_type
+        if isinstance(value_type, type) and issubclass(value_type, Enum):
+            value = list(value_type)[index % len(value_type)]
+        elif value_type is bool:
+            value = index % 2 == 0
+        elif value_type is float:
+            value = index * 3.14159
+        elif value_type is int:
+            value = index
+        elif value_type is datetime:
+            value = now
+        else:
+            value = f'Value <{index}> & more'
+        attribute._set_value(value, measured=now)  # pylint: disable=protected-access
+    return vehicle
+
+
+def render_page(vehicle, function) -> int:
+    """Render the value cells of garage/vehicle.html, returns the size of the output."""
+    size = 0
+    for child in vehicle.children:
+        if child.enabled:
+            size += len(function(child, ''))
+            if isinstance(child, GenericObject):
+                for grandchild in child.children:
+                    if grandchild.enabled:
+                        size += len(function(grandchild, ''))
+    return size
+
+
+def main() -> None:
+    """Run the benchmark and print the timings."""
+    vehicle = make_vehicle()
+    get_change_versions().attach(vehicle.parent.parent)
+    print(f'Vehicle with {sum(1 for _ in _attributes(vehicle))} attributes:')
+    assert render_page(vehicle, legacy_format_cc_element) == render_page(vehicle, format_cc_element)
+
+    def cold() -> None:
+        get_element_renderer().clear()
+        render_page(vehicle, format_cc_element)
+
+    for name, function in (('uncached', lambda: render_page(vehicle, legacy_format_cc_element)),
+                           ('cold cache', cold),
+                           ('warm cache', lambda: render_page(vehicle, format_cc_element))):
+        best = min(timeit.repeat(function, number=1, repeat=REPEAT))
+        print(f'{name:>12}: {best * 1000:8.2f} ms per page view')
+
+
+if __name__ == '__main__':
+    main()
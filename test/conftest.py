@@ -0,0 +1,65 @@
+"""Shared fixtures of the unit tests: Django settings of the WebUI and an offline CarConnectivity with one vehicle."""
+import os
+
+import django
+import pytest
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carconnectivity_plugins.webui.django_app.settings')
+django.setup()
+
+VIN = 'TESTVIN1'
+
+
+@pytest.fixture
+def car_connectivity(monkeypatch):
+    """CarConnectivity without connectors and plugins holding an electric vehicle, notifications are delivered immediately."""
+    # pylint: disable=import-outside-toplevel
+    import carconnectivity.carconnectivity
+    from carconnectivity.vehicle import ElectricVehicle
+
+    # The NTP check at startup needs network access
+    monkeypatch.setattr(carconnectivity.carconnectivity, 'ntp_time_delta', lambda: None)
+    car_connectivity = carconnectivity.carconnectivity.CarConnectivity(config={'carConnectivity': {'log_level': 'info', 'connectors': [],
+                                                                                                   'plugins': []}})
+    vehicle = ElectricVehicle(vin=VIN, garage=car_connectivity.garage)
+    car_connectivity.garage.add_vehicle(VIN, vehicle)
+    vehicle.name._set_value('Test car')  # pylint: disable=protected-access
+    vehicle.odometer._set_value(1234.5)  # pylint: disable=protected-access
+    car_connectivity.delay_notifications = False
+    return car_connectivity
+
+
+@pytest.fixture
+def vehicle(car_connectivity):
+    """The vehicle in the garage of car_connectivity."""
+    return car_connectivity.garage.get_vehicle(VIN)
+
+
+@pytest.fixture
+def client(car_connectivity):
+    """Django test client authenticated with HTTP Basic auth against a WebUI serving car_connectivity."""
+    # pylint: disable=import-outside-toplevel
+    import base64
+    from django.test import Client
+    from carconnectivity_plugins.webui.django_app import configure_from_plugin
+    from carconnectivity_plugins.webui.django_app.cache import get_change_versions, get_response_cache
+
+    configure_from_plugin({}, car_connectivity, {'admin': 'secret'})
+    get_response_cache().clear()
+    get_change_versions().attach(car_connectivity)
+    yield Client(HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'admin:secret').decode('ascii'))
+    get_change_versions().detach()
+    configure_from_plugin({}, None, {})
+
+
+@pytest.fixture
+def car_picture(vehicle):
+    """A red 40x20 car picture of the vehicle."""
+    # pylint: disable=import-outside-toplevel
+    from PIL import Image
+    from carconnectivity.attributes import ImageAttribute
+
+    picture = ImageAttribute('car_picture', parent=vehicle.images)
+    picture._set_value(Image.new('RGBA', (40, 20), (255, 0, 0, 255)))  # pylint: disable=protected-access
+    vehicle.images.images['car_picture'] = picture
+    return picture
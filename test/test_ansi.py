@@ -0,0 +1,60 @@
+"""Tests of the ANSI escape sequence to HTML conversion of log records."""
+import pytest
+
+from carconnectivity_plugins.webui import ansi
+from carconnectivity_plugins.webui.ansi import ansi_to_html
+
+
+def test_plain_text_is_escaped():
+    assert ansi_to_html('<a href="x">&</a>') == '&lt;a href=&quot;x&quot;&gt;&amp;&lt;/a&gt;'
+
+
+def test_color_and_reset():
+    assert ansi_to_html('\x1b[31mred\x1b[0m plain') == '<span style="color:red;">red</span> plain'
+
+
+def test_combined_codes():
+    assert ansi_to_html('\x1b[1;4;32;44mx') == \
+        '<span style="color:green;background-color:blue;font-weight:bold;text-decoration:underline;">x</span>'
+
+
+def test_span_is_closed_at_the_end():
+    assert ansi_to_html('\x1b[33mwarning') == '<span style="color:yellow;">warning</span>'
+
+
+def test_reset_without_color_is_ignored():
+    assert ansi_to_html('\x1b[0mplain\x1b[m') == 'plain'
+
+
+def test_changes_replace_the_span():
+    html = ansi_to_html('\x1b[31ma\x1b[1mb\x1b[22mc')
+    assert html == ('<span style="color:red;">a</span><span style="color:red;font-weight:bold;">b</span>'
+                    '<span style="color:red;">c</span>')
+    assert html.count('<span') == html.count('</span>')
+
+
+@pytest.mark.parametrize('sequence, color', [('38;5;1', 'red'), ('38;5;196', '#ff0000'), ('38;5;232', '#080808'),
+                                             ('38;2;1;2;300', '#0102ff'), ('38:2:1:2:3', '#010203')])
+def test_extended_colors(sequence, color):
+    assert ansi_to_html(f'\x1b[{sequence}mx') == f'<span style="color:{color};">x</span>'
+
+
+def test_other_control_sequences_are_dropped():
+    assert ansi_to_html('a\x1b[2Kb\x1b[1;1Hc') == 'abc'
+
+
+def test_same_result_from_remembered_transitions():
+    text = '\x1b[35mmagenta\x1b[0m and \x1b[36mcyan\x1b[0m'
+    assert ansi_to_html(text) == ansi_to_html(text)
+
+
+@pytest.mark.parametrize('sequence', ['?1', '?25', '1;?2'])
+def test_private_sequences_are_ignored(sequence):
+    assert ansi_to_html(f'\x1b[31ma\x1b[{sequence}mb') == '<span style="color:red;">ab</span>'
+
+
+def test_spans_stay_balanced_when_the_state_table_is_full(monkeypatch):
+    monkeypatch.setattr(ansi, '_MAX_STATES', len(ansi._STATES))  # pylint: disable=protected-access
+    html = ansi_to_html('\x1b[38;2;1;2;3ma\x1b[38;2;4;5;6mb\x1b[0mc')
+    assert html.count('<span') == html.count('</span>')
+    assert html.endswith('c')
@@ -0,0 +1,79 @@
+"""Tests of the static assets bundled, minified, hashed and pre-compressed in memory."""
+import gzip
+
+import pytest
+
+from carconnectivity_plugins.webui.django_app.assets import MANIFEST_NAME, Asset, AssetStore, get_asset_store, minify_css, \
+    negotiate_encoding
+
+
+@pytest.mark.parametrize('css, minified', [
+    ('a {\n  color: red;\n}\n', 'a{color:red}'),
+    ('/* comment */ a , b { margin: 0 auto ; }', 'a,b{margin:0 auto}'),
+    # A space before a colon may be a descendant combinator
+    ('a :hover { top: 0 }', 'a :hover{top:0}'),
+    ('a { width: calc(100% - 2px); }', 'a{width:calc(100% - 2px)}'),
+    ('a { content: "  /* kept */  "; }', 'a{content:"  /* kept */  "}'),
+    ("a::before { content: ' { } '; }", "a::before{content:' { } '}"),
+    # Only the semicolon closing a block is dropped, not one inside a string or comment
+    ('a { content: ";}" ; /* ;} */ }', 'a{content:";}"}'),
+    ('a{content:";}";}', 'a{content:";}"}'),
+    ('a { top: 0; /* x */ }', 'a{top:0}'),
+    ('@media (max-width: 10px) { a { top: 0; } }', '@media (max-width:10px){a{top:0}}'),
+])
+def test_minify_css(css, minified):
+    assert minify_css(css) == minified
+
+
+@pytest.fixture
+def store(tmp_path):
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'css' / 'site.css').write_text('body {\n  margin: 0;\n}\n' * 50)
+    (tmp_path / 'logo.png').write_bytes(b'\x89PNG' + bytes(500))
+    return AssetStore(str(tmp_path))
+
+
+def test_store_hashes_and_compresses(store):  # pylint: disable=redefined-outer-name
+    asset, immutable = store.find('css/site.css')
+    assert not immutable
+    assert asset.encodings['identity'] == b'body{margin:0}' * 50
+    assert store.hashed_name('css/site.css') == f'css/site.{asset.digest}.css'
+    assert store.find(asset.hashed_name) == (asset, True)
+    assert gzip.decompress(asset.encodings['gzip']) == asset.encodings['identity']
+    assert asset.content_type == 'text/css; charset=utf-8'
+    # Images are not compressed again
+    assert list(store.find('logo.png')[0].encodings) == ['identity']
+    assert set(store.manifest) == {'css/site.css', 'logo.png'}
+    assert store.find(MANIFEST_NAME) is not None
+    assert store.find('missing.css') is None
+    assert store.hashed_name('missing.css') == 'missing.css'
+
+
+def test_hash_follows_content(store, tmp_path):  # pylint: disable=redefined-outer-name
+    before = store.hashed_name('css/site.css')
+    (tmp_path / 'css' / 'site.css').write_text('body { margin: 1px; }')
+    store.build()
+    assert store.hashed_name('css/site.css') != before
+
+
+def test_negotiate_encoding():
+    asset = Asset('a.js', b'x' * 1000)
+    assert negotiate_encoding('', asset) == 'identity'
+    assert negotiate_encoding('gzip, deflate', asset) == 'gzip'
+    assert negotiate_encoding('gzip;q=0', asset) == 'identity'
+    assert negotiate_encoding('*', asset) in asset.encodings
+    assert negotiate_encoding('identity', Asset('a.js', b'x')) == 'identity'
+
+
+def test_static_view(client):
+    asset, _ = get_asset_store().find('css/bundle.css')
+    hashed = client.get(f'/static/{asset.hashed_name}', HTTP_ACCEPT_ENCODING='gzip')
+    assert hashed.status_code == 200
+    assert hashed['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert hashed['Content-Encoding'] == 'gzip'
+    assert hashed['Vary'] == 'Accept-Encoding'
+    original = client.get('/static/css/bundle.css')
+    assert original['Cache-Control'] == 'public, no-cache'
+    assert original.content == asset.encodings['identity']
+    assert client.get('/static/css/bundle.css', HTTP_IF_NONE_MATCH=original['ETag']).status_code == 304
+    assert client.get('/static/missing.css').status_code == 404
@@ -0,0 +1,215 @@
+"""Tests of the change-versioned response cache and the change versions of the object tree."""
+import threading
+
+import pytest
+
+from carconnectivity.doors import Doors
+
+from carconnectivity_plugins.webui.django_app.cache import ChangeVersions, VersionedResponseCache
+
+from conftest import VIN
+
+
+class Compute:
+    """Counts how often a cached value was computed."""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def test_cache_hit_for_same_version():
+    cache = VersionedResponseCache()
+    first = Compute('first')
+    second = Compute('second')
+    assert cache.get_or_compute('key', 'v1', first) == 'first'
+    assert cache.get_or_compute('key', 'v1', second) == 'first'
+    assert first.calls == 1
+    assert second.calls == 0
+
+
+def test_cache_new_version_invalidates():
+    cache = VersionedResponseCache()
+    cache.get_or_compute('key', 'v1', Compute('old'))
+    assert cache.get_or_compute('key', 'v2', Compute('new')) == 'new'
+    # Only the newest version is kept, the old one is recomputed as well
+    assert cache.get_or_compute('key', 'v1', Compute('old again')) == 'old again'
+
+
+def test_cache_without_version_does_not_cache():
+    cache = VersionedResponseCache()
+    cache.get_or_compute('key', None, Compute('first'))
+    assert cache.get_or_compute('key', None, Compute('second')) == 'second'
+
+
+def test_cache_evicts_least_recently_used():
+    cache = VersionedResponseCache(max_entries=2)
+    cache.get_or_compute('a', 'v1', Compute('a'))
+    cache.get_or_compute('b', 'v1', Compute('b'))
+    cache.get_or_compute('a', 'v1', Compute('a'))
+    cache.get_or_compute('c', 'v1', Compute('c'))
+    assert cache.get_or_compute('a', 'v1', Compute('recomputed')) == 'a'
+    assert cache.get_or_compute('b', 'v1', Compute('recomputed')) == 'recomputed'
+
+
+def test_cache_failure_is_not_cached():
+    cache = VersionedResponseCache()
+
+    def fail():
+        raise RuntimeError('failed')
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute('key', 'v1', fail)
+    assert cache.get_or_compute('key', 'v1', Compute('value')) == 'value'
+
+
+def test_cache_stats():
+    cache = VersionedResponseCache(max_entries=1)
+    cache.get_or_compute('a', 'v1', Compute('a'))
+    cache.get_or_compute('a', 'v1', Compute('a'))
+    cache.get_or_compute('b', 'v1', Compute('b'))
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'evictions': 1, 'coalesced': 0, 'entries': 1}
+
+
+def test_cache_coalesces_concurrent_computations():
+    cache = VersionedResponseCache(coalesce=True)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'value'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute('key', 'v1', compute)))
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(cache.get_or_compute('key', 'v1', compute)))
+    follower.start()
+    while cache.coalesced == 0:
+        follower.join(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert results == ['value', 'value']
+    assert len(calls) == 1
+
+
+def test_cache_coalesced_failure_is_retried_by_waiters():
+    cache = VersionedResponseCache(coalesce=True)
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise RuntimeError('failed')
+
+    errors = []
+    results = []
+
+    def lead():
+        try:
+            cache.get_or_compute('key', 'v1', fail)
+        except RuntimeError as err:
+            errors.append(err)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(cache.get_or_compute('key', 'v1', lambda: 'own value')))
+    follower.start()
+    while cache.coalesced == 0:
+        follower.join(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert len(errors) == 1
+    # The waiter does not get the failure of the leader but computes on its own
+    assert results == ['own value']
+
+
+def test_versions_only_while_attached(car_connectivity):
+    versions = ChangeVersions()
+    assert versions.root_version() is None
+    assert versions.vehicle_version(VIN) is None
+    versions.attach(car_connectivity)
+    assert versions.root_version() is not None
+    versions.detach()
+    assert versions.garage_version() is None
+
+
+def test_versions_reattach_starts_new_epoch(car_connectivity):
+    versions = ChangeVersions()
+    versions.attach(car_connectivity)
+    before = versions.vehicle_version(VIN)
+    versions.detach()
+    versions.attach(car_connectivity)
+    assert versions.vehicle_version(VIN) != before
+    versions.detach()
+
+
+def test_versions_follow_changes(car_connectivity, vehicle):
+    versions = ChangeVersions()
+    versions.attach(car_connectivity)
+    vehicle_version = versions.vehicle_version(VIN)
+    other = versions.vehicle_version('OTHERVIN')
+    garage = versions.garage_version()
+    root = versions.root_version()
+
+    vehicle.odometer._set_value(2000.0)  # pylint: disable=protected-access
+
+    assert versions.vehicle_version(VIN) != vehicle_version
+    assert versions.garage_version() != garage
+    assert versions.root_version() != root
+    assert versions.vehicle_version('OTHERVIN') == other
+    versions.detach()
+
+
+def test_vehicle_json_is_served_from_cache_until_a_change(client, vehicle):
+    first = client.get(f'/garage/{VIN}/json')
+    assert first.status_code == 200
+    assert b'1234.5' in first.content
+    assert client.get(f'/garage/{VIN}/json').content == first.content
+
+    vehicle.odometer._set_value(2000.0)  # pylint: disable=protected-access
+
+    changed = client.get(f'/garage/{VIN}/json')
+    assert b'2000.0' in changed.content
+    assert changed['ETag'] != first['ETag']
+
+
+def test_scope_version_follows_its_section(car_connectivity, vehicle):
+    versions = ChangeVersions()
+    versions.attach(car_connectivity)
+    doors = versions.scope_version(f'/garage/{VIN}/doors/lock_state')
+    odometer = versions.scope_version(f'/garage/{VIN}/odometer')
+    vehicle_version = versions.scope_version(f'/garage/{VIN}')
+    garage = versions.scope_version('/garage')
+    root = versions.scope_version('/')
+
+    vehicle.doors.lock_state._set_value(Doors.LockState.LOCKED)  # pylint: disable=protected-access
+
+    # Every path below the section shares its version
+    assert versions.scope_version(f'/garage/{VIN}/doors/lock_state') == versions.scope_version(f'/garage/{VIN}/doors')
+    assert versions.scope_version(f'/garage/{VIN}/doors') != doors
+    assert versions.scope_version(f'/garage/{VIN}/odometer') == odometer
+    assert versions.scope_version(f'/garage/{VIN}') != vehicle_version
+    assert versions.scope_version('/garage') != garage
+    assert versions.scope_version('/') != root
+
+
+def test_scope_version_of_other_vehicle_is_unchanged(car_connectivity, vehicle):
+    versions = ChangeVersions()
+    versions.attach(car_connectivity)
+    other = versions.scope_version('/garage/OTHERVIN/doors')
+    vehicle.odometer._set_value(2000.0)  # pylint: disable=protected-access
+    assert versions.scope_version('/garage/OTHERVIN/doors') == other
+    assert versions.vehicle_version('OTHERVIN') == versions.scope_version('/garage/OTHERVIN')
@@ -0,0 +1,82 @@
+"""Tests of the negotiated compression of responses."""
+import gzip
+
+import pytest
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory
+
+from carconnectivity_plugins.webui.django_app.compression import ResponseCompressor, accepted_encodings, choose_encoding, \
+    get_response_compressor
+
+from conftest import VIN
+
+BODY = b'{"value": 1234.5}' * 100
+
+
+def request(accept_encoding='gzip'):
+    return RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+
+
+def json_response(body=BODY):
+    response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = '"abc"'
+    return response
+
+
+def test_accepted_encodings():
+    assert accepted_encodings('gzip;q=0.5, br, identity;q=bad') == {'gzip': 0.5, 'br': 1.0, 'identity': 0.0}
+    assert accepted_encodings('') == {}
+
+
+def test_choose_encoding():
+    assert choose_encoding('gzip, deflate', ('br', 'gzip')) == 'gzip'
+    assert choose_encoding('br, gzip', ('br', 'gzip')) == 'br'
+    assert choose_encoding('*;q=0', ('br', 'gzip')) == 'identity'
+    assert choose_encoding('*', ('gzip',)) == 'gzip'
+    assert choose_encoding('deflate', ('gzip',)) == 'identity'
+
+
+def test_compresses_large_response():
+    response = ResponseCompressor().compress_response(request(), json_response())
+    assert response['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.content) == BODY
+    assert response['Content-Length'] == str(len(response.content))
+    assert response['Vary'] == 'Accept-Encoding'
+    # The ETag was for the uncompressed body
+    assert response['ETag'] == 'W/"abc"'
+
+
+@pytest.mark.parametrize('response', [json_response(b'{}'), HttpResponse(b'\x89PNG' * 1000, content_type='image/png'),
+                                      StreamingHttpResponse(iter([BODY]), content_type='text/event-stream')])
+def test_leaves_small_binary_and_streaming_responses(response):
+    assert not ResponseCompressor().compress_response(request(), response).has_header('Content-Encoding')
+
+
+def test_not_accepted_or_disabled():
+    response = ResponseCompressor().compress_response(request(''), json_response())
+    assert not response.has_header('Content-Encoding')
+    # The body still depends on what the client accepts
+    assert response['Vary'] == 'Accept-Encoding'
+    compressor = ResponseCompressor()
+    compressor.configure({'compression': False})
+    assert not compressor.compress_response(request(), json_response()).has_header('Content-Encoding')
+
+
+def test_versioned_json_compressed(client, vehicle):  # pylint: disable=unused-argument
+    compressor = get_response_compressor()
+    min_size = compressor.min_size
+    compressor.min_size = 10
+    try:
+        response = client.get(f'/garage/{VIN}/json', HTTP_ACCEPT_ENCODING='gzip')
+        assert response['Content-Encoding'] == 'gzip'
+        assert b'Test car' in gzip.decompress(response.content)
+        assert client.get(f'/garage/{VIN}/json', HTTP_ACCEPT_ENCODING='gzip').content == response.content
+    finally:
+        compressor.min_size = min_size
+
+
+def test_pages_compressed_by_middleware(client):
+    response = client.get('/garage/', HTTP_ACCEPT_ENCODING='gzip')
+    assert response['Content-Encoding'] == 'gzip'
+    assert b'Test car' in gzip.decompress(response.content)
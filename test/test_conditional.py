@@ -0,0 +1,44 @@
+"""Tests of the conditional requests answered with 304 by the JSON and image endpoints."""
+from datetime import datetime, timezone
+
+from PIL import Image
+
+from conftest import VIN
+
+
+def test_json_not_modified_for_current_etag(client):
+    first = client.get(f'/garage/{VIN}/json')
+    assert first['Cache-Control'] == 'private, no-cache'
+    not_modified = client.get(f'/garage/{VIN}/json', HTTP_IF_NONE_MATCH=first['ETag'])
+    assert not_modified.status_code == 304
+    assert not_modified.content == b''
+    assert not_modified['ETag'] == first['ETag']
+
+
+def test_json_modified_after_change(client, vehicle):
+    etag = client.get('/garage/json')['ETag']
+    vehicle.odometer._set_value(2000.0)  # pylint: disable=protected-access
+    response = client.get('/garage/json', HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert b'2000.0' in response.content
+
+
+def test_json_not_modified_since_last_update(client, vehicle):
+    first = client.get(f'/garage/{VIN}/json')
+    assert 'Last-Modified' in first
+    assert client.get(f'/garage/{VIN}/json', HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code == 304
+    # The update time is maintained by the observer, a newer measurement moves it
+    vehicle.odometer._set_value(2000.0, measured=datetime(2100, 1, 1, tzinfo=timezone.utc))  # pylint: disable=protected-access
+    response = client.get(f'/garage/{VIN}/json', HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+    assert response.status_code == 200
+    assert response['Last-Modified'] == 'Fri, 01 Jan 2100 00:00:00 GMT'
+
+
+def test_image_not_modified_until_picture_changes(client, car_picture):
+    first = client.get(f'/garage/{VIN}-car.png')
+    assert first.status_code == 200
+    assert first['Content-Type'] == 'image/png'
+    assert client.get(f'/garage/{VIN}-car.png', HTTP_IF_NONE_MATCH=first['ETag']).status_code == 304
+
+    car_picture._set_value(Image.new('RGBA', (40, 20), (0, 0, 255, 255)))  # pylint: disable=protected-access
+    assert client.get(f'/garage/{VIN}-car.png', HTTP_IF_NONE_MATCH=first['ETag']).status_code == 200
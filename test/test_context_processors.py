@@ -0,0 +1,33 @@
+"""Tests of the memoized navbar context."""
+from django.test import RequestFactory
+from django.urls import clear_script_prefix, set_script_prefix
+
+from carconnectivity_plugins.webui.django_app import configure_from_plugin
+from carconnectivity_plugins.webui.django_app.context_processors import navbar
+
+
+def test_navbar_built_once(car_connectivity):
+    configure_from_plugin({}, car_connectivity, {})
+    request = RequestFactory().get('/garage/')
+    first = navbar(request)['navbar']
+    assert first[0] == {'text': 'Garage', 'url': '/garage/'}
+    assert navbar(request)['navbar'] is first
+
+
+def test_navbar_rebuilt_for_other_prefix(car_connectivity):
+    configure_from_plugin({}, car_connectivity, {})
+    request = RequestFactory().get('/garage/')
+    first = navbar(request)['navbar']
+    set_script_prefix('/webui/')
+    try:
+        assert navbar(request)['navbar'][0]['url'] == '/webui/garage/'
+    finally:
+        clear_script_prefix()
+    assert navbar(request)['navbar'] is not first
+
+
+def test_navbar_rebuilt_for_other_instance(car_connectivity):
+    configure_from_plugin({}, car_connectivity, {})
+    first = navbar(RequestFactory().get('/'))['navbar']
+    configure_from_plugin({}, None, {})
+    assert navbar(RequestFactory().get('/'))['navbar'] is not first
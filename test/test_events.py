@@ -0,0 +1,273 @@
+"""Tests of the event broker behind the Server-Sent Events streams and its change journal (delta JSON API)."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from carconnectivity_plugins.webui.django_app.events import EventBroker, StreamBudget, get_event_broker, get_stream_budget
+
+from conftest import VIN
+
+
+@pytest.fixture
+def broker(car_connectivity):
+    broker = EventBroker(history=10, heartbeat=0.01)
+    broker.attach(car_connectivity)
+    yield broker
+    broker.detach()
+
+
+def set_odometer(vehicle, value):
+    vehicle.odometer._set_value(value)  # pylint: disable=protected-access
+
+
+def test_id_round_trip(broker):  # pylint: disable=redefined-outer-name
+    assert broker.parse_id(broker.format_id(42)) == 42
+    assert broker.parse_id(None) is None
+    assert broker.parse_id('') is None
+    assert broker.parse_id('deadbeef-42') is None
+    assert broker.parse_id(f'{broker.instance}-x') is None
+    assert broker.parse_id(f'{broker.instance}--1') is None
+
+
+def test_stream_sends_changes_of_its_subtree(broker, vehicle):  # pylint: disable=redefined-outer-name
+    stream = broker.stream(f'/garage/{VIN}/odometer', None)
+    assert f'id: {broker.format_id(broker.last_id)}\nevent: hello' in next(stream)
+    vehicle.name._set_value('Renamed')  # pylint: disable=protected-access
+    assert next(stream) == ': heartbeat\n\n'
+    set_odometer(vehicle, 2000.0)
+    chunk = next(stream)
+    assert f'id: {broker.format_id(broker.last_id)}\nevent: change\n' in chunk
+    assert f'"path":"/garage/{VIN}/odometer"' in chunk
+    assert '"val":2000.0' in chunk
+    stream.close()
+
+
+def test_stream_replays_missed_changes(broker, vehicle):  # pylint: disable=redefined-outer-name
+    last_event_id = broker.format_id(broker.last_id)
+    set_odometer(vehicle, 2000.0)
+    set_odometer(vehicle, 2001.0)
+    stream = broker.stream('/garage', last_event_id)
+    chunk = next(stream)
+    assert chunk.count('event: change') == 2
+    assert chunk.index('"val":2000.0') < chunk.index('"val":2001.0')
+    # Nothing is sent twice
+    assert next(stream) == ': heartbeat\n\n'
+    stream.close()
+
+
+@pytest.mark.parametrize('last_event_id', ['deadbeef-0', 'garbage'])
+def test_stream_resets_unknown_position(broker, last_event_id):  # pylint: disable=redefined-outer-name
+    stream = broker.stream('/garage', last_event_id)
+    assert 'event: reset' in next(stream)
+    stream.close()
+
+
+def test_stream_resets_when_history_is_exceeded(broker, vehicle):  # pylint: disable=redefined-outer-name
+    last_event_id = broker.format_id(broker.last_id)
+    for value in range(20):
+        set_odometer(vehicle, float(value))
+    stream = broker.stream('/garage', last_event_id)
+    assert 'event: reset' in next(stream)
+    stream.close()
+
+
+def test_slow_client_is_reset(car_connectivity, vehicle):
+    broker = EventBroker(max_pending=2, heartbeat=0.01)
+    broker.attach(car_connectivity)
+    stream = broker.stream('/garage', None)
+    next(stream)
+    for value in range(3):
+        set_odometer(vehicle, float(value))
+    # The pending events were dropped, the client reloads instead
+    chunk = next(stream)
+    assert 'event: reset' in chunk
+    assert 'event: change' not in chunk
+    set_odometer(vehicle, 10.0)
+    assert 'event: change' in next(stream)
+    stream.close()
+    broker.detach()
+
+
+def test_max_clients(broker):  # pylint: disable=redefined-outer-name
+    broker.max_clients = 1
+    first = broker.stream('/garage', None)
+    next(first)
+    assert broker.is_full()
+    second = broker.stream('/garage', None)
+    assert 'event: reset' in next(second)
+    # Closing a stream frees its place
+    first.close()
+    assert not broker.is_full()
+
+
+def test_detach_closes_streams(broker):  # pylint: disable=redefined-outer-name
+    stream = broker.stream('/garage', None)
+    next(stream)
+    broker.detach()
+    # The stream ends, at most with the chunk it was about to send
+    assert len(list(stream)) <= 1
+
+
+def test_delta_since_version(broker, vehicle):  # pylint: disable=redefined-outer-name
+    version = broker.format_id(broker.last_id)
+    vehicle.odometer._set_value(2000.0)  # pylint: disable=protected-access
+    vehicle.odometer._set_value(2001.0)  # pylint: disable=protected-access
+    vehicle.name._set_value('Renamed')  # pylint: disable=protected-access
+    changes, newest_id = broker.delta(version, '/garage')
+    assert newest_id == broker.last_id
+    # Changes of the same element collapse into its newest state, ordered by the newest change
+    assert list(changes) == [f'/garage/{VIN}/odometer', f'/garage/{VIN}/name']
+    assert changes[f'/garage/{VIN}/odometer']['val'] == 2001.0
+    assert 'html' not in changes[f'/garage/{VIN}/odometer']
+
+
+def test_delta_up_to_date(broker):  # pylint: disable=redefined-outer-name
+    assert broker.delta(broker.format_id(broker.last_id), '/garage') == ({}, broker.last_id)
+
+
+def test_delta_filters_by_prefix(broker, vehicle):  # pylint: disable=redefined-outer-name
+    version = broker.format_id(broker.last_id)
+    vehicle.odometer._set_value(2000.0)  # pylint: disable=protected-access
+    changes, _ = broker.delta(version, f'/garage/{VIN}/name')
+    assert not changes
+    # A prefix only matches whole path segments
+    changes, _ = broker.delta(version, f'/garage/{VIN}/odo')
+    assert not changes
+
+
+def test_delta_unknown_versions(broker, vehicle):  # pylint: disable=redefined-outer-name
+    version = broker.format_id(broker.last_id)
+    # Another run of the process
+    assert broker.delta('0' * len(broker.instance) + '-0', '/garage') is None
+    # Newer than anything observed
+    assert broker.delta(broker.format_id(broker.last_id + 1), '/garage') is None
+    # Dropped from the history
+    for value in range(20):
+        vehicle.odometer._set_value(float(value))  # pylint: disable=protected-access
+    assert broker.delta(version, '/garage') is None
+    assert broker.delta(broker.format_id(broker.last_id - 5), '/garage') is not None
+
+
+def test_delta_since_timestamp(broker, vehicle):  # pylint: disable=redefined-outer-name
+    since = datetime.now(tz=timezone.utc)
+    vehicle.odometer._set_value(2000.0)  # pylint: disable=protected-access
+    changes, _ = broker.delta(since.isoformat(), '/garage')
+    assert list(changes) == [f'/garage/{VIN}/odometer']
+    # Timestamps without a time zone are UTC
+    changes, _ = broker.delta(since.replace(tzinfo=None).isoformat(), '/garage')
+    assert list(changes) == [f'/garage/{VIN}/odometer']
+    changes, _ = broker.delta(datetime.now(tz=timezone.utc).isoformat(), '/garage')
+    assert not changes
+    # Before the broker was attached nothing is known
+    assert broker.delta((since - timedelta(hours=1)).isoformat(), '/garage') is None
+
+
+def test_delta_contains_updates_without_change(broker, vehicle):  # pylint: disable=redefined-outer-name
+    since = datetime.now(tz=timezone.utc)
+    version = broker.format_id(broker.last_id)
+    # Written again with the same value, only the timestamps move
+    set_odometer(vehicle, 1234.5)
+    for changes, _ in (broker.delta(since.isoformat(), '/garage'), broker.delta(version, '/garage')):
+        assert list(changes) == [f'/garage/{VIN}/odometer']
+        assert changes[f'/garage/{VIN}/odometer']['val'] == 1234.5
+        assert changes[f'/garage/{VIN}/odometer']['upd'] == vehicle.odometer.last_updated.isoformat()
+
+
+def test_updates_are_coalesced_per_element(broker, vehicle):  # pylint: disable=redefined-outer-name
+    version = broker.format_id(broker.last_id)
+    for _ in range(20):
+        set_odometer(vehicle, 1234.5)
+    vehicle.name._set_value('Renamed')  # pylint: disable=protected-access
+    # Only the newest update is kept, the history still reaches back to the version
+    changes, _ = broker.delta(version, '/garage')
+    assert list(changes) == [f'/garage/{VIN}/odometer', f'/garage/{VIN}/name']
+    # A change of the value supersedes the update
+    set_odometer(vehicle, 2000.0)
+    changes, _ = broker.delta(version, '/garage')
+    assert list(changes) == [f'/garage/{VIN}/name', f'/garage/{VIN}/odometer']
+    assert changes[f'/garage/{VIN}/odometer']['val'] == 2000.0
+
+
+def test_updates_are_not_streamed(broker, vehicle):  # pylint: disable=redefined-outer-name
+    last_event_id = broker.format_id(broker.last_id)
+    set_odometer(vehicle, 1234.5)
+    stream = broker.stream('/garage', last_event_id)
+    assert 'event: change' not in next(stream)
+    set_odometer(vehicle, 1234.5)
+    assert next(stream) == ': heartbeat\n\n'
+    stream.close()
+
+
+@pytest.mark.parametrize('since', ['garbage', '', '2024-13-01', '12345678-', 'abc-12'])
+def test_delta_malformed(broker, since):  # pylint: disable=redefined-outer-name
+    with pytest.raises(ValueError):
+        broker.delta(since, '/garage')
+
+
+def test_delta_detached(broker):  # pylint: disable=redefined-outer-name
+    version = broker.format_id(broker.last_id)
+    broker.detach()
+    assert broker.delta(version, '/garage') is None
+
+
+def test_delta_view(client, car_connectivity, vehicle):
+    broker = get_event_broker()
+    broker.attach(car_connectivity)
+    try:
+        full = client.get('/garage/json', {'since': ''}).json()
+        assert full['reset'] is True
+        assert VIN in full['data']
+        set_odometer(vehicle, 2000.0)
+        delta = client.get(f'/garage/{VIN}/json', {'since': full['version']}).json()
+        assert list(delta['changes']) == [f'/garage/{VIN}/odometer']
+        assert client.get(f'/garage/{VIN}/json', {'since': delta['version']}).json() == {'version': delta['version'], 'changes': {}}
+        assert client.get('/garage/json', {'since': 'garbage'}).status_code == 400
+    finally:
+        broker.detach()
+
+
+def test_budget_limits_all_brokers():
+    budget = StreamBudget(limit=2)
+    brokers = [EventBroker(budget=budget), EventBroker(budget=budget)]
+    first = brokers[0].subscribe('/garage')
+    second = brokers[1].subscribe('')
+    assert first is not None and second is not None
+    assert brokers[0].is_full() and brokers[1].is_full()
+    assert brokers[1].subscribe('') is None
+    brokers[0].unsubscribe(first)
+    # Unsubscribing twice does not free a slot of somebody else
+    brokers[0].unsubscribe(first)
+    assert brokers[1].subscribe('') is not None
+    assert brokers[0].subscribe('') is None
+    brokers[1].detach()
+    assert not budget.is_exhausted()
+
+
+@pytest.mark.parametrize('config, limit', [
+    ({'server_mode': 'simple', 'server_workers': 8}, 0),
+    ({'server_mode': 'pooled', 'server_workers': 8}, 2),
+    ({'server_mode': 'pooled', 'server_workers': 8, 'server_max_streams': 20}, 7),
+    ({'server_mode': 'pooled', 'server_workers': 8, 'server_max_streams': 3}, 3),
+    ({'server_mode': 'asgi', 'server_workers': 8}, None),
+    ({'server_mode': 'asgi', 'server_workers': 8, 'server_max_streams': 100}, 100),
+])
+def test_budget_configure(config, limit):
+    budget = StreamBudget()
+    budget.configure(config)
+    assert budget.limit == limit
+    assert budget.available == (limit is None or limit > 0)
+
+
+def test_streams_refused_over_budget(client):
+    budget = get_stream_budget()
+    budget.limit = 0
+    try:
+        response = client.get('/garage/events')
+        assert response.status_code == 503
+        assert response['Retry-After'] == '30'
+        # The page polls the delta JSON API instead
+        page = client.get('/garage/').content.decode()
+        assert 'data-live-events' not in page
+        assert 'data-live-poll="/garage/json"' in page
+    finally:
+        budget.limit = None
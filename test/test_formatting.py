@@ -0,0 +1,75 @@
+"""Tests of the cached HTML rendering of CarConnectivity elements."""
+import itertools
+
+import pytest
+
+from django.template import Context, Template, TemplateSyntaxError
+
+from carconnectivity_plugins.webui.django_app.cache import get_change_versions
+from carconnectivity_plugins.webui.django_app.formatting import ElementRenderer, get_fragment_cache, precision_digits
+from carconnectivity_plugins.webui.django_app.templatetags.carconnectivity_filters import format_cc_element
+
+
+@pytest.fixture
+def renderer(car_connectivity):
+    get_change_versions().attach(car_connectivity)
+    yield ElementRenderer()
+    get_change_versions().detach()
+
+
+def test_precision_digits():
+    assert precision_digits(1) == 0
+    assert precision_digits(0.1) == 1
+    assert precision_digits(0.01) == 2
+
+
+def test_attribute_rendered_until_changed(renderer, vehicle):  # pylint: disable=redefined-outer-name
+    html = renderer.render(vehicle.name)
+    assert html == 'name: Test car'
+    assert renderer.render(vehicle.name) is html
+    assert renderer.render(vehicle.name, 'Name') == 'Name: Test car'
+    vehicle.name._set_value('<Renamed>')  # pylint: disable=protected-access
+    assert renderer.render(vehicle.name) == 'name: &lt;Renamed&gt;'
+
+
+def test_object_rendered_until_its_vehicle_changes(renderer, vehicle):  # pylint: disable=redefined-outer-name
+    html = renderer.render(vehicle)
+    assert 'Test car' in html
+    assert renderer.render(vehicle) is html
+    vehicle.name._set_value('Renamed')  # pylint: disable=protected-access
+    assert 'Renamed' in renderer.render(vehicle)
+
+
+def test_disabled_element_is_empty(renderer, vehicle):  # pylint: disable=redefined-outer-name
+    vehicle.name.enabled = False
+    assert renderer.render(vehicle.name) == ''
+
+
+def test_filter_uses_renderer(renderer, vehicle):  # pylint: disable=redefined-outer-name,unused-argument
+    assert format_cc_element(vehicle.name, 'Name') == 'Name: Test car'
+    assert format_cc_element('plain') == 'plain'
+
+
+def test_fragment_rendered_until_its_section_changes(renderer, vehicle):  # pylint: disable=redefined-outer-name,unused-argument
+    template = Template("{% load carconnectivity_filters %}{% cc_fragment 'odometer' vehicle.odometer %}"
+                        "{{ vehicle.odometer.value }} {{ count.next }}{% endcc_fragment %}")
+    counter = itertools.count()
+    context = {'vehicle': vehicle, 'count': {'next': lambda: next(counter)}}
+    get_fragment_cache().clear()
+    assert template.render(Context(context)) == '1234.5 0'
+    # Changes in another section do not count
+    vehicle.name._set_value('Renamed')  # pylint: disable=protected-access
+    assert template.render(Context(context)) == '1234.5 0'
+    vehicle.odometer._set_value(2000.0)  # pylint: disable=protected-access
+    assert template.render(Context(context)) == '2000.0 1'
+
+
+def test_fragment_of_other_value_is_not_cached(renderer):  # pylint: disable=redefined-outer-name,unused-argument
+    template = Template("{% load carconnectivity_filters %}{% cc_fragment 'plain' value %}{{ value }}{% endcc_fragment %}")
+    assert template.render(Context({'value': 'a'})) == 'a'
+    assert template.render(Context({'value': 'b'})) == 'b'
+
+
+def test_fragment_needs_name_and_object():
+    with pytest.raises(TemplateSyntaxError):
+        Template("{% load carconnectivity_filters %}{% cc_fragment 'name' %}{% endcc_fragment %}")
@@ -0,0 +1,170 @@
+"""Tests of the cache of encoded vehicle images."""
+import io
+import time
+
+import pytest
+
+from PIL import Image
+
+from carconnectivity_plugins.webui.django_app.images import IMAGE_FORMATS, IMAGE_SIZES, PRERENDER_SIZES, ImageCache, ImagePrerenderer, encode_variant, \
+    negotiate_format, round_size, snap_size
+
+from conftest import VIN
+
+
+class Encoder:
+    """Counts the encodings, the data is as large as the image has pixels."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, image):
+        self.calls += 1
+        return b'x' * (image.width * image.height)
+
+
+@pytest.fixture
+def image_cache(car_connectivity):
+    image_cache = ImageCache()
+    image_cache.attach(car_connectivity)
+    yield image_cache
+    image_cache.detach()
+
+
+def test_encoded_once_per_version(image_cache, car_picture):  # pylint: disable=redefined-outer-name
+    encode = Encoder()
+    first = image_cache.get_or_encode(VIN, 'car_picture', car_picture, 'png', encode)
+    assert image_cache.get_or_encode(VIN, 'car_picture', car_picture, 'png', encode) is first
+    assert encode.calls == 1
+    assert image_cache.size == 800
+    # Every variant is encoded on its own
+    image_cache.get_or_encode(VIN, 'car_picture', car_picture, 'other', encode)
+    assert encode.calls == 2
+
+
+def test_change_drops_entries(image_cache, car_picture):  # pylint: disable=redefined-outer-name
+    encode = Encoder()
+    image_cache.get_or_encode(VIN, 'car_picture', car_picture, 'png', encode)
+    car_picture._set_value(Image.new('RGBA', (10, 10), (0, 0, 255, 255)))  # pylint: disable=protected-access
+    assert image_cache.size == 0
+    assert image_cache.get_or_encode(VIN, 'car_picture', car_picture, 'png', encode) == b'x' * 100
+    assert encode.calls == 2
+
+
+def test_not_cached_while_detached(car_picture):
+    image_cache = ImageCache()
+    encode = Encoder()
+    image_cache.get_or_encode(VIN, 'car_picture', car_picture, 'png', encode)
+    image_cache.get_or_encode(VIN, 'car_picture', car_picture, 'png', encode)
+    assert encode.calls == 2
+    assert image_cache.size == 0
+
+
+def test_size_is_capped(image_cache, car_picture):  # pylint: disable=redefined-outer-name
+    image_cache.max_bytes = 1000
+    encode = Encoder()
+    image_cache.get_or_encode(VIN, 'car_picture', car_picture, 'first', encode)
+    image_cache.get_or_encode(VIN, 'car_picture', car_picture, 'second', encode)
+    # The least recently used entry made room
+    assert image_cache.size == 800
+    image_cache.get_or_encode(VIN, 'car_picture', car_picture, 'second', encode)
+    assert encode.calls == 2
+    image_cache.get_or_encode(VIN, 'car_picture', car_picture, 'first', encode)
+    assert encode.calls == 3
+    # Larger than the whole cache, returned but not kept
+    image_cache.max_bytes = 100
+    image_cache.get_or_encode(VIN, 'car_picture', car_picture, 'third', encode)
+    image_cache.get_or_encode(VIN, 'car_picture', car_picture, 'third', encode)
+    assert encode.calls == 5
+
+
+def test_configure_size_in_megabytes():
+    image_cache = ImageCache()
+    image_cache.configure({'image_cache_size': 0.5})
+    assert image_cache.max_bytes == 512 * 1024
+
+
+@pytest.mark.parametrize('value, size', [(None, None), ('', None), ('abc', None), ('0', None), ('-5', None),
+                                         ('1', IMAGE_SIZES[0]), (str(IMAGE_SIZES[0]), IMAGE_SIZES[0]),
+                                         (str(IMAGE_SIZES[0] + 1), IMAGE_SIZES[1]), ('100000', IMAGE_SIZES[-1])])
+def test_snap_size(value, size):
+    assert snap_size(value) == size
+
+
+def test_negotiate_format():
+    assert negotiate_format('') == 'png'
+    assert negotiate_format('*/*') == 'png'
+    assert negotiate_format('image/*,*/*;q=0.8') == 'png'
+    if 'webp' in IMAGE_FORMATS:
+        assert negotiate_format('image/webp,image/png;q=0.9') == 'webp'
+    if 'avif' in IMAGE_FORMATS:
+        # The server prefers AVIF whenever it is accepted
+        assert negotiate_format('image/webp, image/avif') == 'avif'
+
+
+def test_encode_variant_scales_down_only():
+    image = Image.new('RGBA', (400, 200), (255, 0, 0, 255))
+    assert Image.open(io.BytesIO(encode_variant(image, 'png', 160))).size == (160, 80)
+    assert Image.open(io.BytesIO(encode_variant(image, 'png', None, 100))).size == (200, 100)
+    assert Image.open(io.BytesIO(encode_variant(image, 'png', 1280))).size == (400, 200)
+    # The original is left alone
+    assert image.size == (400, 200)
+
+
+def test_vehicle_img_variant(client, car_picture):  # pylint: disable=unused-argument
+    response = client.get(f'/garage/{VIN}-car.png', {'w': '10'}, HTTP_ACCEPT='image/webp,*/*')
+    assert 'Accept' in response['Vary']
+    assert response['Content-Type'] == IMAGE_FORMATS[negotiate_format('image/webp')][1]
+    # Already smaller than the smallest size, it is not scaled up
+    assert Image.open(io.BytesIO(response.content)).size == (40, 20)
+    # Every variant has its own ETag
+    png = client.get(f'/garage/{VIN}-car.png', {'w': '10'})
+    assert png['Content-Type'] == 'image/png'
+    assert png['ETag'] != response['ETag']
+    assert client.get(f'/garage/{VIN}-car.png', {'w': '10'}, HTTP_IF_NONE_MATCH=png['ETag']).status_code == 304
+
+
+def test_round_size():
+    assert round_size(1) == IMAGE_SIZES[0]
+    assert round_size(IMAGE_SIZES[1]) == IMAGE_SIZES[1]
+    assert round_size(IMAGE_SIZES[-1] + 1) == IMAGE_SIZES[-1]
+
+
+def cached_variants(image_cache, count):  # pylint: disable=redefined-outer-name
+    """Wait until the worker filled count entries and return their variants."""
+    deadline = time.monotonic() + 5
+    while len(image_cache._entries) < count and time.monotonic() < deadline:  # pylint: disable=protected-access
+        time.sleep(0.01)
+    return {key[2] for key in image_cache._entries}  # pylint: disable=protected-access
+
+
+def test_prerenderer_fills_cache(image_cache, car_connectivity, car_picture):  # pylint: disable=redefined-outer-name
+    prerenderer = ImagePrerenderer(image_cache, sizes=[10, 100], formats=['png'])
+    prerenderer.start(car_connectivity)
+    try:
+        # Both widths round to the same size, it is encoded once
+        assert cached_variants(image_cache, 3) == {('png', None, None), 'png_base64', ('png', IMAGE_SIZES[0], None)}
+        # A changed picture is encoded again
+        car_picture._set_value(Image.new('RGBA', (10, 10), (0, 0, 255, 255)))  # pylint: disable=protected-access
+        assert len(cached_variants(image_cache, 3)) == 3
+        assert image_cache.size < 800 * 3
+    finally:
+        prerenderer.stop()
+
+
+def test_prerenderer_disabled(image_cache, car_connectivity, car_picture):  # pylint: disable=redefined-outer-name,unused-argument
+    prerenderer = ImagePrerenderer(image_cache)
+    prerenderer.configure({'image_prerender': False})
+    prerenderer.start(car_connectivity)
+    prerenderer.stop()
+    assert image_cache.size == 0
+
+
+def test_prerenderer_configure():
+    prerenderer = ImagePrerenderer(ImageCache())
+    assert prerenderer.sizes == list(PRERENDER_SIZES)
+    assert prerenderer.formats == list(IMAGE_FORMATS)[:1]
+    prerenderer.configure({'image_prerender_sizes': ['320'], 'image_prerender_formats': ['png', 'bmp']})
+    assert prerenderer.sizes == [320]
+    # Formats Pillow cannot encode are skipped
+    assert prerenderer.formats == ['png']
@@ -0,0 +1,122 @@
+"""Tests of the live log tail streamed as Server-Sent Events."""
+import logging
+
+import pytest
+
+from carconnectivity_plugins.webui.django_app.events import EventBroker, StreamBudget, get_stream_budget
+from carconnectivity_plugins.webui.django_app.logs import LogQuery, LogTail, get_log_tail
+
+LOG = logging.getLogger('carconnectivity.test')
+
+
+@pytest.fixture
+def log_tail(car_connectivity):
+    log_tail = LogTail(history=5, heartbeat=0.01)
+    log_tail.attach(car_connectivity)
+    yield log_tail
+    log_tail.detach()
+
+
+def test_stream_sends_new_matching_records(log_tail):  # pylint: disable=redefined-outer-name
+    stream = log_tail.stream(LogQuery(level=logging.WARNING), None)
+    assert 'event: hello' in next(stream)
+    LOG.info('not important')
+    assert next(stream) == ': heartbeat\n\n'
+    LOG.warning('important %d', 1)
+    chunk = next(stream)
+    assert 'event: log' in chunk
+    assert 'important 1' in chunk
+    stream.close()
+
+
+def test_stream_replays_missed_records(log_tail):  # pylint: disable=redefined-outer-name
+    last_event_id = log_tail.format_id(log_tail.last_id)
+    LOG.warning('first')
+    LOG.warning('second')
+    stream = log_tail.stream(LogQuery(), last_event_id)
+    chunk = next(stream)
+    assert chunk.index('first') < chunk.index('second')
+    stream.close()
+
+
+def test_stream_resets_when_history_is_exceeded(log_tail):  # pylint: disable=redefined-outer-name
+    last_event_id = log_tail.format_id(log_tail.last_id)
+    for number in range(10):
+        LOG.warning('record %d', number)
+    stream = log_tail.stream(LogQuery(), last_event_id)
+    assert 'event: reset' in next(stream)
+    stream.close()
+    # The records still in the history are replayed
+    stream = log_tail.stream(LogQuery(), log_tail.format_id(log_tail.last_id - 5))
+    chunk = next(stream)
+    assert 'event: reset' not in chunk
+    assert chunk.count('event: log') == 5
+    assert 'record 5' in chunk and 'record 4' not in chunk
+    stream.close()
+
+
+def test_stream_resets_after_detached(log_tail, car_connectivity):  # pylint: disable=redefined-outer-name
+    last_event_id = log_tail.format_id(log_tail.last_id)
+    LOG.warning('before detach')
+    log_tail.detach()
+    LOG.warning('while detached')
+    log_tail.attach(car_connectivity)
+    # Records may be missing in between
+    stream = log_tail.stream(LogQuery(), last_event_id)
+    assert 'event: reset' in next(stream)
+    stream.close()
+
+
+def test_records_below_storage_level_are_not_published(log_tail, car_connectivity):  # pylint: disable=redefined-outer-name
+    last_id = log_tail.last_id
+    car_connectivity.log_storage.setLevel(logging.ERROR)
+    log_tail.attach(car_connectivity)
+    LOG.warning('not stored')
+    assert log_tail.last_id == last_id
+    LOG.error('stored')
+    assert log_tail.last_id == last_id + 1
+
+
+def test_detach_stops_publishing(log_tail):  # pylint: disable=redefined-outer-name
+    log_tail.detach()
+    last_id = log_tail.last_id
+    LOG.warning('after detach')
+    assert log_tail.last_id == last_id
+
+
+def test_log_stream_view(client, car_connectivity):
+    log_tail_of_view = get_log_tail()
+    log_tail_of_view.attach(car_connectivity)
+    try:
+        response = client.get('/log/stream', {'level': 'warning'})
+        assert response['Content-Type'].startswith('text/event-stream')
+        assert 'event: hello' in next(response.streaming_content).decode('utf-8')
+        response.close()
+        assert client.get('/log/stream', {'level': 'LOUD'}).status_code == 400
+    finally:
+        log_tail_of_view.detach()
+
+
+def test_log_tail_shares_the_stream_budget(car_connectivity):
+    budget = StreamBudget(limit=1)
+    broker = EventBroker(budget=budget)
+    log_tail = LogTail(budget=budget)
+    log_tail.attach(car_connectivity)
+    subscriber = broker.subscribe('/garage')
+    assert log_tail.is_full()
+    assert log_tail.subscribe(LogQuery()) is None
+    broker.unsubscribe(subscriber)
+    assert log_tail.subscribe(LogQuery()) is not None
+    log_tail.detach()
+    assert not budget.is_exhausted()
+
+
+def test_log_stream_refused_over_budget(client):
+    budget = get_stream_budget()
+    budget.limit = 0
+    try:
+        assert client.get('/log/stream').status_code == 503
+        # Without stream slots there is no live tail on the page
+        assert 'data-log-stream' not in client.get('/log').content.decode()
+    finally:
+        budget.limit = None
@@ -0,0 +1,111 @@
+"""Tests of paging log storages by cursor and of the log filters."""
+import logging
+from collections import deque
+
+import pytest
+
+from django.test import RequestFactory
+
+from carconnectivity_plugins.webui.django_app.logs import MAX_PAGE_SIZE, LogQuery, log_page, parse_level, query_log, record_cursor
+
+
+def make_record(index, level=logging.INFO, name='carconnectivity.test'):
+    record = logging.LogRecord(name, level, __file__, index, 'message %d', (index,), None)
+    record.created += index / 1000
+    return record
+
+
+@pytest.fixture
+def storage():
+    return deque((make_record(index) for index in range(10)), maxlen=10)
+
+
+def messages(records):
+    return [record.getMessage() for record in records]
+
+
+def test_pages_latest_first(storage):  # pylint: disable=redefined-outer-name
+    records, more = query_log(storage, LogQuery(limit=4))
+    assert messages(records) == ['message 9', 'message 8', 'message 7', 'message 6']
+    assert more
+    records, more = query_log(storage, LogQuery(limit=4, cursor=record_cursor(records[-1])))
+    assert messages(records) == ['message 5', 'message 4', 'message 3', 'message 2']
+    assert more
+    records, more = query_log(storage, LogQuery(limit=4, cursor=record_cursor(records[-1])))
+    assert messages(records) == ['message 1', 'message 0']
+    assert not more
+
+
+def test_pages_oldest_first(storage):  # pylint: disable=redefined-outer-name
+    records, _ = query_log(storage, LogQuery(order='asc', limit=3))
+    assert messages(records) == ['message 0', 'message 1', 'message 2']
+    records, _ = query_log(storage, LogQuery(order='asc', limit=3, cursor=record_cursor(records[-1])))
+    assert messages(records) == ['message 3', 'message 4', 'message 5']
+
+
+def test_exact_page_has_no_more(storage):  # pylint: disable=redefined-outer-name
+    records, more = query_log(storage, LogQuery(limit=10))
+    assert len(records) == 10
+    assert not more
+
+
+def test_cursor_of_dropped_record(storage):  # pylint: disable=redefined-outer-name
+    page = log_page(storage, LogQuery(order='asc', limit=2))
+    assert page['next_cursor'] == record_cursor(storage[1])
+    for index in range(10, 13):
+        storage.append(make_record(index))
+    # Oldest first continues with everything still stored, latest first has nothing older left
+    records, _ = query_log(storage, LogQuery(order='asc', limit=2, cursor=page['next_cursor']))
+    assert messages(records) == ['message 3', 'message 4']
+    records, more = query_log(storage, LogQuery(order='desc', limit=2, cursor=page['next_cursor']))
+    assert records == []
+    assert not more
+
+
+def test_cursor_is_unique_per_record(storage):  # pylint: disable=redefined-outer-name
+    assert len({record_cursor(record) for record in storage}) == len(storage)
+
+
+def test_filters_apply_before_paging():
+    storage = deque([make_record(0), make_record(1, logging.WARNING), make_record(2, name='carconnectivity.other'),
+                     make_record(3, logging.ERROR, name='carconnectivity.test.child'), make_record(4, name='carconnectivity.tester')])
+    records, _ = query_log(storage, LogQuery(level=logging.WARNING, limit=1))
+    assert messages(records) == ['message 3']
+    records, _ = query_log(storage, LogQuery(logger='carconnectivity.test'))
+    assert messages(records) == ['message 3', 'message 1', 'message 0']
+    records, _ = query_log(storage, LogQuery(text='MESSAGE 2'))
+    assert messages(records) == ['message 2']
+
+
+def test_empty_storage():
+    assert query_log(None, LogQuery()) == ([], False)
+    assert log_page(deque(), LogQuery()) == {'records': [], 'next_cursor': None, 'total': 0}
+
+
+def test_query_from_request():
+    query = LogQuery.from_request(RequestFactory().get('/log/json', {'order': 'asc', 'limit': '5000', 'level': 'warning', 'cursor': 'c',
+                                                                     'logger': 'carconnectivity', 'q': 'Text'}))
+    assert (query.order, query.limit, query.level, query.cursor, query.logger, query.text) == \
+        ('asc', MAX_PAGE_SIZE, logging.WARNING, 'c', 'carconnectivity', 'Text')
+    assert query.filtered
+
+
+@pytest.mark.parametrize('parameters', [{'order': 'sideways'}, {'limit': '0'}, {'limit': '-1'}, {'limit': 'ten'}, {'level': 'LOUD'}])
+def test_query_from_request_invalid(parameters):
+    with pytest.raises(ValueError):
+        LogQuery.from_request(RequestFactory().get('/log/json', parameters))
+
+
+def test_parse_level():
+    assert parse_level(None) == logging.NOTSET
+    assert parse_level('error') == logging.ERROR
+    assert parse_level('25') == 25
+
+
+def test_log_json_view(client, car_connectivity):
+    car_connectivity.log_storage.storage.clear()
+    car_connectivity.log_storage.storage.extend(make_record(index) for index in range(3))
+    page = client.get('/log/json', {'limit': '2'}).json()
+    assert [record['message'] for record in page['records']] == ['message 2', 'message 1']
+    assert page['next_cursor'] is not None
+    assert client.get('/log/json', {'limit': 'ten'}).status_code == 400
@@ -0,0 +1,67 @@
+"""Tests of the request and cache metrics in the Prometheus text format."""
+from django.core.cache.backends.locmem import LocMemCache
+
+from carconnectivity_plugins.webui.django_app.cache import StatsLocMemCache
+from carconnectivity_plugins.webui.django_app.metrics import Histogram, MetricsRegistry, get_metrics
+
+
+def test_histogram_buckets():
+    histogram = Histogram((1.0, 2.0))
+    for value in (0.5, 1.0, 1.5, 3.0):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1]
+    assert histogram.count == 4
+    assert histogram.sum == 6.0
+
+
+def test_render_requests_and_caches():
+    metrics = MetricsRegistry()
+    metrics.observe_request('garage_json', 'GET', 200, 0.002, 300)
+    metrics.observe_request('garage_json', 'GET', 200, 0.02, None)
+    metrics.register_cache('test', lambda: {'hits': 3, 'entries': 2})
+    metrics.register_cache('broken', lambda: 1 / 0)
+    text = metrics.render()
+    assert 'carconnectivity_webui_requests_total{route="garage_json",method="GET",status="200"} 2\n' in text
+    assert 'carconnectivity_webui_request_duration_seconds_bucket{route="garage_json",le="0.0025"} 1\n' in text
+    assert 'carconnectivity_webui_request_duration_seconds_bucket{route="garage_json",le="+Inf"} 2\n' in text
+    # Streaming responses have no size
+    assert 'carconnectivity_webui_response_size_bytes_count{route="garage_json"} 1\n' in text
+    assert '# TYPE carconnectivity_webui_cache_hits_total counter\n' in text
+    assert 'carconnectivity_webui_cache_hits_total{cache="test"} 3\n' in text
+    assert 'carconnectivity_webui_cache_entries{cache="test"} 2\n' in text
+    assert 'broken' not in text
+
+
+def test_label_values_are_escaped():
+    metrics = MetricsRegistry()
+    metrics.observe_request('a"b\\c', 'GET', 404, 0.1, 0)
+    assert 'route="a\\"b\\\\c"' in metrics.render()
+
+
+def test_locmem_stats():
+    cache = StatsLocMemCache('test-metrics-locmem', {'OPTIONS': {'MAX_ENTRIES': 2, 'CULL_FREQUENCY': 2}})
+    assert isinstance(cache, LocMemCache)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    assert cache.get('missing', 'default') == 'default'
+    for key in ('b', 'c', 'd'):
+        cache.set(key, 1)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+    assert stats['evictions'] > 0
+
+
+def test_metrics_view_records_routes(client):
+    client.get('/garage/json')
+    text = client.get('/metrics').content.decode('utf-8')
+    assert 'route="garage_json",method="GET",status="200"' in text
+    assert 'cache="response"' in text
+
+
+def test_metrics_view_disabled(client):
+    metrics = get_metrics()
+    metrics.configure({'metrics': False})
+    try:
+        assert client.get('/metrics').status_code == 404
+    finally:
+        metrics.configure({'metrics': True})
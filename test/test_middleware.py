@@ -0,0 +1,153 @@
+"""Tests of the authentication middleware, its path access rules and the cache of verified Basic credentials."""
+import base64
+
+import pytest
+
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+import carconnectivity_plugins.webui.django_app
+from carconnectivity_plugins.webui.django_app import middleware
+from carconnectivity_plugins.webui.django_app.middleware import ANONYMOUS, PATH_ACCESS, PUBLIC, BasicAuthCache, \
+    CarConnectivityAuthMiddleware
+
+USERS = {'admin': 'secret'}
+
+
+def basic(username, password):
+    return 'Basic ' + base64.b64encode(f'{username}:{password}'.encode('utf-8')).decode('ascii')
+
+
+@pytest.fixture
+def users(monkeypatch):
+    users = dict(USERS)
+    monkeypatch.setattr(carconnectivity_plugins.webui.django_app, '_users', users)
+    monkeypatch.setattr('carconnectivity_plugins.webui.django_app.middleware._basic_auth_cache', BasicAuthCache())
+    return users
+
+
+def call(path, **headers):
+    """Run a request through the middleware, returns the response and the user the view saw."""
+    seen = {}
+
+    def view(request):
+        seen['user'] = request.user
+        return HttpResponse('ok')
+
+    response = CarConnectivityAuthMiddleware(view)(RequestFactory().get(path, **headers))
+    return response, seen
+
+
+def test_basic_auth_valid_and_invalid():
+    cache = BasicAuthCache()
+    assert cache.authenticate(basic('admin', 'secret'), USERS) == 'admin'
+    assert cache.authenticate(basic('admin', 'wrong'), USERS) is None
+    assert cache.authenticate(basic('nobody', 'secret'), USERS) is None
+    assert cache.authenticate('Basic not base64!', USERS) is None
+    # Passwords may contain colons
+    assert cache.authenticate(basic('admin', 'se:cret'), {'admin': 'se:cret'}) == 'admin'
+
+
+@pytest.fixture
+def verifications(monkeypatch):
+    """Counts the credentials that were verified instead of found in the cache."""
+    calls = []
+    verify = middleware._verify_basic  # pylint: disable=protected-access
+
+    def counting_verify(auth_header, users):
+        calls.append(auth_header)
+        return verify(auth_header, users)
+
+    monkeypatch.setattr(middleware, '_verify_basic', counting_verify)
+    return calls
+
+
+def entries(cache):
+    return len(cache._entries)  # pylint: disable=protected-access
+
+
+def test_basic_auth_remembers_valid_credentials_only(verifications):  # pylint: disable=redefined-outer-name
+    cache = BasicAuthCache()
+    header = basic('admin', 'secret')
+    cache.authenticate(header, USERS)
+    cache.authenticate(header, USERS)
+    assert len(verifications) == 1
+    assert entries(cache) == 1
+    cache.authenticate(basic('admin', 'wrong'), USERS)
+    cache.authenticate(basic('admin', 'wrong'), USERS)
+    assert len(verifications) == 3
+    assert entries(cache) == 1
+
+
+def test_basic_auth_forgets_when_users_change():
+    cache = BasicAuthCache()
+    header = basic('admin', 'secret')
+    assert cache.authenticate(header, USERS) == 'admin'
+    assert cache.authenticate(header, {'admin': 'changed'}) is None
+    assert entries(cache) == 0
+
+
+def test_basic_auth_expires(verifications):  # pylint: disable=redefined-outer-name
+    cache = BasicAuthCache(ttl=-1)
+    header = basic('admin', 'secret')
+    assert cache.authenticate(header, USERS) == 'admin'
+    assert cache.authenticate(header, USERS) == 'admin'
+    assert len(verifications) == 2
+
+
+def test_basic_auth_bounded():
+    cache = BasicAuthCache(max_entries=2)
+    users = {f'user{index}': 'secret' for index in range(3)}
+    for username in users:
+        assert cache.authenticate(basic(username, 'secret'), users) == username
+    assert entries(cache) <= 2
+    assert cache.stats()['evictions'] > 0
+
+
+def test_basic_auth_stats():
+    cache = BasicAuthCache()
+    header = basic('admin', 'secret')
+    cache.authenticate(header, USERS)
+    cache.authenticate(header, USERS)
+    cache.authenticate(basic('admin', 'wrong'), USERS)
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'evictions': 0, 'entries': 1}
+
+
+def test_path_access_rules():
+    assert PATH_ACCESS['static'] == ANONYMOUS
+    assert PATH_ACCESS['healthcheck'] == ANONYMOUS
+    assert PATH_ACCESS['login'] == PUBLIC
+    # Segments match exactly, not by prefix
+    assert 'loginx' not in PATH_ACCESS
+    # Metrics and profiles expose internals, they are never available without login
+    assert 'metrics' not in PATH_ACCESS
+    assert 'profile' not in PATH_ACCESS
+
+
+@pytest.mark.parametrize('path', ['/healthcheck', '/static/css/bundle.css', '/favicon.ico'])
+def test_anonymous_paths_skip_authentication(users, path):  # pylint: disable=redefined-outer-name,unused-argument
+    response, seen = call(path, HTTP_AUTHORIZATION=basic('admin', 'secret'))
+    assert response.status_code == 200
+    assert seen['user'] is None
+
+
+@pytest.mark.parametrize('path', ['/login', '/about'])
+def test_public_paths_resolve_user(users, path):  # pylint: disable=redefined-outer-name,unused-argument
+    response, seen = call(path)
+    assert response.status_code == 200
+    assert seen['user'] is None
+    response, seen = call(path, HTTP_AUTHORIZATION=basic('admin', 'secret'))
+    assert seen['user'].username == 'admin'
+
+
+@pytest.mark.parametrize('path', ['/metrics', '/profile/', '/profile/0123456789ab', '/garage/', '/json', '/loginx'])
+def test_protected_paths_require_login(users, path):  # pylint: disable=redefined-outer-name,unused-argument
+    response, seen = call(path)
+    assert response.status_code == 302
+    assert response['Location'].startswith('/login')
+    assert 'user' not in seen
+    response, seen = call(path, HTTP_AUTHORIZATION=basic('admin', 'wrong'))
+    assert response.status_code == 302
+    response, seen = call(path, HTTP_AUTHORIZATION=basic('admin', 'secret'))
+    assert response.status_code == 200
+    assert seen['user'].username == 'admin'
@@ -0,0 +1,116 @@
+"""Tests of the opt-in profiling of single requests."""
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from carconnectivity_plugins.webui.django_app import profiling
+from carconnectivity_plugins.webui.django_app.profiling import RequestProfiler, get_request_profiler
+
+
+def slow_view(request):  # pylint: disable=unused-argument
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+    return HttpResponse('done')
+
+
+@pytest.fixture
+def profiler():
+    profiler = RequestProfiler(min_interval=60.0)
+    profiler.configure({'profiling': True, 'profiling_sample_interval': 1})
+    return profiler
+
+
+@pytest.mark.parametrize('parameters, headers, requested', [({'_profile': '1'}, {}, True), ({}, {'HTTP_X_PROFILE': 'true'}, True),
+                                                            ({'_profile': '0'}, {}, False), ({}, {}, False)])
+def test_requested(profiler, parameters, headers, requested):  # pylint: disable=redefined-outer-name
+    assert profiler.requested(RequestFactory().get('/garage/', parameters, **headers)) is requested
+
+
+def test_profile_report(profiler):  # pylint: disable=redefined-outer-name
+    switch_interval = sys.getswitchinterval()
+    response, report, retry_after = profiler.profile(RequestFactory().get('/garage/', {'_profile': '1'}), slow_view)
+    assert response.content == b'done'
+    assert retry_after is None
+    assert report.status == 200
+    assert report.path == '/garage/?_profile=1'
+    assert report.duration >= 0.05
+    assert any('slow_view' in function['function'] for function in report.cumulative)
+    assert any('slow_view' in stack for stack in report.stacks)
+    assert report.collapsed().endswith('\n')
+    assert report.as_dict('/collapsed')['samples'] == sum(report.stacks.values())
+    assert profiler.get_report(report.id) is report
+    assert profiler.reports() == [report]
+    # The switch interval is restored
+    assert sys.getswitchinterval() == switch_interval
+
+
+def test_default_keeps_switch_interval():
+    switch_intervals = []
+
+    def view(request):  # pylint: disable=unused-argument
+        switch_intervals.append(sys.getswitchinterval())
+        return HttpResponse()
+
+    switch_interval = sys.getswitchinterval()
+    request_profiler = RequestProfiler()
+    request_profiler.configure({'profiling': True})
+    assert request_profiler.profile(RequestFactory().get('/'), view)[1] is not None
+    assert switch_intervals == [switch_interval]
+
+
+def test_rate_limited(profiler):  # pylint: disable=redefined-outer-name
+    profiler.profile(RequestFactory().get('/'), lambda request: HttpResponse())
+    response, report, retry_after = profiler.profile(RequestFactory().get('/'), lambda request: HttpResponse('served'))
+    assert response.content == b'served'
+    assert report is None
+    assert 0 < retry_after <= 60
+
+
+class BusyProfile:  # pylint: disable=too-few-public-methods
+    """Stands in for cProfile.Profile while another profiler is active."""
+
+    def enable(self):
+        raise ValueError('Another profiling tool is already active')
+
+
+def test_failed_profile_does_not_count(profiler, monkeypatch):  # pylint: disable=redefined-outer-name
+    monkeypatch.setattr(profiling, 'cProfile', SimpleNamespace(Profile=BusyProfile))
+    response, report, retry_after = profiler.profile(RequestFactory().get('/'), lambda request: HttpResponse('served'))
+    assert response.content == b'served'
+    assert report is None
+    assert retry_after == 0.0
+    monkeypatch.undo()
+    # The next request is profiled
+    assert profiler.profile(RequestFactory().get('/'), lambda request: HttpResponse())[1] is not None
+
+
+def test_reports_are_bounded(profiler):  # pylint: disable=redefined-outer-name
+    profiler.configure({'profiling_min_interval': 0, 'profiling_reports': 2})
+    for _ in range(3):
+        profiler.profile(RequestFactory().get('/'), lambda request: HttpResponse())
+    assert len(profiler.reports()) == 2
+
+
+def test_middleware_profiles_authenticated_requests(client):
+    profiler = get_request_profiler()
+    profiler.configure({'profiling': True, 'profiling_min_interval': 0})
+    try:
+        response = client.get('/garage/', {'_profile': '1'})
+        assert response['X-Profile'].startswith('/profile/')
+        report = client.get(response['X-Profile']).json()
+        assert report['path'] == '/garage/?_profile=1'
+        assert client.get(report['collapsed_url'])['Content-Disposition'].endswith('.folded"')
+        assert client.get('/profile/')['Cache-Control'] == 'no-store'
+        assert client.get('/profile/unknown').status_code == 404
+    finally:
+        profiler.configure({'profiling': False, 'profiling_min_interval': 60})
+
+
+def test_profile_views_disabled(client):
+    assert client.get('/profile/').status_code == 404
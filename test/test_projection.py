@@ -0,0 +1,79 @@
+"""Tests of the fields= projection and subtree selection of the JSON APIs."""
+import json
+
+import pytest
+
+from carconnectivity.doors import Doors
+
+from carconnectivity_plugins.webui.django_app.projection import MAX_FIELDS, field_tree, get_subtree, parse_fields, project, \
+    projected_json
+
+from conftest import VIN
+
+
+def test_parse_fields_none_selects_everything():
+    assert parse_fields(None) is None
+    assert parse_fields('') is None
+    assert parse_fields(' , ') is None
+
+
+def test_parse_fields_normalized():
+    assert parse_fields('position, doors.lock_state,drives.primary.level') == ('doors.lock_state', 'drives.primary.level', 'position')
+    # Fields covered by another one are dropped, duplicates collapse
+    assert parse_fields('doors.lock_state,doors,doors') == ('doors',)
+    assert parse_fields('doors,name') == parse_fields('name,doors')
+    # A common prefix is not a parent
+    assert parse_fields('door,doors.lock_state') == ('door', 'doors.lock_state')
+
+
+@pytest.mark.parametrize('value', ['doors.', '.doors', 'doors..lock_state'])
+def test_parse_fields_invalid(value):
+    with pytest.raises(ValueError):
+        parse_fields(value)
+
+
+def test_parse_fields_too_many():
+    with pytest.raises(ValueError):
+        parse_fields(','.join(f'field{index}' for index in range(MAX_FIELDS + 1)))
+
+
+def test_field_tree():
+    assert field_tree(('doors.lock_state', 'drives.primary.level', 'name')) == {
+        'doors': {'lock_state': {}}, 'drives': {'primary': {'level': {}}}, 'name': {}}
+
+
+def test_get_subtree(vehicle):
+    assert get_subtree(vehicle, 'odometer') is vehicle.odometer
+    assert get_subtree(vehicle, '/odometer/') is vehicle.odometer
+    # Disabled or unknown elements, parents and paths below attributes are not resolved
+    assert get_subtree(vehicle, 'doors') is None
+    assert get_subtree(vehicle, 'nothing') is None
+    assert get_subtree(vehicle, '../TESTVIN1') is None
+    assert get_subtree(vehicle, 'odometer/val') is None
+    vehicle.doors.lock_state._set_value(Doors.LockState.LOCKED)  # pylint: disable=protected-access
+    assert get_subtree(vehicle, 'doors/lock_state') is vehicle.doors.lock_state
+
+
+def test_project_selected_fields_only(vehicle):
+    vehicle.doors.lock_state._set_value(Doors.LockState.LOCKED)  # pylint: disable=protected-access
+    projection = project(vehicle, field_tree(parse_fields('name,doors.lock_state.val,missing')))
+    assert projection == {'name': {'val': 'Test car', 'upd': vehicle.name.as_dict()['upd']},
+                          'doors': {'lock_state': {'val': Doors.LockState.LOCKED}}}
+
+
+def test_project_without_fields_is_as_dict(vehicle):
+    assert project(vehicle, None) == vehicle.as_dict()
+    assert project(vehicle.odometer, None) == vehicle.odometer.as_dict()
+
+
+def test_projected_json(vehicle):
+    document = json.loads(projected_json(vehicle, parse_fields('odometer.val,name.val')))
+    assert document == {'name': {'val': 'Test car'}, 'odometer': {'val': 1234.5}}
+    assert json.loads(projected_json(vehicle.odometer, ('val',))) == {'val': 1234.5}
+
+
+def test_vehicle_json_fields_and_path(client, vehicle):  # pylint: disable=unused-argument
+    assert client.get(f'/garage/{VIN}/json', {'fields': 'odometer.val'}).json() == {'odometer': {'val': 1234.5}}
+    assert client.get(f'/garage/{VIN}/json/odometer', {'fields': 'val'}).json() == {'val': 1234.5}
+    assert client.get(f'/garage/{VIN}/json/nothing').status_code == 404
+    assert client.get(f'/garage/{VIN}/json', {'fields': 'doors..lock_state'}).status_code == 400
@@ -0,0 +1,38 @@
+"""Tests of the memoized HTML of log records."""
+import gc
+import logging
+
+from carconnectivity_plugins.webui.django_app.logs import RecordHTMLCache
+
+
+def make_record(message):
+    return logging.LogRecord('carconnectivity.test', logging.WARNING, __file__, 1, message, None, None)
+
+
+def test_record_formatted_once():
+    cache = RecordHTMLCache()
+    record = make_record('<b>')
+    html = cache.get(record)
+    assert '&lt;b&gt;' in html
+    record.msg = 'changed'
+    # Stored records are immutable, the first result is kept
+    assert cache.get(record) is html
+    assert len(cache) == 1
+
+
+def test_entry_goes_with_the_record():
+    cache = RecordHTMLCache()
+    record = make_record('dropped')
+    cache.get(record)
+    del record
+    gc.collect()
+    assert len(cache) == 0
+
+
+def test_cleared_when_full():
+    cache = RecordHTMLCache(max_entries=2)
+    records = [make_record(f'message {index}') for index in range(3)]
+    for record in records:
+        cache.get(record)
+    assert len(cache) == 1
+    assert 'message 2' in cache.get(records[2])
@@ -0,0 +1,56 @@
+"""Tests of the serialization of the JSON API documents as JSON, MessagePack or CBOR."""
+import json
+from datetime import datetime, timezone
+from enum import Enum
+
+import pytest
+
+from carconnectivity_plugins.webui.django_app.serialization import DATA_FORMATS, SUPPORT_CBOR, SUPPORT_MSGPACK, \
+    negotiate_data_format, serialize, to_plain
+
+from conftest import VIN
+
+
+class Color(Enum):
+    RED = 'red'
+
+
+def test_negotiate_format_parameter():
+    assert negotiate_data_format('JSON', 'application/cbor') == 'json'
+    with pytest.raises(ValueError, match='Unknown format'):
+        negotiate_data_format('xml', '')
+    if not SUPPORT_MSGPACK:
+        with pytest.raises(ValueError, match='install the msgpack extra'):
+            negotiate_data_format('msgpack', '')
+
+
+def test_negotiate_accept():
+    assert negotiate_data_format(None, '') == 'json'
+    assert negotiate_data_format(None, '*/*') == 'json'
+    assert negotiate_data_format(None, 'application/x-msgpack') == ('msgpack' if SUPPORT_MSGPACK else 'json')
+    assert negotiate_data_format(None, 'application/cbor;q=0.9, application/json') == ('cbor' if SUPPORT_CBOR else 'json')
+
+
+def test_to_plain_follows_json_encoder():
+    moment = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    plain = to_plain({'time': moment, 'color': Color.RED, 'items': (1, None), ('tuple', 'key'): 'skipped'})
+    assert plain == json.loads(json.dumps({'time': moment.isoformat(), 'color': 'red', 'items': [1, None]}))
+
+
+def test_serialize_json(vehicle):
+    assert json.loads(serialize(vehicle, ('odometer.val',))) == {'odometer': {'val': 1234.5}}
+
+
+@pytest.mark.parametrize('data_format, module', [('msgpack', 'msgpack'), ('cbor', 'cbor2')])
+def test_serialize_binary_like_json(vehicle, data_format, module):
+    decoder = pytest.importorskip(module)
+    data = serialize(vehicle, None, data_format=data_format)
+    document = decoder.unpackb(data) if data_format == 'msgpack' else decoder.loads(data)
+    assert document == json.loads(serialize(vehicle))
+
+
+def test_view_format(client):
+    response = client.get(f'/garage/{VIN}/json', {'format': 'json', 'fields': 'name.val'})
+    assert response['Content-Type'] == DATA_FORMATS['json'][0]
+    assert response.json() == {'name': {'val': 'Test car'}}
+    assert client.get(f'/garage/{VIN}/json', {'format': 'xml'}).status_code == 400
@@ -0,0 +1,263 @@
+"""Tests of the HTTP servers the plugin runs the WebUI with, driven over real sockets."""
+import http.client
+import socket
+import struct
+import threading
+
+import pytest
+
+from carconnectivity_plugins.webui.server import make_server
+
+
+def wsgi_app(environ, start_response):
+    """Answers with the path, /slow waits for the release event of the server, /stream has no Content-Length."""
+    path = environ['PATH_INFO']
+    if path == '/slow':
+        environ['test.release'].wait(5)
+    body = path.encode('utf-8')
+    if path == '/stream':
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return iter([body])
+    start_response('200 OK', [('Content-Type', 'text/plain'), ('Content-Length', str(len(body)))])
+    return [body]
+
+
+WAITING = threading.Event()
+DISCONNECTED = threading.Event()
+
+
+async def asgi_app(scope, receive, send):
+    """Answers with the path followed by the request body, /stream has no Content-Length, /wait waits for the client to go away."""
+    message = await receive()
+    body = scope['path'].encode('utf-8') + message.get('body', b'')
+    if scope['path'] == '/wait':
+        WAITING.set()
+        if (await receive())['type'] == 'http.disconnect':
+            DISCONNECTED.set()
+        return
+    if scope['path'] == '/stream':
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b'.'})
+        return
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': [(b'content-type', b'text/plain'), (b'content-length', str(len(body)).encode('ascii'))]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(mode='pooled', **kwargs):
+        release = threading.Event()
+
+        def application(environ, start_response):
+            environ['test.release'] = release
+            return wsgi_app(environ, start_response)
+
+        server = make_server(mode, '127.0.0.1', 0, asgi_app if mode == 'asgi' else application, **kwargs)
+        server.release = release
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        servers.append((server, thread))
+        return server
+
+    yield start
+    for server, thread in servers:
+        server.release.set()
+        server.shutdown()
+        server.server_close()
+        thread.join(5)
+
+
+def connect(server):
+    return http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=5)
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        make_server('forking', '127.0.0.1', 0, wsgi_app)
+
+
+def test_pooled_keep_alive(serve):  # pylint: disable=redefined-outer-name
+    server = serve(workers=2)
+    connection = connect(server)
+    connection.request('GET', '/first')
+    response = connection.getresponse()
+    assert response.read() == b'/first'
+    assert response.getheader('Connection') != 'close'
+    sock = connection.sock
+    connection.request('GET', '/second')
+    assert connection.getresponse().read() == b'/second'
+    # The second request went over the same connection
+    assert connection.sock is sock
+    connection.close()
+
+
+def test_pooled_closes_without_content_length(serve):  # pylint: disable=redefined-outer-name
+    server = serve()
+    connection = connect(server)
+    connection.request('GET', '/stream')
+    response = connection.getresponse()
+    assert response.read() == b'/stream'
+    assert response.getheader('Connection') == 'close'
+    connection.close()
+
+
+def test_pooled_keep_alive_disabled(serve):  # pylint: disable=redefined-outer-name
+    server = serve(keep_alive=False)
+    connection = connect(server)
+    connection.request('GET', '/')
+    response = connection.getresponse()
+    response.read()
+    assert response.getheader('Connection') == 'close'
+    connection.close()
+
+
+def test_pooled_rejects_when_queue_is_full(serve):  # pylint: disable=redefined-outer-name
+    server = serve(workers=1, max_queue=0)
+    busy = connect(server)
+    busy.request('GET', '/slow')
+    # Wait until the slow request occupies the only worker
+    while server._slots._value:  # pylint: disable=protected-access
+        threading.Event().wait(0.01)
+    with socket.create_connection(('127.0.0.1', server.server_port), timeout=5) as rejected:
+        rejected.sendall(b'GET / HTTP/1.1\r\nHost: test\r\n\r\n')
+        assert rejected.recv(1024).startswith(b'HTTP/1.1 503')
+    server.release.set()
+    assert busy.getresponse().read() == b'/slow'
+    busy.close()
+
+
+def test_pooled_idle_connections_do_not_hold_workers(serve):  # pylint: disable=redefined-outer-name
+    # One queue slot covers the worker finishing the previous request, a connection holding it would time out the test
+    server = serve(workers=1, max_queue=1)
+    # A connection that has not sent anything yet and one idle between two requests
+    silent = socket.create_connection(('127.0.0.1', server.server_port), timeout=5)
+    idle = connect(server)
+    idle.request('GET', '/first')
+    assert idle.getresponse().read() == b'/first'
+    connection = connect(server)
+    connection.request('GET', '/other')
+    assert connection.getresponse().read() == b'/other'
+    # The idle connection is served again once it sends its next request
+    idle.request('GET', '/second')
+    assert idle.getresponse().read() == b'/second'
+    for sock in (silent, idle, connection):
+        sock.close()
+
+
+def test_pooled_idle_connections_expire(serve):  # pylint: disable=redefined-outer-name
+    server = serve(keep_alive_timeout=0.1)
+    with socket.create_connection(('127.0.0.1', server.server_port), timeout=5) as sock:
+        sock.sendall(b'GET /first HTTP/1.1\r\nHost: test\r\n\r\n')
+        received = b''
+        while not received.endswith(b'/first'):
+            received += sock.recv(65536)
+        # The server closes the connection after the timeout
+        assert sock.recv(65536) == b''
+
+
+def raw_request(server, data):
+    """Send raw bytes on a new connection and return everything received until the server closes it."""
+    with socket.create_connection(('127.0.0.1', server.server_port), timeout=5) as sock:
+        sock.sendall(data)
+        received = b''
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return received
+            received += chunk
+
+
+def test_asgi_keep_alive(serve):  # pylint: disable=redefined-outer-name
+    server = serve('asgi')
+    connection = connect(server)
+    connection.request('GET', '/first')
+    response = connection.getresponse()
+    assert response.status == 200
+    assert response.read() == b'/first'
+    sock = connection.sock
+    connection.request('POST', '/second', body=b'-body')
+    assert connection.getresponse().read() == b'/second-body'
+    assert connection.sock is sock
+    connection.close()
+
+
+def test_asgi_chunked_response(serve):  # pylint: disable=redefined-outer-name
+    server = serve('asgi')
+    connection = connect(server)
+    connection.request('GET', '/stream')
+    response = connection.getresponse()
+    assert response.getheader('Transfer-Encoding') == 'chunked'
+    assert response.read() == b'/stream.'
+    # The length was known from the chunks, the connection stays usable
+    connection.request('GET', '/next')
+    assert connection.getresponse().read() == b'/next'
+    connection.close()
+
+
+def test_asgi_http_1_0_closes(serve):  # pylint: disable=redefined-outer-name
+    server = serve('asgi')
+    response = raw_request(server, b'GET /old HTTP/1.0\r\n\r\n')
+    assert response.startswith(b'HTTP/1.1 200')
+    assert response.endswith(b'/old')
+
+
+@pytest.mark.parametrize('request_line', [b'GARBAGE\r\n\r\n', b'GET / SPDY/3\r\n\r\n', b'GET /a b HTTP/1.1\r\n\r\n'])
+def test_asgi_malformed_request_line(serve, request_line):  # pylint: disable=redefined-outer-name
+    server = serve('asgi')
+    assert raw_request(server, request_line).startswith(b'HTTP/1.1 400')
+    # The server keeps serving
+    connection = connect(server)
+    connection.request('GET', '/after')
+    assert connection.getresponse().read() == b'/after'
+    connection.close()
+
+
+@pytest.mark.parametrize('data, status', [
+    (b'GET /' + b'a' * 70000 + b' HTTP/1.1\r\n\r\n', b'414'),
+    (b'GET / HTTP/1.1\r\nX-Long: ' + b'a' * 70000 + b'\r\n\r\n', b'431'),
+    (b'POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\nxyz\r\n', b'400'),
+    (b'POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n-5\r\nhello\r\n0\r\n\r\n', b'400'),
+])
+def test_asgi_malformed_request(serve, data, status):  # pylint: disable=redefined-outer-name
+    server = serve('asgi')
+    assert raw_request(server, data).startswith(b'HTTP/1.1 ' + status)
+
+
+def test_asgi_chunked_request(serve):  # pylint: disable=redefined-outer-name
+    server = serve('asgi')
+    response = raw_request(server, b'POST /chunked HTTP/1.1\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n\r\n'
+                                   b'3\r\n-ab\r\n2;ext=1\r\ncd\r\n0\r\n\r\n')
+    assert response.startswith(b'HTTP/1.1 200')
+    assert response.endswith(b'/chunked-abcd')
+
+
+@pytest.mark.parametrize('reset', [False, True])
+def test_asgi_client_disconnect(serve, reset):  # pylint: disable=redefined-outer-name
+    server = serve('asgi')
+    WAITING.clear()
+    DISCONNECTED.clear()
+    sock = socket.create_connection(('127.0.0.1', server.server_port), timeout=5)
+    sock.sendall(b'GET /wait HTTP/1.1\r\nHost: test\r\n\r\n')
+    assert WAITING.wait(5)
+    if reset:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+    sock.close()
+    # The application learns that the client went away while it is still running
+    assert DISCONNECTED.wait(5)
+    connection = connect(server)
+    connection.request('GET', '/after')
+    assert connection.getresponse().read() == b'/after'
+    connection.close()
+
+
+def test_asgi_pipelined_requests(serve):  # pylint: disable=redefined-outer-name
+    server = serve('asgi')
+    response = raw_request(server, b'GET /first HTTP/1.1\r\nHost: test\r\n\r\n'
+                                   b'POST /second HTTP/1.1\r\nHost: test\r\nContent-Length: 5\r\n\r\n-body'
+                                   b'GET /third HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n')
+    assert response.count(b'HTTP/1.1 200') == 3
+    assert response.index(b'/first') < response.index(b'/second-body') < response.index(b'/third')
@@ -0,0 +1,30 @@
+"""Tests of the page warm-up at plugin startup."""
+import logging
+
+from carconnectivity_plugins.webui.django_app import configure_from_plugin
+from carconnectivity_plugins.webui.django_app.warmup import warm_up, warmup_paths
+
+from conftest import VIN
+
+
+def test_paths_include_every_vehicle(car_connectivity):
+    paths = warmup_paths(car_connectivity)
+    assert paths[:2] == ['/login', '/garage/']
+    assert f'/garage/{VIN}/' in paths
+
+
+def test_renders_every_page(client, car_connectivity, caplog):  # pylint: disable=unused-argument
+    with caplog.at_level(logging.DEBUG, logger='carconnectivity.plugins.webui'):
+        timings = warm_up(car_connectivity)
+    # Every page answered 200
+    assert [record for record in caplog.records if 'Warm-up of' in record.getMessage()] == []
+    assert set(timings) == set(warmup_paths(car_connectivity))
+    assert all(duration >= 0 for duration in timings.values())
+
+
+def test_without_users_only_login(car_connectivity):
+    configure_from_plugin({}, car_connectivity, {})
+    try:
+        assert list(warm_up(car_connectivity)) == ['/login']
+    finally:
+        configure_from_plugin({}, None, {})